@@ -0,0 +1,224 @@
+import hashlib
+import random
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from io import StringIO
+from itertools import islice
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+from book.models import (Category, SubCategory, Country, Author, Book, BookViews, LikeBook, BookComment,
+                         ACTIVE, DRAFT, PUBLISHED)
+from book.search import get_search_backend
+from users.models import User, Profile, ADMIN, USER, DONE
+
+
+SCALES = {
+    'tiny': {
+        'users': 20, 'countries': 3, 'categories': 3, 'subcategories': 2, 'authors': 10,
+        'books': 60, 'views': 300, 'likes': 120, 'comments': 200,
+    },
+    'small': {
+        'users': 2000, 'countries': 50, 'categories': 20, 'subcategories': 5, 'authors': 1000,
+        'books': 20000, 'views': 200000, 'likes': 40000, 'comments': 100000,
+    },
+    'large': {
+        'users': 100000, 'countries': 200, 'categories': 50, 'subcategories': 10, 'authors': 10000,
+        'books': 1000000, 'views': 10000000, 'likes': 2000000, 'comments': 5000000,
+    },
+}
+
+PASSWORD = 'benchmark-pass-2023'
+# Fixed for reproducible data, and long enough that logins do not rehash it for a weak salt.
+PASSWORD_SALT = 'benchmarkPasswordSalt2023'
+ADMIN_INDEX, READER_INDEX = (0, 1)
+HISTORY_DAYS = 365
+WORDS = (
+    'kitob', 'tarix', 'hayot', 'yulduz', 'bahor', 'daryo', 'shahar', 'sirli', 'oltin', 'qalb',
+    'ilm', 'sayohat', 'tong', 'yomg\'ir', 'bog\'', 'dengiz', 'sukunat', 'ozodlik', 'orzu', 'vatan',
+    'history', 'garden', 'silent', 'river', 'night', 'science', 'journey', 'winter', 'light', 'story',
+)
+
+
+def make_id(seed, kind, index):
+    """The id of the ``index``-th generated ``kind`` row; scenarios use it to address rows without a lookup."""
+    digest = hashlib.md5(f"{seed}:{kind}:{index}".encode()).digest()
+    return uuid.UUID(bytes=digest, version=4)
+
+
+@contextmanager
+def fixed_timestamps(*models):
+    """Let generated rows keep their own ``created_time``/``updated_time`` instead of ``now()``."""
+    fields = [model._meta.get_field(name) for model in models for name in ('created_time', 'updated_time')]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Generator:
+    """
+    Deterministic catalog generator: the same ``scale`` and ``seed`` always produce the same rows.
+
+    Every id comes from ``make_id`` and all other values from per-table ``random.Random`` streams;
+    timestamps are spread over the year before ``anchor`` (midnight UTC of the run day by default),
+    so time-windowed features such as the leaderboards see recent activity.
+    """
+
+    def __init__(self, scale, seed=0, batch_size=5000, anchor=None, log=None):
+        self.scale = scale
+        self.seed = seed
+        self.batch_size = batch_size
+        self.anchor = anchor or datetime.combine(timezone.now().date(), time(), tzinfo=dt_timezone.utc)
+        self.log = log or (lambda message: None)
+
+    def rng(self, kind):
+        return random.Random(f"{self.seed}:{kind}")
+
+    def id(self, kind, index):
+        return make_id(self.seed, kind, index)
+
+    def timestamp(self, rng):
+        return self.anchor - timedelta(seconds=rng.randrange(HISTORY_DAYS * 24 * 3600))
+
+    def words(self, rng, count):
+        return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+    def insert(self, model, rows):
+        rows = iter(rows)
+        total = 0
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                model.objects.bulk_create(batch, batch_size=self.batch_size)
+            total += len(batch)
+            if total % (self.batch_size * 20) < len(batch):
+                self.log(f"{model._meta.label}: {total} rows")
+        self.log(f"{model._meta.label}: {total} rows")
+        return total
+
+    def run(self):
+        generated_models = (User, Country, Category, SubCategory, Author, Book, BookViews, LikeBook, BookComment)
+        counts = {}
+        with fixed_timestamps(*generated_models):
+            counts['users'] = self.insert(User, self.users())
+            self.insert(Profile, (Profile(user_id=self.id('user', i)) for i in range(self.scale['users'])))
+            counts['countries'] = self.insert(Country, self.countries())
+            counts['categories'] = self.insert(Category, self.categories())
+            counts['subcategories'] = self.insert(SubCategory, self.subcategories())
+            counts['authors'] = self.insert(Author, self.authors())
+            counts['books'] = self.insert(Book, self.books())
+            self.insert(Book.subcategory.through, self.book_subcategories())
+            counts['views'] = self.insert(BookViews, self.interactions(BookViews, 'views'))
+            counts['likes'] = self.insert(LikeBook, self.interactions(LikeBook, 'likes'))
+            counts['comments'] = self.insert(BookComment, self.comments())
+        self.finish()
+        return counts
+
+    def finish(self):
+        """Bring the derived data (counters, search index, leaderboards) up to date."""
+        call_command('reconcile_book_counters', batch_size=self.batch_size, stdout=StringIO())
+        if get_search_backend() is not None:
+            call_command('rebuild_search_index', batch_size=self.batch_size, stdout=StringIO())
+        call_command('refresh_leaderboards', stdout=StringIO())
+
+    def users(self):
+        rng = self.rng('user')
+        password = make_password(PASSWORD, salt=PASSWORD_SALT)
+        for i in range(self.scale['users']):
+            created = self.timestamp(rng)
+            yield User(
+                id=self.id('user', i), username=f"bench{i:07d}", email=f"bench{i}@example.com",
+                username_normalized=f"bench{i:07d}", email_normalized=f"bench{i}@example.com",
+                first_name=rng.choice(WORDS).title(), last_name=rng.choice(WORDS).title(),
+                password=password, auth_status=DONE, user_role=ADMIN if i == ADMIN_INDEX else USER,
+                is_staff=i == ADMIN_INDEX, created_time=created, updated_time=created,
+            )
+
+    def countries(self):
+        rng = self.rng('country')
+        for i in range(self.scale['countries']):
+            created = self.timestamp(rng)
+            yield Country(id=self.id('country', i), name=f"{self.words(rng, 1).title()} {i}",
+                          created_time=created, updated_time=created)
+
+    def categories(self):
+        rng = self.rng('category')
+        for i in range(self.scale['categories']):
+            created = self.timestamp(rng)
+            yield Category(id=self.id('category', i), name=f"{self.words(rng, 2).title()} {i}",
+                           category_status=ACTIVE, created_time=created, updated_time=created)
+
+    def subcategories(self):
+        rng = self.rng('subcategory')
+        for i in range(self.scale['categories'] * self.scale['subcategories']):
+            created = self.timestamp(rng)
+            yield SubCategory(id=self.id('subcategory', i), name=f"{self.words(rng, 2).title()} {i}",
+                              category_id=self.id('category', i // self.scale['subcategories']),
+                              created_time=created, updated_time=created)
+
+    def authors(self):
+        rng = self.rng('author')
+        for i in range(self.scale['authors']):
+            created = self.timestamp(rng)
+            yield Author(
+                id=self.id('author', i), full_name=f"{self.words(rng, 2).title()} {i}",
+                birthday=date(1900, 1, 1) + timedelta(days=rng.randrange(365 * 100)),
+                country_id=self.id('country', rng.randrange(self.scale['countries'])),
+                created_time=created, updated_time=created,
+            )
+
+    def books(self):
+        rng = self.rng('book')
+        for i in range(self.scale['books']):
+            created = self.timestamp(rng)
+            yield Book(
+                id=self.id('book', i), title=f"{self.words(rng, 3).title()} {i}"[:60],
+                description=self.words(rng, rng.randrange(20, 80)), image='books/portfolio-img1.jpg',
+                book_status=DRAFT if rng.random() < 0.1 else PUBLISHED,
+                author_id=self.id('author', rng.randrange(self.scale['authors'])),
+                user_id=self.id('user', rng.randrange(self.scale['users'])),
+                created_time=created, updated_time=created,
+            )
+
+    def book_subcategories(self):
+        rng = self.rng('book-subcategory')
+        through = Book.subcategory.through
+        total = self.scale['categories'] * self.scale['subcategories']
+        for i in range(self.scale['books']):
+            for index in rng.sample(range(total), min(rng.randint(1, 3), total)):
+                yield through(book_id=self.id('book', i), subcategory_id=self.id('subcategory', index))
+
+    def interactions(self, model, kind):
+        """Unique (user, book) rows; per-book totals follow an exponential distribution around the mean."""
+        rng = self.rng(kind)
+        mean = self.scale[kind] / self.scale['books']
+        users = range(self.scale['users'])
+        for i in range(self.scale['books']):
+            count = min(len(users), int(rng.expovariate(1 / mean))) if mean else 0
+            for user_index in rng.sample(users, count):
+                created = self.timestamp(rng)
+                yield model(id=self.id(kind, f"{i}:{user_index}"), user_id=self.id('user', user_index),
+                            book_id=self.id('book', i), created_time=created, updated_time=created)
+
+    def comments(self):
+        rng = self.rng('comments')
+        mean = self.scale['comments'] / self.scale['books']
+        index = 0
+        for i in range(self.scale['books']):
+            for _ in range(int(rng.expovariate(1 / mean)) if mean else 0):
+                created = self.timestamp(rng)
+                yield BookComment(id=self.id('comment', index), book_id=self.id('book', i),
+                                  user_id=self.id('user', rng.randrange(self.scale['users'])),
+                                  comment=self.words(rng, rng.randrange(3, 30)),
+                                  created_time=created, updated_time=created)
+                index += 1
+
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from benchmarks.management.commands.benchmark_run import write_comparison
+from benchmarks.runner import load_report
+
+
+class Command(BaseCommand):
+    help = "Compare two benchmark reports; exits with an error when a scenario regressed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('base')
+        parser.add_argument('head')
+        parser.add_argument('--threshold', type=float, default=10, help="Latency growth in percent counted as a regression")
+
+    def handle(self, *args, **options):
+        base, head = load_report(options['base']), load_report(options['head'])
+        if write_comparison(self.stdout, self.style, base, head, options['threshold']):
+            raise CommandError("Benchmark regressions found")
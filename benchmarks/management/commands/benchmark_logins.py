@@ -0,0 +1,32 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from benchmarks.runner import Runner, select
+from users.hashing import password_hashing
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Measure login throughput against the seeded database and report it per CPU core"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--concurrency', type=int, default=2 * (os.cpu_count() or 1))
+        parser.add_argument('--seed', type=int, default=0, help="Seed the database was generated with")
+
+    def handle(self, *args, **options):
+        runner = Runner(options['iterations'], options['warmup'], options['concurrency'], options['seed'])
+        try:
+            result = runner.run(select(['login']))['scenarios']['login']
+        except User.DoesNotExist:
+            raise CommandError("Benchmark users not found; run benchmark_seed with the same --seed first")
+        cores = os.cpu_count() or 1
+        self.stdout.write(f"hasher {settings.PASSWORD_HASHERS[0]}, {settings.PASSWORD_HASH_ITERATIONS} iterations, "
+                          f"{settings.PASSWORD_HASHING_WORKERS} workers, "
+                          f"{settings.PASSWORD_HASHING_MAX_CONCURRENT} concurrent hashes")
+        self.stdout.write(f"{result['requests']} logins, {result['errors']} errors, "
+                          f"p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms")
+        self.stdout.write(f"{result['throughput_rps']} logins/s on {cores} cores, "
+                          f"{round(result['throughput_rps'] / cores, 2)} logins/s per core")
+        self.stdout.write(f"hashing: {password_hashing.get_metrics()}")
@@ -0,0 +1,50 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from benchmarks.runner import Runner, compare, load_report, save_report, select
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Replay the benchmark scenarios against the seeded database and write a JSON report"
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help="Scenario names or glob patterns, all of them by default")
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--concurrency', type=int, default=1)
+        parser.add_argument('--seed', type=int, default=0, help="Seed the database was generated with")
+        parser.add_argument('--cold', action='store_true', help="Clear the caches before every request")
+        parser.add_argument('--output', help="Report path, benchmarks/results/<time>-<revision>.json by default")
+        parser.add_argument('--compare', metavar='REPORT', help="Print the changes against an earlier report")
+        parser.add_argument('--threshold', type=float, default=10, help="Latency growth in percent counted as a regression")
+
+    def handle(self, *args, **options):
+        scenarios = select(options['scenarios'])
+        if not scenarios:
+            raise CommandError("No scenario matches")
+        runner = Runner(options['iterations'], options['warmup'], options['concurrency'], options['seed'],
+                        options['cold'], log=self.stdout.write)
+        try:
+            report = runner.run(scenarios)
+        except User.DoesNotExist:
+            raise CommandError("Benchmark users not found; run benchmark_seed with the same --seed first")
+        path = options['output'] or os.path.join(
+            settings.BASE_DIR, 'benchmarks', 'results',
+            f"{timezone.now():%Y%m%d-%H%M%S}-{(report['revision'] or 'unknown')[:12]}.json",
+        )
+        save_report(report, path)
+        self.stdout.write(self.style.SUCCESS(f"Report written to {path}"))
+        if options['compare']:
+            write_comparison(self.stdout, self.style, load_report(options['compare']), report, options['threshold'])
+
+
+def write_comparison(stdout, style, base, head, threshold):
+    regressions = 0
+    for name, metric, before, after, change, regressed in compare(base, head, threshold):
+        line = f"{name:32} {metric:20} {before:>10} -> {after:>10} {change:+.1f}%"
+        stdout.write(style.ERROR(line) if regressed else line)
+        regressions += regressed
+    stdout.write(f"{regressions} regressions against {base['revision']}")
+    return regressions
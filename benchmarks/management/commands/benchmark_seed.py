@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from book.models import Book
+from benchmarks.generator import Generator, SCALES
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Fill an empty database with a deterministic benchmark catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+        parser.add_argument('--set', action='append', default=[], metavar='TABLE=ROWS',
+                            help="Override one row count of the scale, e.g. --set books=500000")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        scale = dict(SCALES[options['scale']])
+        for override in options['set']:
+            key, _, value = override.partition('=')
+            if key not in scale or not value.isdigit():
+                raise CommandError(f"Invalid override {override!r}, expected one of {', '.join(scale)}=<number>")
+            scale[key] = int(value)
+        if Book.objects.exists() or User.objects.exists():
+            raise CommandError("The database already has users or books; seed an empty database")
+        counts = Generator(scale, seed=options['seed'], batch_size=options['batch_size'], log=self.stdout.write).run()
+        self.stdout.write(self.style.SUCCESS(', '.join(f"{count} {name}" for name, count in counts.items())))
@@ -0,0 +1,225 @@
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+import django
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from book import view_buffer
+from book.models import Author, Book, BookViews, LikeBook, BookComment
+from benchmarks.scenarios import Context, SCENARIOS
+from users.models import User
+
+
+REPORT_VERSION = 1
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))]
+
+
+def select(patterns):
+    if not patterns:
+        return list(SCENARIOS)
+    return [scenario for scenario in SCENARIOS if any(fnmatch(scenario.name, pattern) for pattern in patterns)]
+
+
+def is_error(response):
+    if response.status_code >= 400:
+        return True
+    # Most views answer 200 and report failures in the envelope.
+    if response.get('Content-Type', '').startswith('application/json') and not response.streaming:
+        body = response.json()
+        return isinstance(body, dict) and body.get('success') is False
+    return False
+
+
+def perform(client, context, scenario, i, cold=False):
+    """
+    Run iteration ``i`` of ``scenario`` inside a transaction that is rolled back afterwards.
+
+    Only the request itself is timed and its queries counted; setup and the rollback are not.
+    With ``cold`` every cache is cleared first, so cached endpoints are measured on a miss.
+    """
+    with transaction.atomic():
+        values = scenario.prepare(context, i)
+        method, path, kwargs = scenario.build(context, values)
+        if cold:
+            for cache in caches.all():
+                cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, method)(path, **kwargs)
+            if response.streaming:
+                for chunk in response.streaming_content:
+                    pass
+            elapsed = time.perf_counter() - started
+        transaction.set_rollback(True)
+    query_time = sum(float(query['time']) for query in queries.captured_queries)
+    return elapsed, len(queries.captured_queries), query_time, is_error(response), response.get('X-Cache') == 'HIT'
+
+
+def summarize(scenario, samples, wall_time):
+    latencies = sorted(sample[0] for sample in samples)
+    count = len(samples)
+    milliseconds = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'method': scenario.method.upper(),
+        'path': scenario.path,
+        'requests': count,
+        'errors': sum(sample[3] for sample in samples),
+        'cache_hits': sum(sample[4] for sample in samples),
+        'p50_ms': milliseconds(percentile(latencies, 0.50)),
+        'p95_ms': milliseconds(percentile(latencies, 0.95)),
+        'p99_ms': milliseconds(percentile(latencies, 0.99)),
+        'mean_ms': milliseconds(sum(latencies) / count if count else None),
+        'max_ms': milliseconds(latencies[-1] if latencies else None),
+        'throughput_rps': round(count / wall_time, 2) if wall_time else None,
+        'queries_per_request': round(sum(sample[1] for sample in samples) / count, 2) if count else None,
+        'query_ms_per_request': milliseconds(sum(sample[2] for sample in samples) / count if count else None),
+    }
+
+
+class Runner:
+    """
+    Replays the scenarios in-process through ``django.test.Client`` against the configured database.
+
+    Each scenario gets ``warmup`` untimed iterations and then ``iterations`` timed ones, spread over
+    ``concurrency`` threads with one client and one database connection each. Every request runs in a
+    rolled back transaction, and files are written to a temporary media root, so a run leaves the seeded
+    data as it found it.
+    """
+
+    def __init__(self, iterations=50, warmup=5, concurrency=1, seed=0, cold=False, log=None):
+        self.iterations = iterations
+        self.warmup = warmup
+        self.concurrency = concurrency
+        self.seed = seed
+        self.cold = cold
+        self.log = log or (lambda message: None)
+        self.local = threading.local()
+
+    def worker(self, context, scenario, indexes):
+        if not hasattr(self.local, 'client'):
+            self.local.client = Client(raise_request_exception=False)
+        try:
+            return [perform(self.local.client, context, scenario, i, self.cold) for i in indexes]
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connection.close()
+
+    def run_scenario(self, context, scenario, executor):
+        self.worker(context, scenario, range(self.warmup))
+        indexes = range(self.warmup, self.warmup + self.iterations)
+        started = time.perf_counter()
+        if executor is None:
+            samples = self.worker(context, scenario, indexes)
+        else:
+            parts = [indexes[offset::self.concurrency] for offset in range(self.concurrency)]
+            samples = [sample for part in executor.map(lambda part: self.worker(context, scenario, part), parts)
+                       for sample in part]
+        return summarize(scenario, samples, time.perf_counter() - started)
+
+    def run(self, scenarios):
+        context = Context(self.seed)
+        results = {}
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            MEDIA_ROOT=os.path.join(directory, 'media'),
+            UPLOAD_SESSION_DIR=os.path.join(directory, 'uploads'),
+            METRICS_DIR=os.path.join(directory, 'metrics'),
+            DELIVERY_BACKENDS={'email': 'config.delivery.LocmemBackend', 'sms': 'config.delivery.LocmemBackend'},
+            BOOK_VIEWS_FLUSH_INTERVAL=3600,
+        ):
+            executor = ThreadPoolExecutor(self.concurrency) if self.concurrency > 1 else None
+            try:
+                for scenario in scenarios:
+                    results[scenario.name] = self.run_scenario(context, scenario, executor)
+                    result = results[scenario.name]
+                    self.log(f"{scenario.name}: p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, "
+                             f"{result['queries_per_request']} queries, {result['errors']} errors")
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+                # Views recorded by detail requests must not reach the seeded data.
+                with view_buffer.buffer.lock:
+                    view_buffer.buffer.pending.clear()
+        return self.report(results)
+
+    def report(self, results):
+        return {
+            'version': REPORT_VERSION,
+            'revision': git_revision(),
+            'created': timezone.now().isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'platform': platform.platform(),
+            },
+            'dataset': {
+                'users': User.objects.count(),
+                'authors': Author.objects.count(),
+                'books': Book.objects.count(),
+                'views': BookViews.objects.count(),
+                'likes': LikeBook.objects.count(),
+                'comments': BookComment.objects.count(),
+            },
+            'options': {'iterations': self.iterations, 'warmup': self.warmup, 'concurrency': self.concurrency,
+                        'seed': self.seed, 'cold': self.cold},
+            'scenarios': results,
+        }
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=settings.BASE_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{revision}-dirty" if dirty else revision
+
+
+def save_report(report, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as handle:
+        json.dump(report, handle, indent=2, sort_keys=True)
+
+
+def load_report(path):
+    with open(path) as handle:
+        return json.load(handle)
+
+
+COMPARED = ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request')
+
+
+def compare(base, head, threshold=10):
+    """
+    Rows of ``(scenario, metric, base, head, change_percent, regressed)`` for the scenarios in both reports.
+
+    A metric regresses when it grows by more than ``threshold`` percent; query counts regress on any growth.
+    """
+    rows = []
+    for name in sorted(set(base['scenarios']) & set(head['scenarios'])):
+        for metric in COMPARED:
+            before, after = base['scenarios'][name][metric], head['scenarios'][name][metric]
+            if before is None or after is None:
+                continue
+            change = (after - before) / before * 100 if before else (0 if after == before else float('inf'))
+            limit = 0 if metric == 'queries_per_request' else threshold
+            rows.append((name, metric, before, after, round(change, 1), change > limit))
+    return rows
@@ -0,0 +1,216 @@
+import hashlib
+from io import BytesIO
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from book.models import (Category, SubCategory, Country, Author, Book, BookComment, LikeBook, UploadSession,
+                         BOOK_AUDIO, PUBLISHED)
+from book.uploads import write_chunk
+from benchmarks.generator import make_id, PASSWORD, PASSWORD_SALT, ADMIN_INDEX, READER_INDEX
+from users.models import User, Profile, NEW, VIA_EMAIL
+from users.tokens import ClaimsRefreshToken
+
+
+SAMPLE_SIZE = 100
+AUDIO = bytes(range(256)) * 64
+DOCUMENT = b'%PDF-1.4\n' + b'0' * 16384
+
+
+def cover_image():
+    buffer = BytesIO()
+    Image.new('RGB', (640, 960), (120, 80, 40)).save(buffer, 'JPEG')
+    return SimpleUploadedFile('cover.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+class Context:
+    """
+    Rows the scenarios address, picked deterministically from a seeded database.
+
+    Iteration ``i`` of a scenario uses the ``i``-th id (modulo ``SAMPLE_SIZE``) of each kind, so
+    repeated runs hit the same rows in the same order.
+    """
+
+    def __init__(self, seed=0):
+        self.admin = User.objects.get(id=make_id(seed, 'user', ADMIN_INDEX))
+        self.reader = User.objects.get(id=make_id(seed, 'user', READER_INDEX))
+        self.password_hash = make_password(PASSWORD, salt=PASSWORD_SALT)
+        querysets = {
+            'book': Book.objects.filter(book_status=PUBLISHED),
+            'author': Author.objects.all(),
+            'category': Category.objects.all(),
+            'subcategory': SubCategory.objects.all(),
+            'country': Country.objects.all(),
+            'comment': BookComment.objects.all(),
+            'like': LikeBook.objects.all(),
+            'user': User.objects.all(),
+        }
+        self.ids = {kind: list(queryset.order_by('pk').values_list('pk', flat=True)[:SAMPLE_SIZE])
+                    for kind, queryset in querysets.items()}
+        self.tokens = {}
+
+    def values(self, i):
+        return {kind: ids[i % len(ids)] for kind, ids in self.ids.items() if ids}
+
+    def token(self, user):
+        if user.pk not in self.tokens:
+            self.tokens[user.pk] = str(ClaimsRefreshToken.for_user(user).access_token)
+        return self.tokens[user.pk]
+
+
+class Scenario:
+    """
+    One request against one endpoint.
+
+    ``path`` is formatted with the context values of the iteration plus whatever ``setup(context, values)``
+    returns; ``data`` is a dict or a ``data(context, values)`` callable. ``user`` is ``'admin'``, ``'reader'``,
+    ``None`` (anonymous) or ``'setup'`` for the user returned by ``setup`` under the ``user`` key.
+    """
+
+    def __init__(self, name, method, path, user=None, data=None, setup=None, content_type='application/json',
+                 headers=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.user = user
+        self.data = data
+        self.setup = setup
+        self.content_type = content_type
+        self.headers = headers or {}
+
+    def prepare(self, context, i):
+        values = context.values(i)
+        if self.setup is not None:
+            values.update(self.setup(context, values))
+        return values
+
+    def build(self, context, values):
+        """``(method, path, kwargs)`` for ``django.test.Client.generic``-style dispatch."""
+        path = '/api/v1/' + self.path.format(**values)
+        data = self.data(context, values) if callable(self.data) else self.data
+        headers = {key: value.format(**values) for key, value in self.headers.items()}
+        user = values.get('user') if self.user == 'setup' else getattr(context, self.user or '', None)
+        if isinstance(user, User):
+            headers['Authorization'] = f"Bearer {context.token(user)}"
+        kwargs = {'headers': headers}
+        if data is not None:
+            kwargs['data'] = data
+        if self.content_type is not None and self.method != 'get':
+            kwargs['content_type'] = self.content_type
+        return self.method, path, kwargs
+
+
+def attach_file(field, name, content):
+    def setup(context, values):
+        book = Book.objects.get(pk=values['book'])
+        getattr(book, field).save(name, ContentFile(content))
+        return {}
+    return setup
+
+
+def open_upload(complete=False):
+    def setup(context, values):
+        session = UploadSession.objects.create(user=context.admin, field=BOOK_AUDIO, filename='chapter.mp3',
+                                               size=len(AUDIO), sha256=hashlib.sha256(AUDIO).hexdigest())
+        if complete:
+            write_chunk(session, BytesIO(AUDIO), (0, len(AUDIO) - 1, len(AUDIO)))
+        return {'upload': session.pk}
+    return setup
+
+
+def unlike(context, values):
+    LikeBook.objects.filter(user=context.admin, book_id=values['book']).delete()
+    return {}
+
+
+def new_user(context, values):
+    user = User.objects.bulk_create([User(username='benchmark-new', email='benchmark-new@example.com',
+                                          username_normalized='benchmark-new',
+                                          email_normalized='benchmark-new@example.com',
+                                          password=context.password_hash, auth_status=NEW)])[0]
+    Profile.objects.create(user=user)
+    return {'user': user, 'code': user.create_verify_code(VIA_EMAIL)}
+
+
+def refresh_token(context, values):
+    return {'refresh': str(ClaimsRefreshToken.for_user(context.reader))}
+
+
+def resource(name, path, create_data, update_data, detail_reads=()):
+    """List, create, detail, update, partial update and delete scenarios of one admin-managed resource."""
+    scenarios = [
+        Scenario(f'{name}-list', 'get', f'{path}/'),
+        Scenario(f'{name}-create', 'post', f'{path}/', user='admin', data=create_data),
+        Scenario(f'{name}-detail', 'get', f'{path}/{{{name}}}/'),
+        Scenario(f'{name}-update', 'put', f'{path}/{{{name}}}/', user='admin', data=update_data),
+        Scenario(f'{name}-partial-update', 'patch', f'{path}/{{{name}}}/', user='admin', data=update_data),
+        Scenario(f'{name}-delete', 'delete', f'{path}/{{{name}}}/', user='admin'),
+    ]
+    for suffix in detail_reads:
+        scenarios.append(Scenario(f'{name}-{suffix}', 'get', f'{path}/{{{name}}}/{suffix}/'))
+    return scenarios
+
+
+BOOK_DATA = lambda context, values: {
+    'title': 'Benchmark book', 'description': 'Benchmark description', 'author_id': str(values['author']),
+    'subcategory': [str(values['subcategory'])],
+}
+PASSWORD_CHANGE = {'password': 'Benchmark-pass-2024', 'confirm_password': 'Benchmark-pass-2024'}
+
+SCENARIOS = [
+    *resource('category', 'category', {'name': 'Benchmark'}, {'name': 'Benchmark'}, ('books', 'subcategory')),
+    *resource('subcategory', 'subcategory',
+              lambda context, values: {'name': 'Benchmark', 'category_id': str(values['category'])},
+              lambda context, values: {'name': 'Benchmark', 'category_id': str(values['category'])}, ('books',)),
+    *resource('country', 'country', {'name': 'Benchmark'}, {'name': 'Benchmark'}),
+    *resource('author', 'authors',
+              lambda context, values: {'full_name': 'Benchmark', 'birthday': '1950-01-01', 'country_id': str(values['country'])},
+              lambda context, values: {'full_name': 'Benchmark', 'birthday': '1950-01-01', 'country_id': str(values['country'])},
+              ('books',)),
+    Scenario('book-list', 'get', 'book/'),
+    Scenario('book-create', 'post', 'book/', user='admin', content_type=None,
+             data=lambda context, values: {**BOOK_DATA(context, values), 'image': cover_image()}),
+    Scenario('book-detail', 'get', 'book/{book}/', user='reader'),
+    Scenario('book-update', 'put', 'book/{book}/', user='admin', data=BOOK_DATA),
+    Scenario('book-partial-update', 'patch', 'book/{book}/', user='admin', data={'title': 'Benchmark book'}),
+    Scenario('book-delete', 'delete', 'book/{book}/', user='admin'),
+    Scenario('book-audio', 'get', 'book/{book}/audio/', headers={'Range': 'bytes=0-4095'},
+             setup=attach_file('book_audio', 'chapter.mp3', AUDIO)),
+    Scenario('book-file', 'get', 'book/{book}/file/', setup=attach_file('book_file', 'book.pdf', DOCUMENT)),
+    Scenario('book-views', 'get', 'book/{book}/views/'),
+    Scenario('book-comments', 'get', 'book/{book}/comment/'),
+    Scenario('book-comment-create', 'post', 'book/{book}/comment/', user='reader', data={'comment': 'Benchmark'}),
+    Scenario('comment-detail', 'get', 'comment/{comment}/'),
+    Scenario('comment-update', 'put', 'comment/{comment}/', user='admin', data={'comment': 'Benchmark'}),
+    Scenario('comment-partial-update', 'patch', 'comment/{comment}/', user='admin', data={'comment': 'Benchmark'}),
+    Scenario('comment-delete', 'delete', 'comment/{comment}/', user='admin'),
+    Scenario('liked-books', 'get', 'liked/books', user='reader'),
+    Scenario('book-like', 'post', 'liked/book/{book}/', user='admin', setup=unlike),
+    Scenario('book-unlike', 'delete', 'liked/book/{like}/', user='admin'),
+    Scenario('popular-views', 'get', 'popularbooks/views/'),
+    Scenario('popular-comments', 'get', 'popularbooks/comment/'),
+    Scenario('popular-likes', 'get', 'popularbooks/likes/'),
+    Scenario('popular-blended', 'get', 'popularbooks/blended/'),
+    Scenario('global-search', 'post', 'globalsearch/', data={'query': 'tarix'}),
+    Scenario('autocomplete', 'get', 'autocomplete/', data={'q': 'sayo'}),
+    Scenario('upload-create', 'post', 'upload/', user='admin',
+             data={'field': BOOK_AUDIO, 'filename': 'chapter.mp3', 'size': len(AUDIO)}),
+    Scenario('upload-status', 'get', 'upload/{upload}/', user='admin', setup=open_upload()),
+    Scenario('upload-chunk', 'put', 'upload/{upload}/', user='admin', setup=open_upload(), data=AUDIO,
+             content_type='application/octet-stream', headers={'Content-Range': f'bytes 0-{len(AUDIO) - 1}/{len(AUDIO)}'}),
+    Scenario('upload-complete', 'post', 'upload/{upload}/complete/', user='admin', setup=open_upload(complete=True),
+             data=lambda context, values: {'book_id': str(values['book'])}),
+    Scenario('login', 'post', 'login/', data=lambda context, values: {'userinput': context.reader.username, 'password': PASSWORD}),
+    Scenario('login-refresh', 'post', 'login/refresh', setup=refresh_token,
+             data=lambda context, values: {'refresh': values['refresh']}),
+    Scenario('logout', 'post', 'logout/', user='reader', setup=refresh_token,
+             data=lambda context, values: {'refresh': values['refresh']}),
+    Scenario('signup', 'post', 'signup/', data={'email_phone_number': 'benchmark-signup@example.com'}),
+    Scenario('verify', 'post', 'verify/', user='setup', setup=new_user, data=lambda context, values: {'code': values['code']}),
+    Scenario('new-verify', 'get', 'new-verify/', user='reader'),
+    Scenario('change-user', 'patch', 'change-user/', user='reader',
+             data={'first_name': 'Benchmark', 'last_name': 'Reader', 'username': 'benchmark-reader', **PASSWORD_CHANGE}),
+    Scenario('forgot-password', 'post', 'forgot-password/', data=lambda context, values: {'email_or_phone': context.reader.email}),
+    Scenario('reset-password', 'put', 'reset-password/', user='reader', data=PASSWORD_CHANGE),
+    Scenario('profile', 'get', 'user/{user}/profile/', user='reader'),
+]
@@ -0,0 +1,30 @@
+from django.test import TestCase
+from book.models import Book, BookViews
+from benchmarks.generator import Generator, SCALES, make_id
+from benchmarks.runner import Runner, compare, select
+
+
+class BenchmarkTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.counts = Generator(SCALES['tiny'], seed=7).run()
+
+    def test_generator_is_deterministic(self):
+        self.assertEqual(Book.objects.count(), SCALES['tiny']['books'])
+        self.assertEqual(BookViews.objects.count(), self.counts['views'])
+        first = next(Generator(SCALES['tiny'], seed=7).books())
+        book = Book.objects.get(id=make_id(7, 'book', 0))
+        self.assertEqual((book.title, book.author_id, book.created_time), (first.title, first.author_id, first.created_time))
+        self.assertEqual(book.views_count, BookViews.objects.filter(book=book).count())
+
+    def test_scenarios_run_and_leave_data_untouched(self):
+        books = Book.objects.count()
+        report = Runner(iterations=2, warmup=1, seed=7).run(select(['book-*', 'upload-*', 'login', 'verify']))
+        self.assertEqual(Book.objects.count(), books)
+        for name, result in report['scenarios'].items():
+            self.assertEqual((name, result['errors']), (name, 0))
+            self.assertEqual(result['requests'], 2)
+        self.assertGreater(report['scenarios']['book-detail']['queries_per_request'], 0)
+        regressions = [row for row in compare(report, report) if row[-1]]
+        self.assertEqual(regressions, [])
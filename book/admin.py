@@ -1,5 +1,5 @@
 from django.contrib import admin
-from book.models import Category, SubCategory, Country, Author, Book, BookComment, BookViews, LikeBook
+from book.models import Category, SubCategory, Country, Author, Book, BookComment, BookViews, LikeBook, Leaderboard, UploadSession, MediaBlob, CatalogImport
 
 
 admin.site.register(Category)
@@ -9,4 +9,8 @@ admin.site.register(Author)
 admin.site.register(Book)
 admin.site.register(BookViews)
 admin.site.register(LikeBook)
-admin.site.register(BookComment)
\ No newline at end of file
+admin.site.register(BookComment)
+admin.site.register(Leaderboard)
+admin.site.register(UploadSession)
+admin.site.register(MediaBlob)
+admin.site.register(CatalogImport)
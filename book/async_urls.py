@@ -0,0 +1,13 @@
+from django.urls import path
+from book.async_views import (BookListView, BookDetailView, BookCommentListView, BookSearchView, LeaderboardView,
+                              BookAudioView)
+
+
+urlpatterns = [
+    path('book/', BookListView.as_view(), name='v2-book'),
+    path('book/<str:id>/', BookDetailView.as_view(), name='v2-book-retrive'),
+    path('book/<str:id>/comment/', BookCommentListView.as_view(), name='v2-book-comment'),
+    path('book/<str:id>/audio/', BookAudioView.as_view(), name='v2-book-audio'),
+    path('globalsearch/', BookSearchView.as_view(), name='v2-global-search'),
+    path('popularbooks/<str:board_name>/', LeaderboardView.as_view(), name='v2-book-popular'),
+]
@@ -0,0 +1,161 @@
+from asgiref.sync import sync_to_async
+from django.db.models import Q, QuerySet
+from django.http import JsonResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from users.authentication import ClaimsJWTAuthentication
+from book.models import Book, BookComment, PUBLISHED, VIEWS, COMMENTS, LIKES, BLENDED
+from book.serializers import BookSerializer, BookCommentSerializer, BookSearchSerializer
+from book.search import search_books
+from book.leaderboards import get_leaderboard, LeaderboardResults
+from book.view_buffer import record_view
+from config.custom_pagination import CustomPagination, acached_count
+from config.ranged_response import ranged_file_response
+
+
+EMPTY = {
+    "data": [],
+    "status": status.HTTP_200_OK,
+    "success":True,
+    "message":"Ma'lumot mavjud emas!"
+}
+NOT_FOUND = {
+    "data": [],
+    "status": status.HTTP_400_BAD_REQUEST,
+    "success":False,
+    "message":"Berilgan id bo'yicha ma'lumot topilmadi!"
+}
+
+
+def get_user_id(request):
+    """Id of the JWT or session user, or None; session users may hit the database, so call it from a thread."""
+    try:
+        result = ClaimsJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        result = None
+    user = result[0] if result else request.user
+    return user.pk if user.is_authenticated else None
+
+
+def get_page_link(request, page_number):
+    url = request.build_absolute_uri()
+    if page_number == 1:
+        return remove_query_param(url, CustomPagination.page_query_param)
+    return replace_query_param(url, CustomPagination.page_query_param, page_number)
+
+
+async def paginate(request, object_list, serializer_class, extra=None):
+    """
+    Page-number pagination with the same envelope as ``CustomPagination``.
+
+    Querysets are counted and sliced with the async ORM; other sliceable results (search hits,
+    leaderboards) run their synchronous queries in a worker thread.
+    """
+    try:
+        page_number = max(int(request.GET.get(CustomPagination.page_query_param, 1)), 1)
+        page_size = int(request.GET.get(CustomPagination.page_size_query_param, CustomPagination.page_size))
+    except ValueError:
+        return JsonResponse({'detail': CustomPagination.invalid_page_message}, status=status.HTTP_404_NOT_FOUND)
+    page_size = min(max(page_size, 1), CustomPagination.max_page_size)
+    offset = (page_number - 1) * page_size
+    if isinstance(object_list, QuerySet):
+        count = await acached_count(object_list)
+        rows = [row async for row in object_list[offset:offset + page_size]]
+    else:
+        count = await sync_to_async(object_list.count)()
+        rows = await sync_to_async(object_list.__getitem__)(slice(offset, offset + page_size))
+    if not rows and page_number > 1:
+        return JsonResponse({'detail': CustomPagination.invalid_page_message}, status=status.HTTP_404_NOT_FOUND)
+    data = {
+        'next': get_page_link(request, page_number + 1) if offset + page_size < count else None,
+        'previous': get_page_link(request, page_number - 1) if page_number > 1 else None,
+        'count': count,
+        'count_exact': True,
+        'results': serializer_class(rows, many=True).data,
+    }
+    data.update(extra or {})
+    return JsonResponse(data)
+
+
+class BookListView(View):
+
+    async def get(self, request):
+        books = BookSerializer.setup_queryset(Book.objects.filter(book_status=PUBLISHED).order_by('-created_time'))
+        if not await books.aexists():
+            return JsonResponse(EMPTY)
+        return await paginate(request, books, BookSerializer)
+
+
+class BookDetailView(View):
+
+    async def get(self, request, id):
+        try:
+            book = await BookSerializer.setup_queryset(Book.objects.all()).aget(id=id)
+        except (Book.DoesNotExist, ValueError):
+            return JsonResponse(NOT_FOUND)
+        user_id = await sync_to_async(get_user_id)(request)
+        if user_id is not None:
+            await sync_to_async(record_view)(user_id, book.pk)
+        data = {
+            "data": BookSerializer(book).data,
+            "status": status.HTTP_200_OK,
+            "success":True
+        }
+        return JsonResponse(data)
+
+
+class BookCommentListView(View):
+
+    async def get(self, request, id):
+        comments = BookCommentSerializer.setup_queryset(BookComment.objects.filter(book__id=id).order_by('-created_time'))
+        try:
+            if not await comments.aexists():
+                return JsonResponse(EMPTY)
+        except ValueError:
+            return JsonResponse(NOT_FOUND)
+        return await paginate(request, comments, BookCommentSerializer)
+
+
+class BookSearchView(View):
+
+    async def get(self, request):
+        q = request.GET.get('q', '').strip()
+        if not q:
+            return JsonResponse({'q': ["This field is required."]}, status=status.HTTP_400_BAD_REQUEST)
+        # The search backend binds a connection, so it is built in the thread that runs its queries.
+        books = await sync_to_async(search_books)(q, BookSerializer.setup_queryset(Book.objects.all()))
+        if books is None:
+            books = BookSerializer.setup_queryset(Book.objects.filter(Q(title__icontains=q) | Q(description__icontains=q) | Q(author__full_name__icontains=q)).order_by('-created_time'))
+        return await paginate(request, books, BookSearchSerializer)
+
+
+class LeaderboardView(View):
+    boards = (VIEWS, COMMENTS, LIKES, BLENDED)
+
+    async def get(self, request, board_name):
+        if board_name not in self.boards:
+            return JsonResponse(NOT_FOUND)
+        board = await sync_to_async(get_leaderboard)(board_name)
+        if not board.book_ids:
+            return JsonResponse(EMPTY)
+        books = LeaderboardResults(board, BookSerializer.setup_queryset(Book.objects.filter(book_status=PUBLISHED)))
+        return await paginate(request, books, BookSerializer, {'refreshed_time': board.refreshed_time})
+
+
+class BookAudioView(View):
+    file_field = 'book_audio'
+
+    async def get(self, request, id):
+        try:
+            book = await Book.objects.only(self.file_field).aget(id=id)
+        except (Book.DoesNotExist, ValueError):
+            return JsonResponse(NOT_FOUND)
+        fieldfile = getattr(book, self.file_field)
+        if not fieldfile:
+            return JsonResponse(NOT_FOUND)
+        try:
+            return await sync_to_async(ranged_file_response)(request, fieldfile, as_attachment=True, asynchronous=True)
+        except OSError:
+            return JsonResponse(NOT_FOUND)
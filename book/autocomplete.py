@@ -0,0 +1,290 @@
+import logging
+import os
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import islice
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Max, Q
+from django.utils import timezone
+from book.models import AUTHOR, BOOK, Author, Book, CatalogChange, PUBLISHED
+
+
+logger = logging.getLogger(__name__)
+
+PRUNE_INTERVAL = 3600
+READ_BATCH_SIZE = 500
+
+
+APOSTROPHES = "'`\u2018\u2019\u02bb\u02bc"
+
+
+def normalize(text):
+    # Apostrophes are part of Uzbek latin letters (o', g'), so they are dropped rather than split on.
+    text = unicodedata.normalize('NFKD', text.casefold())
+    return ''.join(char if char.isalnum() else ' ' for char in text
+                   if not unicodedata.combining(char) and char not in APOSTROPHES)
+
+
+def get_words(text):
+    return normalize(text).split()
+
+
+def get_trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def prefix_distance(term, word, limit):
+    """Smallest edit distance between ``term`` and any prefix of ``word``, or ``limit + 1`` once it is exceeded."""
+    previous = list(range(len(word) + 1))
+    for i, char in enumerate(term, 1):
+        current = [i]
+        for j, other in enumerate(word, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous)
+
+
+def allowed_typos(term):
+    if len(term) <= 3:
+        return 0
+    return 1 if len(term) <= 6 else settings.AUTOCOMPLETE_MAX_TYPOS
+
+
+class AutocompleteIndex:
+    """
+    In-memory prefix and trigram index over book titles and author names.
+
+    Prefix matches come from a sorted word list; when they do not fill the result, trigram
+    overlap picks candidate words that are confirmed with a bounded edit distance. Edits made by
+    other processes reach it through the ``CatalogChange`` log, one entry at a time.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.entries = {}
+        self.words = []
+        self.trigrams = defaultdict(set)
+        self.word_counts = Counter()
+        self.pid = None
+        self.last_change = 0
+        self.seen = {}
+        self.synced_at = 0
+        self.pruned_at = 0
+
+    def add(self, kind, pk, text):
+        key = (kind, str(pk))
+        with self.lock:
+            self.remove(kind, pk)
+            words = get_words(text)
+            self.entries[key] = (text, words)
+            for word in set(words):
+                insort(self.words, (word, key))
+                self.word_counts[word] += 1
+                if self.word_counts[word] == 1:
+                    for trigram in get_trigrams(word):
+                        self.trigrams[trigram].add(word)
+
+    def remove(self, kind, pk):
+        key = (kind, str(pk))
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return
+            for word in set(entry[1]):
+                position = bisect_left(self.words, (word, key))
+                if position < len(self.words) and self.words[position] == (word, key):
+                    del self.words[position]
+                self.word_counts[word] -= 1
+                if self.word_counts[word] <= 0:
+                    del self.word_counts[word]
+                    for trigram in get_trigrams(word):
+                        self.trigrams[trigram].discard(word)
+
+    def build(self):
+        # Changes logged while the rows are read are applied again by the first sync.
+        last_change = CatalogChange.objects.aggregate(last=Max('id'))['last'] or 0
+        entries, words, trigrams, word_counts = {}, [], defaultdict(set), Counter()
+        sources = [
+            (BOOK, Book.objects.filter(book_status=PUBLISHED).values_list('id', 'title')),
+            (AUTHOR, Author.objects.values_list('id', 'full_name')),
+        ]
+        for kind, rows in sources:
+            for pk, text in rows.iterator(chunk_size=2000):
+                key = (kind, str(pk))
+                entries[key] = (text, get_words(text))
+                for word in set(entries[key][1]):
+                    words.append((word, key))
+                    word_counts[word] += 1
+        for word in word_counts:
+            for trigram in get_trigrams(word):
+                trigrams[trigram].add(word)
+        words.sort()
+        with self.lock:
+            self.entries, self.words, self.trigrams, self.word_counts = entries, words, trigrams, word_counts
+            self.last_change, self.seen = last_change, {}
+            self.synced_at = time.monotonic()
+
+    def ensure_built(self):
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid != os.getpid():
+                self.build()
+                if settings.AUTOCOMPLETE_SYNC_IN_BACKGROUND:
+                    threading.Thread(target=self.run_sync, name='autocomplete-sync', daemon=True).start()
+                self.pid = os.getpid()
+
+    def sync(self):
+        """
+        Apply the changes logged since the last sync. Each changed entry is re-read, so the order rows
+        commit in does not matter, and rows committed up to ``AUTOCOMPLETE_SYNC_OVERLAP`` seconds late are still found.
+        """
+        overlap = timezone.now() - timedelta(seconds=settings.AUTOCOMPLETE_SYNC_OVERLAP)
+        with self.lock:
+            self.seen = {pk: created for pk, created in self.seen.items() if created >= overlap}
+            last_change, seen = self.last_change, set(self.seen)
+        fresh, changed = {}, {BOOK: set(), AUTHOR: set()}
+        rows = CatalogChange.objects.filter(Q(id__gt=last_change) | Q(created_time__gte=overlap))
+        for pk, kind, object_id, created in rows.values_list('id', 'kind', 'object_id', 'created_time'):
+            if pk not in seen:
+                fresh[pk] = created
+                changed[kind].add(object_id)
+        texts = {
+            BOOK: self.read(Book.objects.filter(book_status=PUBLISHED), 'title', changed[BOOK]),
+            AUTHOR: self.read(Author.objects.all(), 'full_name', changed[AUTHOR]),
+        }
+        with self.lock:
+            for kind, pks in changed.items():
+                for pk in pks:
+                    if pk in texts[kind]:
+                        self.add(kind, pk, texts[kind][pk])
+                    else:
+                        self.remove(kind, pk)
+            self.seen.update(fresh)
+            self.last_change = max(last_change, *fresh) if fresh else last_change
+            self.synced_at = time.monotonic()
+        return len(fresh)
+
+    def read(self, queryset, field, pks):
+        texts, pks = {}, iter(pks)
+        while batch := list(islice(pks, READ_BATCH_SIZE)):
+            texts.update(queryset.filter(pk__in=batch).values_list('id', field))
+        return texts
+
+    def prune(self):
+        """Drop log rows older than ``CATALOG_CHANGE_RETENTION_DAYS``; any worker may do it."""
+        self.pruned_at = time.monotonic()
+        cutoff = timezone.now() - timedelta(days=settings.CATALOG_CHANGE_RETENTION_DAYS)
+        CatalogChange.objects.filter(created_time__lt=cutoff).delete()
+
+    def run_sync(self):
+        while True:
+            time.sleep(settings.AUTOCOMPLETE_SYNC_INTERVAL)
+            try:
+                close_old_connections()
+                self.sync()
+                if time.monotonic() - self.pruned_at >= PRUNE_INTERVAL:
+                    self.prune()
+            except Exception:
+                logger.exception("Syncing the autocomplete index failed")
+
+    def prefix_matches(self, term, limit, exact=False):
+        matches = []
+        position = bisect_left(self.words, (term,))
+        while position < len(self.words) and len(matches) < limit:
+            word, key = self.words[position]
+            if word != term if exact else not word.startswith(term):
+                break
+            matches.append(key)
+            position += 1
+        return matches
+
+    def fuzzy_matches(self, term, limit):
+        # Trigrams index distinct words, so the overlap count stays small however many entries share them.
+        trigrams = get_trigrams(term)
+        overlap = Counter()
+        for trigram in trigrams:
+            overlap.update(self.trigrams.get(trigram, ()))
+        typos = allowed_typos(term)
+        # Each edit breaks at most three trigrams, and the closing one is lost when the word runs on.
+        required = len(trigrams) - 3 * typos - 1
+        matches = []
+        for word, shared in overlap.most_common(limit):
+            if shared < required:
+                break
+            if prefix_distance(term, word[:len(term) + typos], typos) <= typos:
+                matches.extend(self.prefix_matches(word, limit - len(matches), exact=True))
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    def score(self, key, terms):
+        distance = 0
+        words = self.entries[key][1]
+        for term in terms:
+            typos = allowed_typos(term)
+            best = min((prefix_distance(term, word, typos) for word in words), default=typos + 1)
+            if best > typos:
+                return None
+            distance += best
+        return distance
+
+    def suggest(self, query, limit=10):
+        terms = get_words(query)
+        if not terms:
+            return []
+        anchor = max(terms, key=len)
+        candidate_limit = settings.AUTOCOMPLETE_CANDIDATE_LIMIT
+        with self.lock:
+            candidates = dict.fromkeys(self.prefix_matches(anchor, candidate_limit))
+            if len(candidates) < limit and allowed_typos(anchor):
+                candidates.update(dict.fromkeys(self.fuzzy_matches(anchor, candidate_limit)))
+            scored = []
+            for key in candidates:
+                distance = self.score(key, terms)
+                if distance is not None:
+                    text = self.entries[key][0]
+                    scored.append((distance, len(text), text, key))
+        scored.sort()
+        return [{'type': kind, 'id': pk, 'text': text} for _, _, text, (kind, pk) in scored[:limit]]
+
+
+index = AutocompleteIndex()
+
+
+def get_index():
+    """
+    Return the process index, built on first use. A background thread applies changes logged by
+    other processes every ``AUTOCOMPLETE_SYNC_INTERVAL`` seconds; without it they are synced here.
+    """
+    index.ensure_built()
+    if (not settings.AUTOCOMPLETE_SYNC_IN_BACKGROUND
+            and time.monotonic() - index.synced_at >= settings.AUTOCOMPLETE_SYNC_INTERVAL):
+        index.sync()
+    return index
+
+
+def record_changes(kind, pks):
+    """Log changes written without signals, such as ``bulk_create``; every process applies them on its next sync."""
+    CatalogChange.objects.bulk_create([CatalogChange(kind=kind, object_id=pk) for pk in pks])
+
+
+def apply_change(kind, pk, text=None):
+    """Log a catalog change for the other processes and apply it to this process's index."""
+    change = CatalogChange.objects.create(kind=kind, object_id=pk)
+    if index.pid != os.getpid():
+        return
+    with index.lock:
+        index.seen[change.id] = change.created_time
+        if text is None:
+            index.remove(kind, pk)
+        else:
+            index.add(kind, pk, text)
@@ -0,0 +1,153 @@
+import csv
+import json
+import zlib
+from datetime import timedelta
+from itertools import islice
+from urllib.parse import urljoin
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Max
+from django.utils import timezone
+from book.models import BOOK, Book, CatalogChange, CSV, JSONL, PUBLISHED
+
+
+COLUMNS = (
+    'id', 'title', 'description', 'author_id', 'author', 'country', 'categories', 'subcategories',
+    'views_count', 'likes_count', 'comments_count', 'image_url', 'book_file_url', 'book_audio_url',
+    'created_time', 'updated_time', 'deleted',
+)
+FIELDS = (
+    'id', 'title', 'description', 'author_id', 'author__full_name', 'author__country__name',
+    'views_count', 'likes_count', 'comments_count', 'image', 'book_file', 'book_audio',
+    'created_time', 'updated_time',
+)
+BLOCK_SIZE = 64 * 1024
+CONTENT_TYPES = {CSV: 'text/csv; charset=utf-8', JSONL: 'application/x-ndjson; charset=utf-8'}
+
+
+def published_books(updated_since=None):
+    """
+    Published books in ``(updated_time, id)`` order, so an export can be continued from its start time.
+    Counter changes bump ``updated_time`` too, so incremental exports carry the new counts.
+    """
+    books = Book.objects.filter(book_status=PUBLISHED)
+    if updated_since is not None:
+        books = books.filter(updated_time__gte=updated_since)
+    return books.order_by('updated_time', 'id').values_list(*FIELDS)
+
+
+def media_url(name, base_url):
+    if not name:
+        return ''
+    return urljoin(base_url, default_storage.url(name)) if base_url else default_storage.url(name)
+
+
+def export_rows(updated_since=None, base_url='', chunk_size=None):
+    """
+    Yield one flat dict per published book. Incremental exports end with a tombstone,
+    ``{'id', 'updated_time', 'deleted': True}``, for each book deleted or unpublished since ``updated_since``.
+
+    The books are read with ``iterator()``, which uses a server-side cursor where the database has one,
+    and their subcategories with one query per chunk, so memory stays bounded by ``chunk_size``.
+    """
+    chunk_size = chunk_size or settings.CATALOG_EXPORT_CHUNK_SIZE
+    rows = published_books(updated_since).iterator(chunk_size=chunk_size)
+    links = Book.subcategory.through.objects
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        subcategories = {}
+        for book_id, name, category in links.filter(book_id__in=[row[0] for row in chunk]).values_list(
+                'book_id', 'subcategory__name', 'subcategory__category__name').order_by('subcategory__name'):
+            subcategories.setdefault(book_id, []).append((name, category))
+        for (pk, title, description, author_id, author, country, views, likes, comments, image, book_file,
+             book_audio, created, updated) in chunk:
+            names = subcategories.get(pk, [])
+            yield {
+                'id': str(pk), 'title': title, 'description': description, 'author_id': str(author_id),
+                'author': author, 'country': country,
+                'categories': sorted({category for _, category in names}),
+                'subcategories': [name for name, _ in names],
+                'views_count': views, 'likes_count': likes, 'comments_count': comments,
+                'image_url': media_url(image, base_url), 'book_file_url': media_url(book_file, base_url),
+                'book_audio_url': media_url(book_audio, base_url),
+                'created_time': created.isoformat(), 'updated_time': updated.isoformat(), 'deleted': False,
+            }
+    if updated_since is not None:
+        yield from removed_books(updated_since, chunk_size)
+
+
+def tombstones_kept_since(updated_since):
+    """Whether the ``CatalogChange`` log still covers ``updated_since``; older rows are pruned."""
+    return updated_since >= timezone.now() - timedelta(days=settings.CATALOG_CHANGE_RETENTION_DAYS)
+
+
+def removed_books(updated_since, chunk_size):
+    """Tombstones for books deleted or unpublished since ``updated_since``, read from the ``CatalogChange`` log."""
+    changes = (CatalogChange.objects.filter(kind=BOOK, created_time__gte=updated_since)
+               .values_list('object_id').annotate(changed=Max('created_time')).order_by('changed', 'object_id'))
+    rows = changes.iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        published = set(Book.objects.filter(pk__in=[pk for pk, _ in chunk], book_status=PUBLISHED)
+                        .values_list('id', flat=True))
+        for pk, changed in chunk:
+            if pk not in published:
+                yield {'id': str(pk), 'updated_time': changed.isoformat(), 'deleted': True}
+
+
+def jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    """
+    CSV with a header row; list columns are ``|``-separated, as ``import_catalog`` reads them, ``deleted``
+    is 0 or 1 and tombstones leave the book columns empty.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        values = [row.get(column, '') for column in COLUMNS]
+        yield writer.writerow(['|'.join(value) if isinstance(value, list) else
+                               int(value) if isinstance(value, bool) else value for value in values])
+
+
+def blocks(lines, size=BLOCK_SIZE):
+    """Join lines into UTF-8 blocks of about ``size`` bytes instead of sending one chunk per row."""
+    pending, length = [], 0
+    for line in lines:
+        data = line.encode()
+        pending.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(pending)
+            pending, length = [], 0
+    if pending:
+        yield b''.join(pending)
+
+
+def gzipped(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_catalog(format, compress=False, updated_since=None, base_url='', chunk_size=None):
+    """The byte blocks of a catalog export in ``format`` (``csv`` or ``jsonl``), gzipped with ``compress``."""
+    rows = export_rows(updated_since, base_url, chunk_size)
+    content = blocks(csv_lines(rows) if format == CSV else jsonl_lines(rows))
+    return gzipped(content) if compress else content
+
+
+def export_filename(format, compress, started):
+    return f"catalog-{started:%Y%m%dT%H%M%SZ}.{format}{'.gz' if compress else ''}"
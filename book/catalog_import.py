@@ -0,0 +1,279 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import date, timedelta
+from itertools import islice
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from book.models import (Author, Book, Category, CatalogImport, Country, SubCategory,
+                         ACTIVE, AUTHOR, BOOK, COMPLETE, CSV, DRAFT, FAILED, JSONL, PUBLISHED, RUNNING)
+from book.autocomplete import record_changes
+from book.search import get_search_backend
+from config.response_cache import bump_generation
+from config.storage import adjust_refcounts
+
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {'.csv': CSV, '.jsonl': JSONL, '.ndjson': JSONL}
+MAX_ERRORS = 100
+READ_SIZE = 64 * 1024
+
+
+def detect_format(name):
+    return EXTENSIONS.get(os.path.splitext(name)[1].lower())
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(READ_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def store_upload(upload):
+    """Copy an uploaded catalog to ``CATALOG_IMPORT_DIR/<sha256><ext>`` and return ``(path, digest)``."""
+    os.makedirs(settings.CATALOG_IMPORT_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=settings.CATALOG_IMPORT_DIR, suffix='.tmp', delete=False) as temporary:
+        for chunk in upload.chunks():
+            digest.update(chunk)
+            temporary.write(chunk)
+    extension = os.path.splitext(upload.name)[1].lower()
+    path = os.path.join(settings.CATALOG_IMPORT_DIR, f"{digest.hexdigest()}{extension}")
+    os.replace(temporary.name, path)
+    return path, digest.hexdigest()
+
+
+def read_rows(path, format):
+    """Yield ``(row_number, row)``: dicts for CSV, raw lines for JSONL (decoded by ``clean_row``)."""
+    with open(path, encoding='utf-8-sig', newline='') as handle:
+        if format == CSV:
+            yield from enumerate(csv.DictReader(handle), 1)
+        else:
+            for number, line in enumerate(handle, 1):
+                if line.strip():
+                    yield number, line
+
+
+def text(row, key, max_length, required=True):
+    value = row.get(key)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise ValueError(f"{key} is required")
+    if len(value) > max_length:
+        raise ValueError(f"{key} is longer than {max_length} characters")
+    return value
+
+
+def clean_row(row):
+    """
+    Validate one catalog row.
+
+    Keys: ``title``, ``description``, ``author``, ``author_birthday`` (ISO date, needed for new authors),
+    ``country``, ``category``, ``subcategories`` (a list, or ``|``-separated in CSV), ``status`` and
+    ``image`` (an existing storage name).
+    """
+    if isinstance(row, str):
+        row = json.loads(row)
+        if not isinstance(row, dict):
+            raise ValueError("row must be an object")
+    subcategories = row.get('subcategories') or []
+    if isinstance(subcategories, str):
+        subcategories = subcategories.split('|')
+    subcategories = [name.strip() for name in subcategories if name and name.strip()]
+    if any(len(name) > 50 for name in subcategories):
+        raise ValueError("subcategories are longer than 50 characters")
+    category = text(row, 'category', 50, required=bool(subcategories))
+    birthday = text(row, 'author_birthday', 10, required=False)
+    book_status = text(row, 'status', 31, required=False) or DRAFT
+    if book_status not in (DRAFT, PUBLISHED):
+        raise ValueError(f"status must be {DRAFT} or {PUBLISHED}")
+    return {
+        'title': text(row, 'title', 60),
+        'description': text(row, 'description', 2000, required=False),
+        'author': text(row, 'author', 255),
+        'author_birthday': date.fromisoformat(birthday) if birthday else None,
+        'country': text(row, 'country', 100),
+        'category': category,
+        'subcategories': list(dict.fromkeys(subcategories)),
+        'status': book_status,
+        'image': text(row, 'image', 100, required=False),
+    }
+
+
+class CatalogImporter:
+    """
+    Streams a catalog file into the database in chunks of ``CATALOG_IMPORT_CHUNK_SIZE`` rows.
+
+    Countries, authors, categories and subcategories are resolved through in-memory maps keyed by their
+    case-folded names (authors by name and country), loaded once and extended with the rows each chunk
+    creates. A chunk's rows, books, subcategory links and the job's ``rows`` checkpoint are committed in
+    one transaction, so an interrupted import resumes after the last committed chunk.
+    """
+
+    def __init__(self, job, chunk_size=None, log=None):
+        self.job = job
+        self.chunk_size = chunk_size or settings.CATALOG_IMPORT_CHUNK_SIZE
+        self.log = log or (lambda message: None)
+
+    def load_maps(self):
+        self.countries = {name.casefold(): pk for pk, name in Country.objects.values_list('pk', 'name').iterator()}
+        self.authors = {(name.casefold(), country_id): pk for pk, name, country_id
+                        in Author.objects.values_list('pk', 'full_name', 'country_id').iterator()}
+        self.categories = {name.casefold(): pk for pk, name in Category.objects.values_list('pk', 'name').iterator()}
+        self.subcategories = {(category_id, name.casefold()): pk for pk, name, category_id
+                              in SubCategory.objects.values_list('pk', 'name', 'category_id').iterator()}
+
+    def run(self):
+        self.load_maps()
+        rows = islice(read_rows(self.job.path, self.job.format), self.job.rows, None)
+        if self.job.rows:
+            self.log(f"Resuming after row {self.job.rows}")
+        started = time.monotonic()
+        imported = 0
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            self.import_chunk(chunk)
+            imported += len(chunk)
+            elapsed = time.monotonic() - started
+            self.log(f"{self.job.rows} rows, {self.job.books_created} books, {self.job.rows_failed} failed "
+                     f"({imported / elapsed if elapsed else 0:.0f} rows/s)")
+        self.job.status = COMPLETE
+        self.job.save(update_fields=['status', 'updated_time'])
+        for model in (Country, Author, Category, SubCategory, Book):
+            bump_generation(model)
+        return self.job
+
+    def resolve(self, mapping, staged, key, factory):
+        pk = mapping.get(key) or staged.get(key, (None,))[0]
+        if pk is None:
+            pk = uuid.uuid4()
+            staged[key] = (pk, factory(pk))
+        return pk
+
+    def import_chunk(self, chunk):
+        staged = {'countries': {}, 'authors': {}, 'categories': {}, 'subcategories': {}}
+        books, links, images, search_rows, errors = [], [], Counter(), [], []
+        for number, row in chunk:
+            try:
+                record = clean_row(row)
+                book = self.build_book(record, staged, links)
+            except (ValueError, TypeError) as error:
+                errors.append({'row': number, 'error': str(error)})
+                continue
+            books.append(book)
+            search_rows.append((book.pk, book.title, book.description, record['author']))
+            if record['image']:
+                images[record['image']] += 1
+        search_backend = get_search_backend()
+
+        with transaction.atomic():
+            Country.objects.bulk_create([row for _, row in staged['countries'].values()])
+            Author.objects.bulk_create([row for _, row in staged['authors'].values()])
+            Category.objects.bulk_create([row for _, row in staged['categories'].values()])
+            SubCategory.objects.bulk_create([row for _, row in staged['subcategories'].values()])
+            Book.objects.bulk_create(books)
+            Book.subcategory.through.objects.bulk_create(links)
+            record_changes(AUTHOR, [pk for pk, _ in staged['authors'].values()])
+            record_changes(BOOK, [book.pk for book in books])
+            adjust_refcounts(images, 1)
+            if search_backend is not None and search_rows:
+                # The books are new, so their entries are inserted without the delete ``index_rows`` does.
+                search_backend.insert(search_rows)
+            self.job.rows += len(chunk)
+            self.job.books_created += len(books)
+            self.job.rows_failed += len(errors)
+            self.job.errors = (self.job.errors + errors)[:MAX_ERRORS]
+            self.job.save(update_fields=['rows', 'books_created', 'rows_failed', 'errors', 'updated_time'])
+
+        for name, mapping in (('countries', self.countries), ('authors', self.authors),
+                              ('categories', self.categories), ('subcategories', self.subcategories)):
+            mapping.update((key, pk) for key, (pk, _) in staged[name].items())
+
+    def build_book(self, record, staged, links):
+        country_id = self.resolve(self.countries, staged['countries'], record['country'].casefold(),
+                                  lambda pk: Country(id=pk, name=record['country']))
+        author_key = (record['author'].casefold(), country_id)
+        if author_key not in self.authors and author_key not in staged['authors'] and record['author_birthday'] is None:
+            raise ValueError("author_birthday is required for a new author")
+        author_id = self.resolve(self.authors, staged['authors'], author_key,
+                                 lambda pk: Author(id=pk, full_name=record['author'], birthday=record['author_birthday'],
+                                                   country_id=country_id))
+        book = Book(id=uuid.uuid4(), title=record['title'], description=record['description'], author_id=author_id,
+                    user_id=self.job.user_id, book_status=record['status'], image=record['image'])
+        if record['category']:
+            category_id = self.resolve(self.categories, staged['categories'], record['category'].casefold(),
+                                       lambda pk: Category(id=pk, name=record['category'], category_status=ACTIVE))
+            for name in record['subcategories']:
+                subcategory_id = self.resolve(self.subcategories, staged['subcategories'], (category_id, name.casefold()),
+                                              lambda pk: SubCategory(id=pk, name=name, category_id=category_id))
+                links.append(Book.subcategory.through(book_id=book.pk, subcategory_id=subcategory_id))
+        return book
+
+
+running = set()
+running_lock = threading.Lock()
+
+
+def run_import(job_id, log=None):
+    """Run or resume the import; a crash marks the job failed so it can be resumed later."""
+    try:
+        job = CatalogImport.objects.get(pk=job_id)
+        job.status = RUNNING
+        job.save(update_fields=['status', 'updated_time'])
+        return CatalogImporter(job, log=log).run()
+    except Exception as error:
+        logger.exception("Catalog import %s failed", job_id)
+        job = CatalogImport.objects.get(pk=job_id)
+        job.status = FAILED
+        job.errors = (job.errors + [{'row': job.rows + 1, 'error': str(error)}])[-MAX_ERRORS:]
+        job.save(update_fields=['status', 'errors', 'updated_time'])
+        return job
+    finally:
+        with running_lock:
+            running.discard(job_id)
+
+
+def claim_stale(job):
+    """
+    Take over ``job`` if it is RUNNING but has not committed a chunk for ``CATALOG_IMPORT_STALE_AFTER``
+    seconds, i.e. the worker running it died. Only one caller wins the claim.
+    """
+    if job.status != RUNNING or job.pk in running:
+        return False
+    now = timezone.now()
+    stale = CatalogImport.objects.filter(pk=job.pk, status=RUNNING,
+                                         updated_time__lt=now - timedelta(seconds=settings.CATALOG_IMPORT_STALE_AFTER))
+    return bool(stale.update(updated_time=now))
+
+
+def start_import(job):
+    """Run ``job`` in a background thread (inline when ``CATALOG_IMPORT_BACKGROUND`` is off); False if it already runs here."""
+    with running_lock:
+        if job.pk in running:
+            return False
+        running.add(job.pk)
+    if not settings.CATALOG_IMPORT_BACKGROUND:
+        run_import(job.pk)
+        return True
+
+    def target():
+        try:
+            run_import(job.pk)
+        finally:
+            connection.close()
+
+    threading.Thread(target=target, name=f"catalog-import-{job.pk}", daemon=True).start()
+    return True
@@ -0,0 +1,104 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from book.models import Book, BookViews, BookComment, LikeBook, Leaderboard, PUBLISHED, VIEWS, COMMENTS, LIKES, BLENDED
+
+
+SOURCES = {
+    VIEWS: (BookViews, 'views_count'),
+    COMMENTS: (BookComment, 'comments_count'),
+    LIKES: (LikeBook, 'likes_count'),
+}
+
+
+def decayed_scores(name, now):
+    """Per-book score where each event weighs ``0.5 ** (age_in_days / half_life_days)``."""
+    model, counter = SOURCES[name]
+    options = settings.LEADERBOARDS[name]
+    half_life = options.get('half_life_days')
+    if not half_life:
+        rows = Book.objects.filter(book_status=PUBLISHED, **{f"{counter}__gt": 0}).values_list('id', counter)
+        return {book_id: float(total) for book_id, total in rows.iterator(chunk_size=5000)}
+    today = timezone.localdate(now)
+    rows = (
+        model.objects
+        .filter(created_time__gte=now - timedelta(days=options['window_days']), book__book_status=PUBLISHED)
+        .order_by()
+        .annotate(day=TruncDate('created_time'))
+        .values_list('book_id', 'day')
+        .annotate(total=Count('pk'))
+    )
+    scores = defaultdict(float)
+    for book_id, day, total in rows.iterator(chunk_size=5000):
+        scores[book_id] += total * 0.5 ** ((today - day).days / half_life)
+    return scores
+
+
+def blended_scores(now):
+    scores = defaultdict(float)
+    for name, weight in settings.LEADERBOARDS[BLENDED]['weights'].items():
+        for book_id, score in decayed_scores(name, now).items():
+            scores[book_id] += weight * score
+    return scores
+
+
+def rank_books(scores, size):
+    ranked = sorted(scores, key=lambda book_id: (-scores[book_id], str(book_id)))[:size]
+    if len(ranked) < size:
+        # Pad with the newest published books so short boards still fill a page.
+        seen = set(ranked)
+        newest = Book.objects.filter(book_status=PUBLISHED).order_by('-created_time', '-id').values_list('id', flat=True)
+        ranked += [book_id for book_id in newest[:size] if book_id not in seen][:size - len(ranked)]
+    return [str(book_id) for book_id in ranked]
+
+
+def refresh_leaderboard(name):
+    now = timezone.now()
+    scores = blended_scores(now) if name == BLENDED else decayed_scores(name, now)
+    board, _ = Leaderboard.objects.update_or_create(
+        name=name,
+        defaults={'book_ids': rank_books(scores, settings.LEADERBOARD_SIZE), 'refreshed_time': now},
+    )
+    return board
+
+
+def get_leaderboard(name):
+    board = Leaderboard.objects.filter(name=name).first()
+    if board is None:
+        board = refresh_leaderboard(name)
+    return board
+
+
+def remove_from_leaderboards(book_id):
+    """Drop a deleted or unpublished book from every board, so board counts match the pages until the next refresh."""
+    book_id = str(book_id)
+    with transaction.atomic():
+        for board in Leaderboard.objects.select_for_update():
+            if book_id in board.book_ids:
+                board.book_ids = [pk for pk in board.book_ids if pk != book_id]
+                board.save(update_fields=['book_ids'])
+
+
+class LeaderboardResults:
+    """Sliceable view of a board, so ``CustomPagination`` pages the precomputed id list."""
+
+    def __init__(self, board, queryset):
+        self.board = board
+        self.queryset = queryset
+
+    def count(self):
+        return len(self.board.book_ids)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        book_ids = self.board.book_ids[key]
+        books = self.queryset.in_bulk(book_ids)
+        return [books[book_id] for book_id in map(Book._meta.pk.to_python, book_ids) if book_id in books]
@@ -0,0 +1,57 @@
+from collections import Counter
+from datetime import timedelta
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from book.models import MediaBlob
+from config.images import FORMATS
+
+
+MEDIA_FIELDS = {
+    'book.Book': ('image', 'book_file', 'book_audio'),
+    'book.Author': ('image',),
+    'users.Profile': ('image',),
+}
+
+
+def referenced_names():
+    """Count every reference to a stored file, including image derivatives kept in ``image_variants``."""
+    references = Counter()
+    for label, fields in MEDIA_FIELDS.items():
+        rows = apps.get_model(label)._default_manager.values_list(*fields, 'image_variants')
+        for row in rows.iterator(chunk_size=2000):
+            references.update(name for name in row[:-1] if name)
+            variants = row[-1] or {}
+            references.update(name for extension in FORMATS for name in variants.get(extension, {}).values())
+    return references
+
+
+class Command(BaseCommand):
+    help = "Recount MediaBlob references and delete blobs nothing points at"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=settings.MEDIA_BLOB_GRACE_HOURS,
+                            help="Keep unreferenced blobs younger than this, they may belong to an upload in flight")
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        references = referenced_names()
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        recounted = collected = freed = 0
+        for blob in MediaBlob.objects.order_by('created_time').iterator(chunk_size=2000):
+            refcount = references.get(blob.name, 0)
+            if refcount == 0 and blob.created_time < cutoff:
+                collected += 1
+                freed += blob.size
+                if not options['dry_run']:
+                    MediaBlob.objects.filter(pk=blob.pk).update(refcount=0)
+                    default_storage.delete(blob.name)
+            elif refcount != blob.refcount:
+                recounted += 1
+                if not options['dry_run']:
+                    MediaBlob.objects.filter(pk=blob.pk).update(refcount=refcount)
+        self.stdout.write(self.style.SUCCESS(
+            f"{collected} blobs ({freed} bytes) collected, {recounted} refcounts corrected"
+        ))
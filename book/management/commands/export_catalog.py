@@ -0,0 +1,64 @@
+import os
+import tempfile
+from datetime import datetime, time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from book.catalog_export import export_catalog, tombstones_kept_since
+from book.catalog_import import detect_format
+from book.models import CatalogImport
+
+
+def parse_since(value):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        moment = datetime.combine(day, time())
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+class Command(BaseCommand):
+    help = "Export the published catalog to a JSONL or CSV file, gzipped when the path ends in .gz"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=[value for value, _ in CatalogImport.IMPORT_FORMATS])
+        parser.add_argument('--gzip', action='store_true', help="Gzip the output (implied by a .gz path)")
+        parser.add_argument('--updated-since', help="Only books updated, deleted or unpublished at or after this ISO date or datetime")
+        parser.add_argument('--base-url', default='', help="Prefix for relative media URLs, e.g. https://example.com")
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['path'])
+        compress = options['gzip'] or path.endswith('.gz')
+        format = options['format'] or detect_format(path[:-len('.gz')] if path.endswith('.gz') else path)
+        if format is None:
+            raise CommandError("Cannot tell the format from the extension, pass --format")
+        updated_since = None
+        if options['updated_since']:
+            try:
+                updated_since = parse_since(options['updated_since'])
+            except ValueError:
+                raise CommandError(f"Invalid --updated-since: {options['updated_since']}")
+            if not tombstones_kept_since(updated_since):
+                raise CommandError(f"Removed books are only kept for {settings.CATALOG_CHANGE_RETENTION_DAYS} days; "
+                                   f"run a full export instead")
+
+        started = timezone.now()
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        size = 0
+        # Written next to the target and renamed, so a failed export never leaves a truncated file behind.
+        with tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as handle:
+            try:
+                for block in export_catalog(format, compress, updated_since, options['base_url']):
+                    handle.write(block)
+                    size += len(block)
+            except BaseException:
+                os.remove(handle.name)
+                raise
+        os.replace(handle.name, path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {size} bytes to {path}; pass --updated-since {started.isoformat()} for the next export"))
@@ -0,0 +1,49 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+from config.images import build_variants, delete_variants, variant_names
+
+
+MODELS = ('book.Book', 'book.Author', 'users.Profile')
+
+
+def render(label, name):
+    field = apps.get_model(label)._meta.get_field('image')
+    return label, name, build_variants(field.attr_class(None, field, name))
+
+
+class Command(BaseCommand):
+    help = "Build resized WebP/JPEG variants for existing book covers, author photos and avatars"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--force', action='store_true', help="Rebuild images that already have variants")
+
+    def handle(self, *args, **options):
+        jobs = set()
+        for label in MODELS:
+            model = apps.get_model(label)
+            field = model._meta.get_field('image')
+            queryset = model._default_manager.exclude(image='').exclude(image__isnull=True)
+            if field.has_default():
+                queryset = queryset.exclude(image=field.get_default())
+            if not options['force']:
+                queryset = queryset.filter(image_variants={})
+            # Rows sharing a file share its variants, so each file is rendered once.
+            jobs.update((label, name) for name in queryset.values_list('image', flat=True).distinct().iterator())
+        connections.close_all()
+        done = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as executor:
+            for label, name, variants in executor.map(render, *zip(*jobs)) if jobs else ():
+                rows = apps.get_model(label)._default_manager.filter(image=name)
+                stale = [previous for previous in rows.values_list('image_variants', flat=True).distinct() if previous]
+                rows.update(image_variants=variants)
+                for previous in stale:
+                    delete_variants(rows.model._meta.get_field('image').storage, previous, keep=variant_names(variants))
+                done += 1
+                if done % 100 == 0:
+                    self.stdout.write(f"{done}/{len(jobs)} images processed")
+        self.stdout.write(self.style.SUCCESS(f"Done, {done} images processed"))
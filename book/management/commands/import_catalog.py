@@ -0,0 +1,52 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from book.catalog_import import claim_stale, detect_format, file_digest, run_import
+from book.models import CatalogImport, COMPLETE, FAILED, RUNNING
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Import books from a CSV or JSONL catalog; rerunning it on the same file resumes an interrupted import"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True, help="Username the imported books are attributed to")
+        parser.add_argument('--format', choices=[value for value, _ in CatalogImport.IMPORT_FORMATS])
+        parser.add_argument('--restart', action='store_true', help="Import the file again from its first row")
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['path'])
+        if not os.path.isfile(path):
+            raise CommandError(f"{path} does not exist")
+        format = options['format'] or detect_format(path)
+        if format is None:
+            raise CommandError("Cannot tell the format from the extension, pass --format")
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']} does not exist")
+
+        digest = file_digest(path)
+        job = CatalogImport.objects.filter(digest=digest).first()
+        if job is not None and job.status == COMPLETE and not options['restart']:
+            raise CommandError(f"{path} was already imported (import {job.pk}); pass --restart to import it again")
+        if job is not None and job.status == RUNNING:
+            # Resuming a job another worker still runs would import its remaining rows twice.
+            if not claim_stale(job):
+                raise CommandError(f"{path} is being imported (import {job.pk}); rerun once it has stalled for "
+                                   f"{settings.CATALOG_IMPORT_STALE_AFTER} seconds")
+            if options['restart']:
+                CatalogImport.objects.filter(pk=job.pk).update(status=FAILED)
+        if job is None or options['restart']:
+            job = CatalogImport.objects.create(user=user, source=os.path.basename(path), path=path, digest=digest,
+                                               format=format)
+        else:
+            job.path = path
+            job.save(update_fields=['path'])
+        self.stdout.write(f"Import {job.pk}")
+        job = run_import(job.pk, log=self.stdout.write)
+        if job.status == FAILED:
+            raise CommandError(f"Import failed after row {job.rows}: {job.errors[-1]['error']}; rerun to resume")
+        self.stdout.write(self.style.SUCCESS(
+            f"Done, {job.rows} rows, {job.books_created} books created, {job.rows_failed} rows failed"))
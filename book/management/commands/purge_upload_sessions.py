@@ -0,0 +1,18 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from book.models import UploadSession, OPEN
+from book.uploads import discard_part
+
+
+class Command(BaseCommand):
+    help = "Delete unfinished upload sessions idle for longer than UPLOAD_SESSION_TTL_HOURS and their partial files"
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+        sessions = list(UploadSession.objects.filter(status=OPEN, updated_time__lt=cutoff))
+        for session in sessions:
+            discard_part(session)
+        UploadSession.objects.filter(pk__in=[session.pk for session in sessions]).delete()
+        self.stdout.write(self.style.SUCCESS(f"{len(sessions)} upload sessions purged"))
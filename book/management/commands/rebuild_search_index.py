@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from book.models import Book
+from book.search import get_search_backend, index_books
+
+
+class Command(BaseCommand):
+    help = "Drop and rebuild the full-text search index of books"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if backend is None:
+            raise CommandError("Full-text search is not supported on this database")
+        with transaction.atomic():
+            backend.drop()
+            backend.create()
+            index_books(Book.objects.order_by('pk'), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{Book.objects.count()} books indexed"))
@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from book.models import Book
+
+
+class Command(BaseCommand):
+    help = "Recompute Book.views_count, likes_count and comments_count from the related tables in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0, help="Seconds to pause between batches")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = None
+        books = updated = 0
+        while True:
+            queryset = Book.objects.order_by('pk')
+            if last_pk is not None:
+                queryset = queryset.filter(pk__gt=last_pk)
+            batch = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            updated += Book.objects.filter(pk__in=batch).refresh_counters()
+            books += len(batch)
+            last_pk = batch[-1]
+            self.stdout.write(f"{books} books reconciled")
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(f"Done, {updated} books updated"))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from book.leaderboards import refresh_leaderboard
+from book.models import Leaderboard
+
+
+class Command(BaseCommand):
+    help = "Recompute the time-decayed popularity leaderboards; run it periodically (e.g. from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('boards', nargs='*', help="Boards to refresh, all of them by default")
+
+    def handle(self, *args, **options):
+        names = [name for name, _ in Leaderboard.BOARD_NAMES]
+        unknown = set(options['boards']) - set(names)
+        if unknown:
+            raise CommandError(f"Unknown boards: {', '.join(sorted(unknown))}")
+        for name in options['boards'] or names:
+            board = refresh_leaderboard(name)
+            self.stdout.write(f"{name}: {len(board.book_ids)} books")
+        self.stdout.write(self.style.SUCCESS("Leaderboards refreshed"))
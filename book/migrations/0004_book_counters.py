@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:07
+
+from django.db import migrations, models
+from config.models import count_subquery
+
+
+def populate_counters(apps, schema_editor):
+    Book = apps.get_model('book', 'Book')
+    Book.objects.update(
+        views_count=count_subquery(apps.get_model('book', 'BookViews'), 'book'),
+        likes_count=count_subquery(apps.get_model('book', 'LikeBook'), 'book'),
+        comments_count=count_subquery(apps.get_model('book', 'BookComment'), 'book'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0003_alter_book_subcategory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='views_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
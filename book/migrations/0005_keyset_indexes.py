@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0004_book_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['book_status', '-created_time', '-id'], name='book_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['-created_time', '-id'], name='book_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookcomment',
+            index=models.Index(fields=['book', '-created_time', '-id'], name='comment_book_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookviews',
+            index=models.Index(fields=['book', '-created_time', '-id'], name='views_book_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='likebook',
+            index=models.Index(fields=['user', '-created_time', '-id'], name='likes_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+from book.search import get_search_backend
+
+
+def create_search_index(apps, schema_editor):
+    backend = get_search_backend(connection=schema_editor.connection)
+    if backend is None:
+        return
+    backend.create()
+    Book = apps.get_model('book', 'Book')
+    rows = Book.objects.values_list('id', 'title', 'description', 'author__full_name').iterator(chunk_size=1000)
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= 1000:
+            backend.insert(batch)
+            batch = []
+    if batch:
+        backend.insert(batch)
+
+
+def drop_search_index(apps, schema_editor):
+    backend = get_search_backend(connection=schema_editor.connection)
+    if backend is not None:
+        backend.drop()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0005_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:15
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0006_book_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Leaderboard',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+                ('updated_time', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(choices=[('views', 'views'), ('comments', 'comments'), ('likes', 'likes'), ('blended', 'blended')], max_length=31, unique=True)),
+                ('book_ids', models.JSONField(default=list)),
+                ('refreshed_time', models.DateTimeField()),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('book', '0010_media_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogImport',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+                ('updated_time', models.DateTimeField(auto_now=True)),
+                ('source', models.CharField(max_length=255)),
+                ('path', models.CharField(max_length=500)),
+                ('digest', models.CharField(db_index=True, max_length=64)),
+                ('format', models.CharField(choices=[('csv', 'csv'), ('jsonl', 'jsonl')], max_length=15)),
+                ('status', models.CharField(choices=[('running', 'running'), ('failed', 'failed'), ('complete', 'complete')], default='running', max_length=31)),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('books_created', models.PositiveIntegerField(default=0)),
+                ('rows_failed', models.PositiveIntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='catalog_imports', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_time'],
+            },
+        ),
+    ]
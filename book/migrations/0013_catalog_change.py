@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0012_book_status_updated_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('book', 'book'), ('author', 'author')], max_length=15)),
+                ('object_id', models.UUIDField()),
+                ('created_time', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+from book.search import get_search_backend
+
+
+def rebuild_search_index(apps, schema_editor):
+    # Only the SQLite index changed layout: its rows are now keyed by rowid instead of a book_id column.
+    backend = get_search_backend(connection=schema_editor.connection)
+    if backend is None or schema_editor.connection.vendor != 'sqlite':
+        return
+    backend.drop()
+    backend.create()
+    Book = apps.get_model('book', 'Book')
+    rows = Book.objects.values_list('id', 'title', 'description', 'author__full_name').iterator(chunk_size=1000)
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= 1000:
+            backend.insert(batch)
+            batch = []
+    if batch:
+        backend.insert(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0013_catalog_change'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_search_index, migrations.RunPython.noop),
+    ]
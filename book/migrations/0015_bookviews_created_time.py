@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:43
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0014_search_rowids'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bookviews',
+            name='created_time',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -1,14 +1,18 @@
 from django.db import models
 from django.core.validators import FileExtensionValidator, MaxLengthValidator
-from config.models import BaseModel
+from config.models import BaseModel, count_subquery
 from django.core.exceptions import ValidationError
 from users.models import User
 from django.db.models import UniqueConstraint
+from django.utils import timezone
+
+
+MAX_UPLOAD_SIZE = 2 * 429916160
 
 
 def validate_file(image):
     file_size = image.file.size
-    if file_size > 2 * 429916160:
+    if file_size > MAX_UPLOAD_SIZE:
         raise ValidationError("Max size of file is %s 1GB")
 
 
@@ -16,6 +20,28 @@ INACTIVE, ACTIVE = ("inactive", 'active')
 DRAFT, PUBLISHED = ("draft", 'published')
 
 
+class CategoryQuerySet(models.QuerySet):
+
+    def with_counts(self):
+        return self.annotate(subcategory_total=count_subquery(SubCategory, 'category'))
+
+
+class CountryQuerySet(models.QuerySet):
+
+    def with_counts(self):
+        return self.annotate(authors_total=count_subquery(Author, 'country'))
+
+
+class BookQuerySet(models.QuerySet):
+
+    def refresh_counters(self):
+        return self.update(
+            views_count=count_subquery(BookViews, 'book'),
+            likes_count=count_subquery(LikeBook, 'book'),
+            comments_count=count_subquery(BookComment, 'book'),
+        )
+
+
 class Category(BaseModel):
 
     CATEGORY_STATUS = (
@@ -25,6 +51,8 @@ class Category(BaseModel):
 
     category_status = models.CharField(max_length=31, choices=CATEGORY_STATUS, default=INACTIVE)
     name = models.CharField(max_length=50)
+
+    objects = CategoryQuerySet.as_manager()
     
     def __str__(self):
         return self.name
@@ -41,6 +69,8 @@ class SubCategory(BaseModel):
 class Country(BaseModel):
     name = models.CharField(max_length=100)
 
+    objects = CountryQuerySet.as_manager()
+
     def __str__(self) -> str:
         return self.name
 
@@ -50,6 +80,7 @@ class Author(BaseModel):
     birthday  = models.DateField()
     country = models.ForeignKey(Country, blank=True, default=None, on_delete = models.CASCADE, related_name='authors')
     image = models.ImageField(upload_to='authors/', null=True, blank=True, validators=[FileExtensionValidator(allowed_extensions=['jpg','jpeg','png','heic','heif'])])
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self) -> str:
         return self.full_name
@@ -68,15 +99,49 @@ class Book(BaseModel):
     book_audio = models.FileField(upload_to = 'uploads/%Y/%m/%d', null=True, blank=True, validators=[FileExtensionValidator(allowed_extensions=['mp3','wav']), validate_file])
     subcategory= models.ManyToManyField(SubCategory)
     image = models.ImageField(upload_to='books/')
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     book_status = models.CharField(max_length=31, choices=BOOK_STATUS, default=DRAFT)
     author = models.ForeignKey(Author, on_delete= models.CASCADE, related_name='books')
     user = models.ForeignKey(User, on_delete= models.CASCADE, related_name='books')
+    views_count = models.PositiveIntegerField(default=0, editable=False)
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = BookQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['book_status', '-created_time', '-id'], name='book_status_created_idx'),
+            models.Index(fields=['-created_time', '-id'], name='book_created_idx'),
+            models.Index(fields=['book_status', 'updated_time', 'id'], name='book_status_updated_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.title
 
 
+BOOK, AUTHOR = ('book', 'author')
+
+
+class CatalogChange(models.Model):
+    """Append-only log of saved and deleted books and authors, read by other processes in ``id`` order."""
+    CHANGE_KINDS = (
+        (BOOK, BOOK),
+        (AUTHOR, AUTHOR)
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=15, choices=CHANGE_KINDS)
+    object_id = models.UUIDField()
+    created_time = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self) -> str:
+        return f"{self.kind} {self.object_id}"
+
+
 class BookViews(BaseModel):
+    # Not auto_now_add: views are written in batches by the view buffer with the time they happened.
+    created_time = models.DateTimeField(default=timezone.now, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='views')
 
@@ -87,6 +152,9 @@ class BookViews(BaseModel):
                 fields = ['user', 'book'], name='unique_book_views'
             ),
             ]
+        indexes = [
+            models.Index(fields=['book', '-created_time', '-id'], name='views_book_created_idx'),
+        ]
 
 
 class LikeBook(BaseModel):
@@ -100,6 +168,9 @@ class LikeBook(BaseModel):
                 fields = ['user', 'book'], name='unique_book_likes'
             ),
             ]
+        indexes = [
+            models.Index(fields=['user', '-created_time', '-id'], name='likes_user_created_idx'),
+        ]
         
 
 class BookComment(BaseModel):
@@ -107,5 +178,98 @@ class BookComment(BaseModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     comment = models.TextField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['book', '-created_time', '-id'], name='comment_book_created_idx'),
+        ]
+
     def __str__(self) -> str:
         return f"{self.user} - {self.book}"
+
+
+
+VIEWS, COMMENTS, LIKES, BLENDED = ('views', 'comments', 'likes', 'blended')
+
+
+class Leaderboard(BaseModel):
+    BOARD_NAMES = (
+        (VIEWS, VIEWS),
+        (COMMENTS, COMMENTS),
+        (LIKES, LIKES),
+        (BLENDED, BLENDED)
+    )
+
+    name = models.CharField(max_length=31, choices=BOARD_NAMES, unique=True)
+    book_ids = models.JSONField(default=list)
+    refreshed_time = models.DateTimeField()
+
+    def __str__(self) -> str:
+        return self.name
+
+
+OPEN, COMPLETE = ('open', 'complete')
+BOOK_FILE, BOOK_AUDIO = ('book_file', 'book_audio')
+
+
+class UploadSession(BaseModel):
+    UPLOAD_STATUS = (
+        (OPEN, OPEN),
+        (COMPLETE, COMPLETE)
+    )
+    UPLOAD_FIELDS = (
+        (BOOK_FILE, BOOK_FILE),
+        (BOOK_AUDIO, BOOK_AUDIO)
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    book = models.ForeignKey(Book, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_sessions')
+    field = models.CharField(max_length=31, choices=UPLOAD_FIELDS)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=31, choices=UPLOAD_STATUS, default=OPEN)
+
+    def __str__(self) -> str:
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+
+class MediaBlob(BaseModel):
+    name = models.CharField(max_length=255, unique=True)
+    digest = models.CharField(max_length=64, db_index=True)
+    size = models.BigIntegerField()
+    refcount = models.IntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.name} ({self.refcount})"
+
+
+RUNNING, FAILED = ('running', 'failed')
+CSV, JSONL = ('csv', 'jsonl')
+
+class CatalogImport(BaseModel):
+    IMPORT_STATUS = (
+        (RUNNING, RUNNING),
+        (FAILED, FAILED),
+        (COMPLETE, COMPLETE)
+    )
+    IMPORT_FORMATS = (
+        (CSV, CSV),
+        (JSONL, JSONL)
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='catalog_imports')
+    source = models.CharField(max_length=255)
+    path = models.CharField(max_length=500)
+    digest = models.CharField(max_length=64, db_index=True)
+    format = models.CharField(max_length=15, choices=IMPORT_FORMATS)
+    status = models.CharField(max_length=31, choices=IMPORT_STATUS, default=RUNNING)
+    rows = models.PositiveIntegerField(default=0)
+    books_created = models.PositiveIntegerField(default=0)
+    rows_failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        ordering = ['-created_time']
+
+    def __str__(self) -> str:
+        return f"{self.source} ({self.rows} rows, {self.status})"
@@ -0,0 +1,247 @@
+import re
+import uuid
+from django.conf import settings
+from django.db import connections
+from django.utils.html import escape
+
+
+SEARCH_TABLE = 'book_search_index'
+ROWID_TABLE = 'book_search_rowid'
+# Private use characters mark matches in the database snippet; the text around them is HTML-escaped
+# before they become <mark> tags, as titles and descriptions are user input.
+HIGHLIGHT_START, HIGHLIGHT_STOP = ('\ue000', '\ue001')
+
+
+def render_highlight(snippet):
+    if snippet is None:
+        return None
+    return escape(snippet).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_STOP, '</mark>')
+
+
+def get_terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+class SearchBackend:
+    """Maintains and queries the ``book_search_index`` table for one database connection."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, params=None):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            if cursor.description is not None:
+                return cursor.fetchall()
+        return []
+
+    def index_rows(self, rows):
+        """Replace the index entries of ``rows``: ``(book_id, title, description, author_name)`` tuples."""
+        rows = list(rows)
+        if rows:
+            self.remove([row[0] for row in rows])
+            self.insert(rows)
+
+    def remove(self, book_ids):
+        book_ids = [self.to_db_id(book_id) for book_id in book_ids]
+        if book_ids:
+            placeholders = ', '.join(['%s'] * len(book_ids))
+            self.execute(f"DELETE FROM {SEARCH_TABLE} WHERE book_id IN ({placeholders})", book_ids)
+
+    def to_db_id(self, book_id):
+        return str(book_id)
+
+    @staticmethod
+    def to_book_id(value):
+        return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    FTS5 rows are keyed by an integer rowid that ``book_search_rowid`` maps to the book id, since
+    an FTS5 table can only look rows up by rowid; every other column filter scans the whole index.
+    """
+
+    def create(self):
+        self.execute(
+            f"CREATE TABLE IF NOT EXISTS {ROWID_TABLE} (id INTEGER PRIMARY KEY, book_id TEXT NOT NULL UNIQUE)"
+        )
+        self.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+            f"title, description, author, tokenize='{settings.BOOK_SEARCH_SQLITE_TOKENIZER}')"
+        )
+
+    def drop(self):
+        self.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+        self.execute(f"DROP TABLE IF EXISTS {ROWID_TABLE}")
+
+    def to_db_id(self, book_id):
+        return self.to_book_id(book_id).hex
+
+    def remove(self, book_ids):
+        book_ids = [self.to_db_id(book_id) for book_id in book_ids]
+        if not book_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(book_ids))
+        rowids = self.execute(f"SELECT id FROM {ROWID_TABLE} WHERE book_id IN ({placeholders})", book_ids)
+        if rowids:
+            with self.connection.cursor() as cursor:
+                cursor.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", rowids)
+            self.execute(f"DELETE FROM {ROWID_TABLE} WHERE book_id IN ({placeholders})", book_ids)
+
+    def insert(self, rows):
+        rows = [(self.to_db_id(book_id), title, description, author) for book_id, title, description, author in rows]
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f"INSERT INTO {ROWID_TABLE} (book_id) VALUES (%s)", [row[:1] for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, title, description, author) "
+                f"VALUES ((SELECT id FROM {ROWID_TABLE} WHERE book_id = %s), %s, %s, %s)",
+                rows,
+            )
+
+    @staticmethod
+    def match_expression(query):
+        return ' '.join('"%s"*' % term for term in get_terms(query))
+
+    def search(self, query, limit, offset):
+        expression = self.match_expression(query)
+        if not expression:
+            return []
+        # bm25 column weights follow the table layout: title, description, author.
+        return self.execute(
+            f"SELECT {ROWID_TABLE}.book_id, -bm25({SEARCH_TABLE}, 10.0, 1.0, 5.0) AS rank, "
+            f"snippet({SEARCH_TABLE}, -1, '{HIGHLIGHT_START}', '{HIGHLIGHT_STOP}', '...', 24) "
+            f"FROM {SEARCH_TABLE} JOIN {ROWID_TABLE} ON {ROWID_TABLE}.id = {SEARCH_TABLE}.rowid "
+            f"WHERE {SEARCH_TABLE} MATCH %s ORDER BY rank DESC LIMIT %s OFFSET %s",
+            [expression, limit, offset],
+        )
+
+    def count(self, query):
+        expression = self.match_expression(query)
+        if not expression:
+            return 0
+        return self.execute(f"SELECT COUNT(*) FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s", [expression])[0][0]
+
+
+class PostgresSearchBackend(SearchBackend):
+
+    def create(self):
+        self.execute(
+            f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+            f"book_id uuid PRIMARY KEY REFERENCES book_book (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            f"title text NOT NULL, description text NOT NULL, author text NOT NULL, document tsvector NOT NULL)"
+        )
+        self.execute(f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_idx ON {SEARCH_TABLE} USING GIN (document)")
+
+    def drop(self):
+        self.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+    def insert(self, rows):
+        config = settings.BOOK_SEARCH_POSTGRES_CONFIG
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (book_id, title, description, author, document) VALUES (%s, %s, %s, %s, "
+                f"setweight(to_tsvector(%s::regconfig, %s), 'A') || setweight(to_tsvector(%s::regconfig, %s), 'B') || "
+                f"setweight(to_tsvector(%s::regconfig, %s), 'C'))",
+                [(str(book_id), title, description, author, config, title, config, author, config, description)
+                 for book_id, title, description, author in rows],
+            )
+
+    @staticmethod
+    def tsquery(query):
+        return ' & '.join(f"{term}:*" for term in get_terms(query))
+
+    def search(self, query, limit, offset):
+        tsquery = self.tsquery(query)
+        if not tsquery:
+            return []
+        config = settings.BOOK_SEARCH_POSTGRES_CONFIG
+        return self.execute(
+            f"SELECT book_id, rank, ts_headline(%s::regconfig, title || ' ' || description, query, "
+            f"'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxWords=24, MinWords=8') FROM ("
+            f"SELECT book_id, title, description, ts_rank_cd(document, query) AS rank, query "
+            f"FROM {SEARCH_TABLE}, to_tsquery(%s::regconfig, %s) query WHERE document @@ query "
+            f"ORDER BY rank DESC LIMIT %s OFFSET %s) hits ORDER BY rank DESC",
+            [config, config, tsquery, limit, offset],
+        )
+
+    def count(self, query):
+        tsquery = self.tsquery(query)
+        if not tsquery:
+            return 0
+        return self.execute(
+            f"SELECT COUNT(*) FROM {SEARCH_TABLE} WHERE document @@ to_tsquery(%s::regconfig, %s)",
+            [settings.BOOK_SEARCH_POSTGRES_CONFIG, tsquery],
+        )[0][0]
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend(using='default', connection=None):
+    connection = connection or connections[using]
+    backend_class = BACKENDS.get(connection.vendor)
+    return backend_class(connection) if backend_class else None
+
+
+def book_rows(queryset):
+    return queryset.values_list('id', 'title', 'description', 'author__full_name').iterator(chunk_size=1000)
+
+
+def index_books(queryset, batch_size=1000):
+    backend = get_search_backend(queryset.db)
+    if backend is None:
+        return
+    batch = []
+    for row in book_rows(queryset):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            backend.index_rows(batch)
+            batch = []
+    backend.index_rows(batch)
+
+
+class SearchResults:
+    """
+    Lazy, sliceable search result list, so ``CustomPagination`` pages it like a queryset.
+
+    Each slice runs one ranked index query and hydrates the matching books from ``queryset``,
+    annotating them with ``search_rank`` and ``search_highlight``.
+    """
+
+    def __init__(self, backend, query, queryset):
+        self.backend = backend
+        self.query = query
+        self.queryset = queryset
+
+    def count(self):
+        return self.backend.count(self.query)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        offset = key.start or 0
+        limit = (key.stop - offset) if key.stop is not None else self.count()
+        hits = self.backend.search(self.query, max(limit, 0), offset)
+        books = self.queryset.in_bulk([SearchBackend.to_book_id(book_id) for book_id, _, _ in hits])
+        results = []
+        for book_id, rank, highlight in hits:
+            book = books.get(SearchBackend.to_book_id(book_id))
+            if book is not None:
+                book.search_rank = rank
+                book.search_highlight = render_highlight(highlight)
+                results.append(book)
+        return results
+
+
+def search_books(query, queryset):
+    backend = get_search_backend(queryset.db)
+    if backend is None:
+        return None
+    return SearchResults(backend, query, queryset)
@@ -1,9 +1,17 @@
 from rest_framework import serializers
-from book.models import Category, Book, BookComment, Author, SubCategory, Country, LikeBook, BookViews
+from book.models import (Category, Book, BookComment, Author, SubCategory, Country, LikeBook, BookViews,
+                         UploadSession, CatalogImport, JSONL, MAX_UPLOAD_SIZE)
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files import File
+from django.core.validators import FileExtensionValidator
 from users.serializers import UserSerializer
+from config.prefetch_plan import PrefetchPlanMixin
+from config.images import SrcsetField
+from book.catalog_export import tombstones_kept_since
+from book.catalog_import import detect_format
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(PrefetchPlanMixin, serializers.ModelSerializer):
     id = serializers.UUIDField(read_only = True)
     subcategory_count = serializers.SerializerMethodField('get_subcategory_count')
     category_status = serializers.CharField(read_only=True)
@@ -12,8 +20,14 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = ('id', 'name' ,'category_status', 'subcategory_count')
 
+    @staticmethod
+    def annotate_queryset(queryset):
+        return queryset.with_counts()
+
     @staticmethod
     def get_subcategory_count(obj):
+        if hasattr(obj, 'subcategory_total'):
+            return obj.subcategory_total
         return obj.subcategories.count()
     
 
@@ -24,7 +38,7 @@ class CategoryCreateSerializer(serializers.ModelSerializer):
         fields = ('name' ,)
 
 
-class SubCategorySerializer(serializers.ModelSerializer):
+class SubCategorySerializer(PrefetchPlanMixin, serializers.ModelSerializer):
     id = serializers.UUIDField(read_only = True)
     category = CategorySerializer(read_only=True)
     category_id = serializers.UUIDField(write_only = True)
@@ -50,7 +64,7 @@ class SubCategoryCreateSerializer(serializers.ModelSerializer):
         )
 
 
-class CountrySerializer(serializers.ModelSerializer):
+class CountrySerializer(PrefetchPlanMixin, serializers.ModelSerializer):
     id = serializers.UUIDField(read_only = True)
     authors_count = serializers.SerializerMethodField('get_book_authors_count')
 
@@ -61,15 +75,22 @@ class CountrySerializer(serializers.ModelSerializer):
             'name',
             'authors_count',
         )
+
+    @staticmethod
+    def annotate_queryset(queryset):
+        return queryset.with_counts()
     
     @staticmethod
     def get_book_authors_count(obj):
+        if hasattr(obj, 'authors_total'):
+            return obj.authors_total
         return obj.authors.count()
 
 
-class AuthorSerializer(serializers.ModelSerializer):
+class AuthorSerializer(PrefetchPlanMixin, serializers.ModelSerializer):
     country = CountrySerializer(read_only=True)
     country_id = serializers.UUIDField(write_only = True)
+    image_srcset = SrcsetField()
 
     class Meta:
         model = Author
@@ -79,7 +100,8 @@ class AuthorSerializer(serializers.ModelSerializer):
             'birthday',
             'country',
             'country_id',
-            'image'
+            'image',
+            'image_srcset',
         )
 
 
@@ -96,7 +118,7 @@ class AuthorCreateSerializer(serializers.ModelSerializer):
         )
 
 
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(PrefetchPlanMixin, serializers.ModelSerializer):
     id = serializers.UUIDField(read_only = True)
     subcategory = SubCategorySerializer(read_only=True, many=True,)
     author = AuthorSerializer(read_only=True)
@@ -104,14 +126,15 @@ class BookSerializer(serializers.ModelSerializer):
     subcategory_id = serializers.UUIDField(write_only = True)
     author_id = serializers.UUIDField(write_only = True)
     book_status = serializers.CharField(read_only=True)
-    views_count = serializers.SerializerMethodField('get_book_views_count')
-    comment_count = serializers.SerializerMethodField('get_book_comments_count')
-    likes_count = serializers.SerializerMethodField('get_book_likes_count')
+    views_count = serializers.IntegerField(read_only=True)
+    comment_count = serializers.IntegerField(source='comments_count', read_only=True)
+    likes_count = serializers.IntegerField(read_only=True)
+    image_srcset = SrcsetField()
 
     class Meta:
         model = Book
         fields = ('id', 'title', 'description', 'book_file' ,'book_audio', 'subcategory',
-                    'subcategory_id', 'image', 'book_status','author', 'author_id', 'user',
+                    'subcategory_id', 'image', 'image_srcset', 'book_status','author', 'author_id', 'user',
                     'views_count', 'comment_count', 'likes_count')
 
         extra_kwargs = {
@@ -119,17 +142,21 @@ class BookSerializer(serializers.ModelSerializer):
             "image":{"required":False}
         }
 
+
+class BookSearchSerializer(BookSerializer):
+    rank = serializers.SerializerMethodField('get_search_rank')
+    highlight = serializers.SerializerMethodField('get_search_highlight')
+
+    class Meta(BookSerializer.Meta):
+        fields = BookSerializer.Meta.fields + ('rank', 'highlight')
+
     @staticmethod
-    def get_book_comments_count(obj):
-        return obj.comments.count()
-    
-    @staticmethod
-    def get_book_views_count(obj):
-        return obj.views.count()
-    
+    def get_search_rank(obj):
+        return getattr(obj, 'search_rank', None)
+
     @staticmethod
-    def get_book_likes_count(obj):
-        return obj.likes.count()
+    def get_search_highlight(obj):
+        return getattr(obj, 'search_highlight', None)
 
 
 class BookCreateSerializer(serializers.ModelSerializer):
@@ -146,7 +173,7 @@ class BookCreateSerializer(serializers.ModelSerializer):
         }
 
 
-class BookCommentSerializer(serializers.ModelSerializer):
+class BookCommentSerializer(PrefetchPlanMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     book = BookSerializer(read_only=True)
     
@@ -172,7 +199,7 @@ class BookCommentCreateSerializer(serializers.ModelSerializer):
             )
         
 
-class BookViewsListSerializer(serializers.ModelSerializer):
+class BookViewsListSerializer(PrefetchPlanMixin, serializers.ModelSerializer):
     id = serializers.UUIDField(read_only=True)
     user = UserSerializer(read_only=True)
     book = BookSerializer(read_only=True)
@@ -187,7 +214,7 @@ class BookViewsListSerializer(serializers.ModelSerializer):
             )
 
 
-class BookLikeSerializer(serializers.ModelSerializer):
+class BookLikeSerializer(PrefetchPlanMixin, serializers.ModelSerializer):
     id = serializers.UUIDField(read_only=True)
     user = UserSerializer(read_only=True)
     book = BookSerializer(read_only=True)
@@ -214,8 +241,76 @@ class GlobalSearchSerializer(serializers.Serializer):
     query = serializers.CharField(max_length=255)
 
 
+class AutocompleteSerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=100)
+    limit = serializers.IntegerField(min_value=1, max_value=20, default=10)
+
+
 class BookAudioSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Book
         fields = ('book_audio', )
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = UploadSession
+        fields = ('id', 'field', 'filename', 'size', 'offset', 'sha256', 'status', 'book')
+        read_only_fields = ('offset', 'status', 'book')
+
+    def validate_size(self, value):
+        if value <= 0 or value > MAX_UPLOAD_SIZE:
+            raise serializers.ValidationError("Max size of file is %s 1GB")
+        return value
+
+    def validate_sha256(self, value):
+        if value and (len(value) != 64 or any(char not in '0123456789abcdef' for char in value.lower())):
+            raise serializers.ValidationError("sha256 noto'g'ri")
+        return value.lower()
+
+    def validate(self, data):
+        for validator in Book._meta.get_field(data['field']).validators:
+            if isinstance(validator, FileExtensionValidator):
+                try:
+                    validator(File(None, name=data['filename']))
+                except DjangoValidationError as error:
+                    raise serializers.ValidationError({'filename': list(error.messages)})
+        return data
+
+
+class UploadCompleteSerializer(serializers.Serializer):
+    book_id = serializers.UUIDField()
+
+
+class CatalogImportSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = CatalogImport
+        fields = ('id', 'source', 'format', 'status', 'rows', 'books_created', 'rows_failed', 'errors',
+                  'created_time', 'updated_time')
+        read_only_fields = fields
+
+
+class CatalogImportCreateSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=CatalogImport.IMPORT_FORMATS, required=False)
+
+    def validate(self, data):
+        data['format'] = data.get('format') or detect_format(data['file'].name)
+        if data['format'] is None:
+            raise serializers.ValidationError({'format': ["Fayl formati csv yoki jsonl bo'lishi kerak"]})
+        return data
+
+
+
+class CatalogExportSerializer(serializers.Serializer):
+    type = serializers.ChoiceField(choices=CatalogImport.IMPORT_FORMATS, default=JSONL)
+    gzip = serializers.BooleanField(default=False)
+    updated_since = serializers.DateTimeField(required=False)
+
+    def validate_updated_since(self, value):
+        if not tombstones_kept_since(value):
+            raise serializers.ValidationError("O'chirilgan kitoblar bu sanagacha saqlanmagan, to'liq eksport qiling")
+        return value
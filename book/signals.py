@@ -0,0 +1,101 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from book.models import Book, BookViews, LikeBook, BookComment, Author, Category, SubCategory, Country, PUBLISHED
+from book import autocomplete
+from book.leaderboards import remove_from_leaderboards
+from book.search import get_search_backend, index_books
+from config.images import track_image_variants
+from config.storage import track_media_references
+from config.response_cache import invalidate_on_change
+from config.metrics import registry
+from book.view_buffer import buffer
+
+
+COUNTER_FIELDS = {
+    BookViews: 'views_count',
+    LikeBook: 'likes_count',
+    BookComment: 'comments_count',
+}
+
+
+def adjust_counter(book_id, field, delta):
+    # updated_time moves with the counters, so incremental catalog exports pick the change up.
+    Book.objects.filter(pk=book_id).update(**{field: Greatest(F(field) + delta, 0)}, updated_time=timezone.now())
+
+
+track_media_references(Author, ['image'])
+track_media_references(Book, ['image', 'book_file', 'book_audio'])
+track_image_variants(Author)
+track_image_variants(Book)
+invalidate_on_change(Category, SubCategory, Country, Author, Book)
+registry.register_source('book_view_buffer', buffer.get_metrics)
+
+
+@receiver(post_save, sender=BookViews)
+@receiver(post_save, sender=LikeBook)
+@receiver(post_save, sender=BookComment)
+def increment_book_counter(sender, instance, created, **kwargs):
+    if created:
+        adjust_counter(instance.book_id, COUNTER_FIELDS[sender], 1)
+
+
+@receiver(post_delete, sender=BookViews)
+@receiver(post_delete, sender=LikeBook)
+@receiver(post_delete, sender=BookComment)
+def decrement_book_counter(sender, instance, **kwargs):
+    adjust_counter(instance.book_id, COUNTER_FIELDS[sender], -1)
+
+
+@receiver(post_save, sender=Book)
+def index_book(sender, instance, **kwargs):
+    index_books(Book.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Author)
+def index_author_books(sender, instance, created, **kwargs):
+    if not created:
+        index_books(Book.objects.filter(author=instance))
+
+
+@receiver(post_delete, sender=Book)
+def unindex_book(sender, instance, **kwargs):
+    backend = get_search_backend(instance._state.db or 'default')
+    if backend is not None:
+        backend.remove([instance.pk])
+
+
+@receiver(post_save, sender=Book)
+def update_book_suggestion(sender, instance, **kwargs):
+    if instance.book_status == PUBLISHED:
+        autocomplete.apply_change(autocomplete.BOOK, instance.pk, instance.title)
+    else:
+        autocomplete.apply_change(autocomplete.BOOK, instance.pk)
+
+
+@receiver(post_delete, sender=Book)
+def remove_book_suggestion(sender, instance, **kwargs):
+    autocomplete.apply_change(autocomplete.BOOK, instance.pk)
+
+
+@receiver(post_save, sender=Author)
+def update_author_suggestion(sender, instance, **kwargs):
+    autocomplete.apply_change(autocomplete.AUTHOR, instance.pk, instance.full_name)
+
+
+@receiver(post_delete, sender=Author)
+def remove_author_suggestion(sender, instance, **kwargs):
+    autocomplete.apply_change(autocomplete.AUTHOR, instance.pk)
+
+
+@receiver(post_save, sender=Book)
+def update_book_leaderboards(sender, instance, **kwargs):
+    if instance.book_status != PUBLISHED:
+        remove_from_leaderboards(instance.pk)
+
+
+@receiver(post_delete, sender=Book)
+def remove_book_leaderboards(sender, instance, **kwargs):
+    remove_from_leaderboards(instance.pk)
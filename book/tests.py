@@ -1,3 +1,951 @@
-from django.test import TestCase
+import csv
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import warnings
+from io import BytesIO
+from unittest import mock
+from datetime import date, timedelta
+from django.utils import timezone
+from django.db import connection
+from asgiref.sync import sync_to_async
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from io import StringIO
+from book import autocomplete, view_buffer
+from book.catalog_import import CatalogImporter
+from book.search import SEARCH_TABLE
+from config import metrics, response_cache
+from book.models import (Category, SubCategory, Country, Author, Book, BookViews, LikeBook, BookComment, MediaBlob,
+                         CatalogChange, CatalogImport, PUBLISHED, ACTIVE)
+from users.models import User
+from PIL import Image
 
-# Create your tests here.
+
+class QueryBudgetTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create(username=f"reader{i}", password="secret-pass") for i in range(3)]
+
+    def setUp(self):
+        self.clear_caches()
+
+    @staticmethod
+    def clear_caches():
+        for backend in caches.all():
+            backend.clear()
+
+    def create_catalog(self, size):
+        for i in range(size):
+            category = Category.objects.create(name=f"category-{i}", category_status=ACTIVE)
+            subcategory = SubCategory.objects.create(name=f"subcategory-{i}", category=category)
+            country = Country.objects.create(name=f"country-{i}")
+            author = Author.objects.create(full_name=f"author-{i}", birthday=date(1900, 1, 1), country=country)
+            book = Book.objects.create(title=f"book-{i}", description="description", image="books/portfolio-img1.jpg",
+                                       book_status=PUBLISHED, author=author, user=self.users[0])
+            book.subcategory.add(subcategory)
+            for user in self.users:
+                BookViews.objects.create(user=user, book=book)
+                LikeBook.objects.create(user=user, book=book)
+                BookComment.objects.create(user=user, book=book, comment="comment")
+
+    def count_queries(self, url, data=None):
+        self.clear_caches()
+        with CaptureQueriesContext(connection) as context:
+            if data is None:
+                response = self.client.get(url)
+            else:
+                response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, url, data=None):
+        self.create_catalog(2)
+        small = self.count_queries(url, data)
+        self.create_catalog(8)
+        self.assertEqual(self.count_queries(url, data), small)
+
+
+class CountAnnotationTests(QueryBudgetTestCase):
+
+    def test_category_list(self):
+        self.assertConstantQueries('/api/v1/category/')
+
+    def test_country_list(self):
+        self.assertConstantQueries('/api/v1/country/')
+
+    def test_annotated_liked_books_count(self):
+        self.create_catalog(2)
+        user = User.objects.with_counts().get(pk=self.users[0].pk)
+        self.assertEqual(user.liked_books_total, 2)
+
+
+class PrefetchPlanTests(QueryBudgetTestCase):
+
+    def test_book_list(self):
+        self.assertConstantQueries('/api/v1/book/')
+
+    def test_popular_books(self):
+        self.create_catalog(2)
+        call_command('refresh_leaderboards', stdout=StringIO())
+        small = self.count_queries('/api/v1/popularbooks/views/')
+        self.create_catalog(8)
+        call_command('refresh_leaderboards', stdout=StringIO())
+        self.assertEqual(self.count_queries('/api/v1/popularbooks/views/'), small)
+        self.assertEqual(self.count_queries('/api/v1/popularbooks/blended/'), small)
+
+    def test_global_search(self):
+        self.assertConstantQueries('/api/v1/globalsearch/', {'query': 'book'})
+
+    def test_subcategory_list(self):
+        self.assertConstantQueries('/api/v1/subcategory/')
+
+    def test_author_list(self):
+        self.assertConstantQueries('/api/v1/authors/')
+
+    def test_book_comments(self):
+        self.create_catalog(1)
+        book = Book.objects.get()
+        BookComment.objects.bulk_create(BookComment(user=self.users[1], book=book, comment="comment") for _ in range(2))
+        small = self.count_queries(f'/api/v1/book/{book.id}/comment/')
+        BookComment.objects.bulk_create(BookComment(user=self.users[2], book=book, comment="comment") for _ in range(5))
+        self.assertEqual(self.count_queries(f'/api/v1/book/{book.id}/comment/'), small)
+
+
+class BookCounterTests(QueryBudgetTestCase):
+
+    def test_counters_follow_writes(self):
+        self.create_catalog(1)
+        book = Book.objects.get()
+        self.assertEqual((book.views_count, book.likes_count, book.comments_count), (3, 3, 3))
+        LikeBook.objects.filter(book=book, user=self.users[0]).delete()
+        book.comments.first().delete()
+        book.refresh_from_db()
+        self.assertEqual((book.views_count, book.likes_count, book.comments_count), (3, 2, 2))
+
+    def test_reconcile_command_repairs_drift(self):
+        self.create_catalog(3)
+        Book.objects.update(views_count=0, likes_count=100)
+        call_command('reconcile_book_counters', batch_size=2, stdout=StringIO())
+        self.assertEqual(set(Book.objects.values_list('views_count', 'likes_count', 'comments_count')), {(3, 3, 3)})
+
+
+class CursorPaginationTests(QueryBudgetTestCase):
+
+    def test_cursor_walks_every_book_once(self):
+        self.create_catalog(7)
+        response = self.client.get('/api/v1/book/', {'pagination': 'cursor', 'page_size': 3}).json()
+        self.assertNotIn('count', response)
+        self.assertIsNone(response['previous'])
+        titles = [book['title'] for book in response['results']]
+        while response['next']:
+            last = response
+            response = self.client.get(response['next']).json()
+            titles += [book['title'] for book in response['results']]
+        self.assertEqual(titles, [f"book-{i}" for i in reversed(range(7))])
+        previous = self.client.get(response['previous']).json()
+        self.assertEqual(previous['results'], last['results'])
+
+    def test_optional_count_and_invalid_cursor(self):
+        self.create_catalog(2)
+        response = self.client.get('/api/v1/book/', {'pagination': 'cursor', 'count': 'exact'}).json()
+        self.assertEqual(response['count'], 2)
+        self.assertEqual(self.client.get('/api/v1/book/', {'cursor': 'garbage'}).status_code, 404)
+
+
+class CountStrategyTests(QueryBudgetTestCase):
+
+    def test_exact_count_is_cached(self):
+        self.create_catalog(3)
+        first = self.client.get('/api/v1/book/').json()
+        self.assertEqual((first['count'], first['count_exact']), (3, True))
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/api/v1/book/')
+        self.assertEqual(len(context.captured_queries), self.count_queries('/api/v1/book/') - 1)
+
+    def test_estimate_falls_back_to_exact_count(self):
+        self.create_catalog(2)
+        response = self.client.get('/api/v1/book/', {'count': 'estimate'}).json()
+        self.assertEqual((response['count'], response['count_exact']), (2, True))
+
+    def test_has_more_without_count(self):
+        self.create_catalog(5)
+        response = self.client.get('/api/v1/book/', {'count': 'none', 'page_size': 2}).json()
+        self.assertNotIn('count', response)
+        self.assertFalse(response['count_exact'])
+        pages = 1
+        while response['next']:
+            response = self.client.get(response['next']).json()
+            pages += 1
+        self.assertEqual(pages, 3)
+        self.assertEqual(len(response['results']), 1)
+
+
+class BookSearchTests(QueryBudgetTestCase):
+
+    def search(self, query):
+        return self.client.post('/api/v1/globalsearch/', {'query': query}).json()
+
+    def test_ranked_stemmed_search_with_highlight(self):
+        self.create_catalog(2)
+        author = Author.objects.first()
+        Book.objects.create(title="Running wild", description="A story about runners", image="books/portfolio-img1.jpg",
+                            author=author, user=self.users[0])
+        Book.objects.create(title="Quiet lake", description="Nobody runs here", image="books/portfolio-img1.jpg",
+                            author=author, user=self.users[0])
+        response = self.search('run')
+        self.assertEqual(response['count'], 2)
+        self.assertEqual([book['title'] for book in response['results']], ["Running wild", "Quiet lake"])
+        self.assertIn('<mark>', response['results'][0]['highlight'])
+
+    def test_highlight_escapes_book_text(self):
+        self.create_catalog(1)
+        Book.objects.create(title="<script>alert(1)</script> runner", description="<b>bold</b> & runs",
+                            image="books/portfolio-img1.jpg", author=Author.objects.first(), user=self.users[0])
+        highlight = self.search('runner')['results'][0]['highlight']
+        self.assertNotIn('<script>', highlight)
+        self.assertNotIn('<b>', highlight)
+        self.assertIn('&lt;script&gt;', highlight)
+        self.assertIn('<mark>runner</mark>', highlight)
+
+    def test_index_follows_book_and_author_changes(self):
+        self.create_catalog(1)
+        book = Book.objects.get()
+        author = book.author
+        author.full_name = "Abdulla Qodiriy"
+        author.save()
+        self.assertEqual([result['id'] for result in self.search('qodiriy')['results']], [str(book.id)])
+        book.delete()
+        self.assertEqual(self.search('qodiriy')['count'], 0)
+
+    def test_index_entries_are_replaced_by_rowid(self):
+        self.create_catalog(1)
+        book = Book.objects.get()
+        book.title = "Mehrobdan chayon"
+        with CaptureQueriesContext(connection) as queries:
+            book.save()
+        deletes = [query['sql'] for query in queries if f'DELETE FROM {SEARCH_TABLE} ' in query['sql']]
+        self.assertTrue(deletes)
+        self.assertTrue(all(' WHERE rowid = ' in sql for sql in deletes), deletes)
+        self.assertEqual([result['id'] for result in self.search('chayon')['results']], [str(book.id)])
+
+
+@override_settings(AUTOCOMPLETE_SYNC_IN_BACKGROUND=False)
+class AutocompleteTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        autocomplete.index.pid = None
+
+    def suggest(self, q):
+        return [item['text'] for item in self.client.get('/api/v1/autocomplete/', {'q': q}).json()['data']]
+
+    def test_prefix_and_typo_suggestions(self):
+        self.create_catalog(1)
+        author = Author.objects.get()
+        Book.objects.create(title="O'tkan kunlar", description="roman", image="books/portfolio-img1.jpg",
+                            book_status=PUBLISHED, author=author, user=self.users[0])
+        self.assertIn("O'tkan kunlar", self.suggest('kun'))
+        self.assertIn("O'tkan kunlar", self.suggest('kunlra'))
+        self.assertEqual(self.suggest('zzzz'), [])
+
+    def test_suggestions_follow_model_changes(self):
+        self.create_catalog(1)
+        self.assertEqual(self.suggest('author'), ['author-0'])
+        author = Author.objects.get()
+        author.full_name = "Cho'lpon"
+        with mock.patch.object(autocomplete.index, 'build') as build:
+            author.save()
+            self.assertEqual(self.suggest('cholpon'), ["Cho'lpon"])
+            self.assertEqual(self.suggest('author'), [])
+        build.assert_not_called()
+
+    @override_settings(AUTOCOMPLETE_SYNC_INTERVAL=0)
+    def test_changes_from_other_processes_are_applied_from_the_log(self):
+        self.create_catalog(2)
+        self.assertEqual(self.suggest('author'), ['author-0', 'author-1'])
+        # Another worker's save: no signal reaches this process, only its log row.
+        author = Author.objects.get(full_name='author-0')
+        Author.objects.filter(pk=author.pk).update(full_name="Cho'lpon")
+        autocomplete.record_changes(autocomplete.AUTHOR, [author.pk])
+        with mock.patch.object(autocomplete.index, 'build') as build:
+            self.assertEqual(self.suggest('cholpon'), ["Cho'lpon"])
+            self.assertEqual(self.suggest('author'), ['author-1'])
+        build.assert_not_called()
+
+    @override_settings(AUTOCOMPLETE_SYNC_INTERVAL=0)
+    def test_changes_committed_out_of_order_are_applied(self):
+        self.create_catalog(1)
+        self.assertEqual(self.suggest('author'), ['author-0'])
+        author = Author.objects.get()
+        last = autocomplete.index.last_change
+        CatalogChange.objects.create(id=last + 2, kind=autocomplete.AUTHOR, object_id=author.pk)
+        self.assertEqual(self.suggest('author'), ['author-0'])
+        self.assertEqual(autocomplete.index.last_change, last + 2)
+        # The row with the lower id commits after the later one was synced.
+        Author.objects.filter(pk=author.pk).update(full_name="Cho'lpon")
+        CatalogChange.objects.create(id=last + 1, kind=autocomplete.AUTHOR, object_id=author.pk)
+        self.assertEqual(self.suggest('cholpon'), ["Cho'lpon"])
+
+    @override_settings(AUTOCOMPLETE_SYNC_IN_BACKGROUND=True)
+    def test_sync_runs_off_the_request_path(self):
+        self.create_catalog(1)
+        with mock.patch('book.autocomplete.threading.Thread') as thread:
+            self.assertEqual(self.suggest('author'), ['author-0'])
+            author = Author.objects.get()
+            Author.objects.filter(pk=author.pk).update(full_name="Cho'lpon")
+            autocomplete.record_changes(autocomplete.AUTHOR, [author.pk])
+            with self.assertNumQueries(0):
+                self.assertEqual(autocomplete.get_index().suggest('author'), [
+                    {'type': autocomplete.AUTHOR, 'id': str(author.pk), 'text': 'author-0'}])
+        thread.assert_called_once()
+        self.assertEqual(thread.call_args.kwargs['target'], autocomplete.index.run_sync)
+        autocomplete.index.sync()
+        self.assertEqual(self.suggest('cholpon'), ["Cho'lpon"])
+
+
+class LeaderboardTests(QueryBudgetTestCase):
+
+    def test_recent_engagement_outranks_old(self):
+        self.create_catalog(3)
+        old, recent, quiet = Book.objects.order_by('created_time')
+        BookViews.objects.filter(book=quiet).delete()
+        BookViews.objects.filter(book=old).update(created_time=timezone.now() - timedelta(days=30))
+        response = self.client.get('/api/v1/popularbooks/views/').json()
+        self.assertEqual([book['id'] for book in response['results']], [str(recent.id), str(old.id), str(quiet.id)])
+        self.assertIn('refreshed_time', response)
+
+    def test_board_is_served_until_refreshed(self):
+        self.create_catalog(1)
+        self.assertEqual(self.client.get('/api/v1/popularbooks/likes/').json()['count'], 1)
+        self.create_catalog(1)
+        self.assertEqual(self.client.get('/api/v1/popularbooks/likes/').json()['count'], 1)
+        call_command('refresh_leaderboards', 'likes', stdout=StringIO())
+        self.assertEqual(self.client.get('/api/v1/popularbooks/likes/').json()['count'], 2)
+
+    def test_unpublished_books_leave_the_board_count(self):
+        self.create_catalog(3)
+        self.assertEqual(self.client.get('/api/v1/popularbooks/likes/').json()['count'], 3)
+        drafted, deleted, kept = Book.objects.order_by('created_time')
+        drafted.book_status = 'draft'
+        drafted.save()
+        deleted.delete()
+        response = self.client.get('/api/v1/popularbooks/likes/').json()
+        self.assertEqual((response['count'], [book['id'] for book in response['results']]), (1, [str(kept.id)]))
+
+
+class MediaRootTestCase(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class RangedDownloadTests(MediaRootTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.create_catalog(1)
+        self.book = Book.objects.get()
+        self.content = bytes(range(256)) * 4
+        self.book.book_audio = SimpleUploadedFile('chapter.mp3', self.content, content_type='audio/mpeg')
+        self.book.save()
+        self.url = f'/api/v1/book/{self.book.id}/audio/'
+
+    def get(self, **headers):
+        return self.client.get(self.url, headers=headers)
+
+    def test_full_download_advertises_ranges(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(response['ETag'])
+
+    def test_single_range(self):
+        response = self.get(Range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+        response = self.get(Range='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-5:])
+
+    def test_multiple_ranges(self):
+        response = self.get(Range='bytes=0-3, 100-103')
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response['Content-Type'].startswith('multipart/byteranges'))
+        body = b''.join(response.streaming_content)
+        self.assertEqual(len(body), int(response['Content-Length']))
+        self.assertIn(self.content[0:4], body)
+        self.assertIn(b'Content-Range: bytes 100-103/1024', body)
+
+    def test_unsatisfiable_range(self):
+        response = self.get(Range='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_conditional_requests(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(If_None_Match=etag).status_code, 304)
+        self.assertEqual(self.get(Range='bytes=0-9', If_Range=etag).status_code, 206)
+        self.assertEqual(self.get(Range='bytes=0-9', If_Range='"stale"').status_code, 200)
+
+    def test_missing_file_keeps_error_envelope(self):
+        response = self.client.get(f'/api/v1/book/{self.book.id}/file/').json()
+        self.assertFalse(response['success'])
+
+
+@override_settings(RESPONSE_CACHE_ALIAS='responses')
+class ResponseCacheTests(QueryBudgetTestCase):
+
+    def test_repeat_request_is_served_from_cache(self):
+        self.create_catalog(2)
+        first = self.client.get('/api/v1/book/')
+        with CaptureQueriesContext(connection) as context:
+            second = self.client.get('/api/v1/book/')
+        self.assertEqual(len(context.captured_queries), 0)
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(self.client.get('/api/v1/book/', {'page_size': 1})['X-Cache'], 'MISS')
+
+    @override_settings(RESPONSE_CACHE_ALIAS=None)
+    def test_nothing_is_cached_without_a_shared_cache(self):
+        self.create_catalog(1)
+        self.client.get('/api/v1/book/')
+        response = self.client.get('/api/v1/book/')
+        self.assertNotIn('X-Cache', response)
+        self.assertEqual(response.json()['count'], 1)
+        self.assertEqual(response_cache.get_stats(['booklistcreateapiview.get'])['booklistcreateapiview.get'], {'hit': 0, 'miss': 0})
+
+    def test_writes_invalidate_dependent_lists(self):
+        self.create_catalog(1)
+        self.client.get('/api/v1/category/')
+        self.client.get('/api/v1/country/')
+        Category.objects.create(name="new", category_status=ACTIVE)
+        response = self.client.get('/api/v1/category/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.json()['data']), 2)
+        self.assertEqual(self.client.get('/api/v1/country/')['X-Cache'], 'HIT')
+        Book.objects.get().subcategory.clear()
+        self.assertEqual(self.client.get('/api/v1/book/')['X-Cache'], 'MISS')
+
+    def test_user_changes_invalidate_book_lists(self):
+        self.create_catalog(1)
+        self.client.get('/api/v1/book/')
+        user = Book.objects.get().user
+        user.last_login = timezone.now()
+        user.save(update_fields=['last_login'])
+        self.assertEqual(self.client.get('/api/v1/book/')['X-Cache'], 'HIT')
+        user.username = 'renamed'
+        user.save()
+        response = self.client.get('/api/v1/book/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['results'][0]['user']['username'], 'renamed')
+
+    def test_host_is_part_of_the_key(self):
+        self.create_catalog(2)
+        first = self.client.get('/api/v1/book/', {'page_size': 1}).json()
+        response = self.client.get('/api/v1/book/', {'page_size': 1}, HTTP_HOST='mirror.example.com')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertTrue(first['next'].startswith('http://testserver/'))
+        self.assertTrue(response.json()['next'].startswith('http://mirror.example.com/'))
+
+    def test_auth_state_is_part_of_the_key(self):
+        self.create_catalog(1)
+        self.client.get('/api/v1/country/')
+        self.client.force_login(self.users[0])
+        self.assertEqual(self.client.get('/api/v1/country/')['X-Cache'], 'MISS')
+        stats = response_cache.get_stats(['countrylistcreateapiview.get'])
+        self.assertEqual(stats['countrylistcreateapiview.get'], {'hit': 0, 'miss': 2})
+
+
+@override_settings(BOOK_VIEWS_FLUSH_INTERVAL=0, BOOK_VIEWS_FLUSH_SIZE=100, BOOK_VIEWS_BUFFER_LIMIT=3)
+class ViewBufferTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        view_buffer.buffer.metrics.clear()
+        self.addCleanup(view_buffer.buffer.pending.clear)
+        self.create_catalog(1)
+        self.book = Book.objects.get()
+        self.reader = User.objects.create(username="visitor", password="secret-pass")
+        self.client.force_login(self.reader)
+
+    def test_detail_read_only_selects(self):
+        with CaptureQueriesContext(connection) as context:
+            for _ in range(2):
+                self.assertEqual(self.client.get(f'/api/v1/book/{self.book.id}/').status_code, 200)
+        self.assertTrue(all(query['sql'].startswith('SELECT') for query in context.captured_queries))
+        self.assertEqual(view_buffer.buffer.get_metrics()['pending'], 1)
+
+    def test_flush_writes_batch_and_counters(self):
+        self.client.get(f'/api/v1/book/{self.book.id}/')
+        view_buffer.record_view(self.users[0].pk, self.book.pk)
+        self.assertEqual(view_buffer.buffer.flush(), 2)
+        self.assertEqual(BookViews.objects.filter(book=self.book).count(), 4)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.views_count, 4)
+        self.assertEqual(view_buffer.buffer.get_metrics()['written'], 2)
+
+    def test_flush_adds_new_views_to_counter_with_their_own_time(self):
+        Book.objects.filter(pk=self.book.pk).update(views_count=10)
+        viewed = timezone.now() - timedelta(minutes=5)
+        with mock.patch('book.view_buffer.timezone.now', return_value=viewed):
+            view_buffer.record_view(self.reader.pk, self.book.pk)
+            view_buffer.record_view(self.users[0].pk, self.book.pk)
+        with CaptureQueriesContext(connection) as context:
+            view_buffer.buffer.flush()
+        self.assertFalse(any('COUNT(' in query['sql'] for query in context.captured_queries))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.views_count, 11)
+        self.assertEqual(BookViews.objects.get(user=self.reader).created_time, viewed)
+
+    def test_full_buffer_drops_events(self):
+        for user in self.users + [self.reader]:
+            view_buffer.record_view(user.pk, self.book.pk)
+        self.assertEqual(view_buffer.buffer.get_metrics()['dropped'], 1)
+
+
+@override_settings(IMAGE_VARIANT_WIDTHS=[200, 400, 800])
+class ImageVariantTests(MediaRootTestCase):
+
+    @staticmethod
+    def make_photo(width=600, height=300):
+        exif = Image.Exif()
+        exif[0x0110] = 'Camera'
+        buffer = BytesIO()
+        Image.new('RGB', (width, height), 'red').save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile('cover.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_upload_builds_variants(self):
+        self.create_catalog(1)
+        book = Book.objects.get()
+        book.image = self.make_photo()
+        book.save()
+        book.refresh_from_db()
+        self.assertEqual(sorted(book.image_variants['webp'], key=int), ['200', '400'])
+        with book.image.storage.open(book.image_variants['jpeg']['200']) as variant:
+            image = Image.open(variant)
+            self.assertEqual(image.size, (200, 100))
+            self.assertFalse(image.getexif())
+        srcset = self.client.get(f'/api/v1/book/{book.id}/').json()['data']['image_srcset']
+        self.assertRegex(srcset['webp'], r'^\S+\.webp 200w, \S+\.webp 400w$')
+
+    def test_replacing_image_removes_old_variants(self):
+        self.create_catalog(1)
+        book = Book.objects.get()
+        book.image = self.make_photo()
+        book.save()
+        old = book.image_variants['webp']['200']
+        book.image = self.make_photo(300, 300)
+        book.save()
+        self.assertFalse(book.image.storage.exists(old))
+        self.assertEqual(list(book.image_variants['webp']), ['200'])
+
+    def test_identical_reupload_keeps_variants(self):
+        self.create_catalog(1)
+        book = Book.objects.get()
+        book.image = self.make_photo()
+        book.save()
+        variants = book.image_variants
+        book.image = self.make_photo()
+        book.save()
+        book.refresh_from_db()
+        self.assertEqual(book.image_variants, variants)
+        names = [name for extension in ('webp', 'jpeg') for name in variants[extension].values()]
+        self.assertTrue(all(book.image.storage.exists(name) for name in names))
+        call_command('generate_image_variants', workers=1, force=True, stdout=StringIO())
+        self.assertTrue(all(book.image.storage.exists(name) for name in names))
+
+    def test_backfill_command(self):
+        self.create_catalog(1)
+        book = Book.objects.get()
+        name = book.image.storage.save('books/existing.jpg', self.make_photo())
+        Book.objects.filter(pk=book.pk).update(image=name)
+        call_command('generate_image_variants', workers=1, stdout=StringIO())
+        book.refresh_from_db()
+        self.assertEqual(book.image_variants['source'], name)
+        self.assertEqual(sorted(book.image_variants['jpeg'], key=int), ['200', '400'])
+
+
+class ChunkedUploadTests(MediaRootTestCase):
+
+    def setUp(self):
+        super().setUp()
+        settings_override = override_settings(UPLOAD_SESSION_DIR=os.path.join(self.media_root, 'partial'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.create_catalog(1)
+        self.book = Book.objects.get()
+        self.client.force_login(self.users[0])
+        self.content = os.urandom(3000)
+
+    def start(self, **extra):
+        data = {'field': 'book_audio', 'filename': 'chapter.mp3', 'size': len(self.content), **extra}
+        return self.client.post('/api/v1/upload/', data).json()['data']['id']
+
+    def send(self, session_id, start, end, checksum=None):
+        headers = {'Content-Range': f'bytes {start}-{end}/{len(self.content)}'}
+        chunk = self.content[start:end + 1]
+        headers['X-Chunk-Checksum'] = checksum or hashlib.sha256(chunk).hexdigest()
+        return self.client.put(f'/api/v1/upload/{session_id}/', chunk, content_type='application/octet-stream',
+                               headers=headers).json()
+
+    def test_resumable_upload_attaches_to_book(self):
+        session_id = self.start(sha256=hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(self.send(session_id, 0, 999)['data']['offset'], 1000)
+        rejected = self.send(session_id, 2000, 2999)
+        self.assertFalse(rejected['success'])
+        self.assertEqual(rejected['data']['offset'], 1000)
+        offset = self.client.get(f'/api/v1/upload/{session_id}/').json()['data']['offset']
+        self.send(session_id, offset, 2999)
+        response = self.client.post(f'/api/v1/upload/{session_id}/complete/', {'book_id': self.book.id}).json()
+        self.assertTrue(response['success'])
+        self.book.refresh_from_db()
+        with self.book.book_audio.open('rb') as audio:
+            self.assertEqual(audio.read(), self.content)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'partial')), [])
+
+    def test_corrupt_chunk_is_not_acknowledged(self):
+        session_id = self.start()
+        response = self.send(session_id, 0, 999, checksum='0' * 64)
+        self.assertEqual((response['success'], response['data']['offset']), (False, 0))
+        self.assertEqual(self.send(session_id, 0, 999)['data']['offset'], 1000)
+        response = self.client.post(f'/api/v1/upload/{session_id}/complete/', {'book_id': self.book.id}).json()
+        self.assertFalse(response['success'])
+
+    def test_rejects_disallowed_extension(self):
+        response = self.client.post('/api/v1/upload/', {'field': 'book_file', 'filename': 'tool.exe', 'size': 10}).json()
+        self.assertIn('filename', response['data'])
+
+
+class ContentAddressedStorageTests(MediaRootTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.create_catalog(1)
+        self.book = Book.objects.get()
+        self.author = Author.objects.get()
+
+    @staticmethod
+    def upload(content=b'%PDF-1.4 same bytes'):
+        return SimpleUploadedFile('book.pdf', content, content_type='application/pdf')
+
+    def test_identical_uploads_share_one_blob(self):
+        self.book.book_file = self.upload()
+        self.book.save()
+        other = Book.objects.create(title="copy", description="description", image="books/portfolio-img1.jpg",
+                                    book_file=self.upload(), author=self.author, user=self.users[0])
+        self.assertEqual(other.book_file.name, self.book.book_file.name)
+        self.assertTrue(other.book_file.name.startswith('blobs/'))
+        self.assertEqual(MediaBlob.objects.get().refcount, 2)
+        other.delete()
+        self.assertEqual(MediaBlob.objects.get().refcount, 1)
+
+    def test_collect_removes_orphans_only(self):
+        self.book.book_file = self.upload()
+        self.book.save()
+        kept = self.book.book_file.name
+        self.book.book_file = self.upload(b'%PDF-1.4 second edition')
+        self.book.save()
+        orphan = MediaBlob.objects.get(name=kept)
+        self.assertEqual(orphan.refcount, 0)
+        call_command('collect_media_blobs', grace_hours=0, stdout=StringIO())
+        self.assertFalse(MediaBlob.objects.filter(name=kept).exists())
+        self.assertFalse(self.book.book_file.storage.exists(kept))
+        self.assertTrue(self.book.book_file.storage.exists(self.book.book_file.name))
+
+
+@override_settings(BOOK_VIEWS_FLUSH_INTERVAL=0)
+class AsyncReadPathTests(MediaRootTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.create_catalog(3)
+        self.book = Book.objects.order_by('-created_time').first()
+        self.addCleanup(view_buffer.buffer.pending.clear)
+
+    async def test_book_list_matches_v1(self):
+        v1 = (await self.async_client.get('/api/v1/book/', {'page_size': 2})).json()
+        v2 = (await self.async_client.get('/api/v2/book/', {'page_size': 2})).json()
+        self.assertEqual([book['id'] for book in v2['results']], [book['id'] for book in v1['results']])
+        self.assertEqual((v2['count'], v2['next'] is not None), (3, True))
+
+    async def test_detail_records_view_and_search(self):
+        await sync_to_async(self.async_client.force_login)(self.users[0])
+        response = (await self.async_client.get(f'/api/v2/book/{self.book.id}/')).json()
+        self.assertEqual(response['data']['id'], str(self.book.id))
+        self.assertIn((self.users[0].pk, self.book.pk), view_buffer.buffer.pending)
+        search = (await self.async_client.get('/api/v2/globalsearch/', {'q': 'book'})).json()
+        self.assertEqual(search['count'], 3)
+        popular = (await self.async_client.get('/api/v2/popularbooks/likes/')).json()
+        self.assertIn('refreshed_time', popular)
+
+    async def test_audio_is_streamed_asynchronously(self):
+        content = bytes(range(256)) * 8
+        self.book.book_audio = SimpleUploadedFile('chapter.mp3', content, content_type='audio/mpeg')
+        await sync_to_async(self.book.save)()
+        response = await self.async_client.get(f'/api/v2/book/{self.book.id}/audio/', headers={'Range': 'bytes=100-199'})
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response.is_async)
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), content[100:200])
+
+    async def test_v1_downloads_are_not_buffered_under_asgi(self):
+        content = bytes(range(256)) * 8
+        self.book.book_audio = SimpleUploadedFile('chapter.mp3', content, content_type='audio/mpeg')
+        self.book.book_file = SimpleUploadedFile('book.pdf', b'%PDF-1.4 ' + content, content_type='application/pdf')
+        await sync_to_async(self.book.save)()
+        for path, body in (('audio', content), ('file', b'%PDF-1.4 ' + content)):
+            response = await self.async_client.get(f'/api/v1/book/{self.book.id}/{path}/')
+            self.assertTrue(response.is_async, path)
+            with warnings.catch_warnings():
+                # Raised by StreamingHttpResponse when it has to consume a synchronous iterator.
+                warnings.simplefilter('error')
+                self.assertEqual(b''.join([chunk async for chunk in response]), body)
+
+
+class MetricsTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, metrics_dir, ignore_errors=True)
+        settings_override = override_settings(METRICS_DIR=metrics_dir, METRICS_FLUSH_INTERVAL=3600)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        metrics.registry.series.clear()
+        self.addCleanup(metrics.registry.series.clear)
+        self.staff = User.objects.create(username="staff", password="secret-pass", is_staff=True)
+
+    def test_route_latency_and_queries_are_exported(self):
+        self.create_catalog(2)
+        self.client.get('/api/v1/book/')
+        self.client.get('/api/v1/book/')
+        self.client.force_login(self.staff)
+        response = self.client.get('/metrics')
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        text = response.content.decode()
+        self.assertIn('http_requests_total{route="api/v1/book/",method="GET",status="200"} 2', text)
+        self.assertIn('http_request_duration_seconds_count{route="api/v1/book/",method="GET"} 2', text)
+        queries = re.search(r'^db_queries_total\{route="api/v1/book/",method="GET"\} (\d+)$', text, re.M)
+        self.assertGreater(int(queries.group(1)), 0)
+        self.assertIn('book_view_buffer{key="pending"}', text)
+
+    def test_snapshots_of_other_workers_are_merged(self):
+        self.client.get('/api/v1/book/')
+        metrics.registry.flush()
+        os.replace(os.path.join(metrics.settings.METRICS_DIR, f"metrics-{os.getpid()}.json"),
+                   os.path.join(metrics.settings.METRICS_DIR, f"metrics-{os.getppid()}.json"))
+        metrics.registry.series.clear()
+        self.client.get('/api/v1/book/')
+        self.client.force_login(self.staff)
+        text = self.client.get('/metrics').content.decode()
+        self.assertIn('http_requests_total{route="api/v1/book/",method="GET",status="200"} 2', text)
+
+    def test_metrics_are_staff_only(self):
+        self.assertIn(self.client.get('/metrics').status_code, (401, 403))
+        self.client.force_login(self.users[0])
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+
+class CatalogImportTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        settings_override = override_settings(CATALOG_IMPORT_DIR=self.directory, CATALOG_IMPORT_BACKGROUND=False,
+                                              CATALOG_IMPORT_CHUNK_SIZE=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.staff = User.objects.create(username="importer", password="secret-pass", is_staff=True)
+        self.country = Country.objects.create(name="Uzbekistan")
+        self.author = Author.objects.create(full_name="Abdulla Qodiriy", birthday=date(1894, 4, 10), country=self.country)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as handle:
+            handle.write(content)
+        return path
+
+    def test_csv_import_resolves_natural_keys_and_links_subcategories(self):
+        path = self.write('catalog.csv', (
+            "title,description,author,author_birthday,country,category,subcategories,status\n"
+            "O'tkan kunlar,Roman,abdulla qodiriy,,uzbekistan,Badiiy,Roman|Tarixiy,published\n"
+            "Mehrobdan chayon,Roman,Abdulla Qodiriy,,Uzbekistan,badiiy,roman,published\n"
+            ",No title,Someone,1900-01-01,Uzbekistan,,,\n"
+            "Kecha va kunduz,Roman,Cho'lpon,1897-01-01,Uzbekistan,Badiiy,Roman,draft\n"
+        ))
+        call_command('import_catalog', path, user='importer', stdout=StringIO())
+        job = CatalogImport.objects.get()
+        self.assertEqual((job.status, job.rows, job.books_created, job.rows_failed), ('complete', 4, 3, 1))
+        self.assertEqual(job.errors, [{'row': 3, 'error': 'title is required'}])
+        self.assertEqual(Country.objects.count(), 1)
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(Book.objects.filter(author=self.author).count(), 2)
+        self.assertEqual(list(Category.objects.values_list('name', flat=True)), ['Badiiy'])
+        self.assertEqual(sorted(SubCategory.objects.values_list('name', flat=True)), ['Roman', 'Tarixiy'])
+        self.assertEqual(Book.objects.get(title="O'tkan kunlar").subcategory.count(), 2)
+        with self.assertRaises(CommandError):
+            call_command('import_catalog', path, user='importer', stdout=StringIO())
+
+    def test_interrupted_import_resumes_after_last_chunk(self):
+        rows = [json.dumps({'title': f"Kitob {i}", 'author': "Abdulla Qodiriy", 'country': "Uzbekistan"}) for i in range(5)]
+        path = self.write('catalog.jsonl', '\n'.join(rows))
+        original = CatalogImporter.import_chunk
+
+        def crash_on_second_chunk(importer, chunk):
+            if importer.job.rows == 2:
+                raise RuntimeError("disk full")
+            return original(importer, chunk)
+
+        with mock.patch.object(CatalogImporter, 'import_chunk', crash_on_second_chunk), self.assertLogs('book.catalog_import'):
+            with self.assertRaises(CommandError):
+                call_command('import_catalog', path, user='importer', stdout=StringIO())
+        self.assertEqual((CatalogImport.objects.get().status, Book.objects.count()), ('failed', 2))
+        call_command('import_catalog', path, user='importer', stdout=StringIO())
+        self.assertEqual(sorted(Book.objects.values_list('title', flat=True)), [f"Kitob {i}" for i in range(5)])
+        self.assertEqual(CatalogImport.objects.get().status, 'complete')
+
+    def test_command_resumes_a_running_import_only_once_stale(self):
+        path = self.write('catalog.jsonl', '\n'.join(
+            json.dumps({'title': f"Kitob {i}", 'author': "Abdulla Qodiriy", 'country': "Uzbekistan"}) for i in range(3)))
+        with open(path, 'rb') as handle:
+            digest = hashlib.sha256(handle.read()).hexdigest()
+        job = CatalogImport.objects.create(user=self.staff, source='catalog.jsonl', path='gone.jsonl', digest=digest,
+                                           format='jsonl')
+        with self.assertRaises(CommandError):
+            call_command('import_catalog', path, user='importer', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.path, Book.objects.count()), ('running', 'gone.jsonl', 0))
+        CatalogImport.objects.filter(pk=job.pk).update(updated_time=timezone.now() - timedelta(seconds=301))
+        call_command('import_catalog', path, user='importer', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows, Book.objects.count()), ('complete', 3, 3))
+
+    def test_staff_endpoint_imports_upload(self):
+        content = json.dumps({'title': "Sarob", 'author': "Abdulla Qahhor", 'author_birthday': "1907-09-17",
+                              'country': "Uzbekistan", 'status': 'published'}).encode()
+        upload = SimpleUploadedFile('catalog.jsonl', content, content_type='application/x-ndjson')
+        self.client.force_login(self.users[0])
+        self.assertEqual(self.client.post('/api/v1/import/', {'file': upload}).status_code, 403)
+        self.client.force_login(self.staff)
+        upload.seek(0)
+        response = self.client.post('/api/v1/import/', {'file': upload}).json()
+        self.assertEqual((response['status'], response['data']['status'], response['data']['books_created']), (201, 'complete', 1))
+        detail = self.client.get(f"/api/v1/import/{response['data']['id']}/").json()
+        self.assertEqual(detail['data']['rows'], 1)
+        self.assertTrue(Book.objects.filter(title="Sarob", author__full_name="Abdulla Qahhor").exists())
+
+    def test_stale_running_import_resumes_from_checkpoint(self):
+        content = '\n'.join(json.dumps({'title': f"Kitob {i}", 'author': "Abdulla Qodiriy", 'country': "Uzbekistan"})
+                             for i in range(5)).encode()
+        digest = hashlib.sha256(content).hexdigest()
+        # Left RUNNING by a worker that died after committing the first two rows.
+        job = CatalogImport.objects.create(user=self.staff, source='catalog.jsonl', path='gone.jsonl', digest=digest,
+                                           format='jsonl', rows=2, books_created=2)
+        self.client.force_login(self.staff)
+        upload = SimpleUploadedFile('catalog.jsonl', content, content_type='application/x-ndjson')
+        response = self.client.post('/api/v1/import/', {'file': upload}).json()
+        self.assertEqual((response['status'], response['data']['status']), (200, 'running'))
+        CatalogImport.objects.filter(pk=job.pk).update(updated_time=timezone.now() - timedelta(seconds=301))
+        upload.seek(0)
+        response = self.client.post('/api/v1/import/', {'file': upload}).json()
+        self.assertEqual((response['status'], response['data']['id']), (201, str(job.pk)))
+        self.assertEqual((response['data']['status'], response['data']['rows'], response['data']['books_created']),
+                         ('complete', 5, 5))
+        self.assertEqual(sorted(Book.objects.values_list('title', flat=True)), [f"Kitob {i}" for i in range(2, 5)])
+
+
+@override_settings(CATALOG_EXPORT_CHUNK_SIZE=2)
+class CatalogExportTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.staff = User.objects.create(username="exporter", password="secret-pass", is_staff=True)
+        self.create_catalog(5)
+        Book.objects.filter(title="book-0").update(book_status='draft')
+
+    def test_jsonl_export_streams_flat_rows_in_chunks(self):
+        self.client.force_login(self.users[0])
+        self.assertEqual(self.client.get('/api/v1/export/').status_code, 403)
+        self.client.force_login(self.staff)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/v1/export/')
+            rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertIn('X-Export-Started', response)
+        self.assertEqual(sorted(row['title'] for row in rows), [f"book-{i}" for i in range(1, 5)])
+        row = next(row for row in rows if row['title'] == "book-1")
+        self.assertEqual((row['author'], row['country'], row['categories'], row['subcategories']),
+                         ("author-1", "country-1", ["category-1"], ["subcategory-1"]))
+        self.assertEqual((row['views_count'], row['likes_count'], row['comments_count']), (3, 3, 3))
+        self.assertEqual(row['image_url'], 'http://testserver/media/books/portfolio-img1.jpg')
+        # One query for the books and one per chunk of two for their subcategories.
+        self.assertEqual(sum('book_book_subcategory' in query['sql'] for query in context.captured_queries), 2)
+
+    def test_csv_gzip_export_filters_by_updated_since(self):
+        since = timezone.now() + timedelta(days=1)
+        Book.objects.filter(title__in=["book-2", "book-3"]).update(updated_time=since)
+        self.client.force_login(self.staff)
+        response = self.client.get('/api/v1/export/', {'type': 'csv', 'gzip': 1, 'updated_since': since.isoformat()})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertRegex(response['Content-Disposition'], r'catalog-\d{8}T\d{6}Z\.csv\.gz')
+        content = gzip.decompress(b''.join(response.streaming_content)).decode()
+        rows = list(csv.DictReader(StringIO(content)))
+        subcategories = {row['title']: row['subcategories'] for row in rows}
+        self.assertEqual(subcategories, {"book-2": "subcategory-2", "book-3": "subcategory-3"})
+        invalid = self.client.get('/api/v1/export/', {'updated_since': 'yesterday'}).json()
+        self.assertEqual((invalid['status'], invalid['success']), (400, False))
+
+    def test_incremental_export_carries_counter_changes_and_tombstones(self):
+        since = timezone.now()
+        books = {book.title: book for book in Book.objects.all()}
+        removed = {str(books["book-2"].pk), str(books["book-3"].pk)}
+        LikeBook.objects.filter(book=books["book-1"]).first().delete()
+        books["book-2"].delete()
+        books["book-3"].book_status = 'draft'
+        books["book-3"].save()
+        self.client.force_login(self.staff)
+        response = self.client.get('/api/v1/export/', {'updated_since': since.isoformat()})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([(row.get('title'), row['deleted']) for row in rows], [("book-1", False), (None, True), (None, True)])
+        self.assertEqual(rows[0]['likes_count'], 2)
+        self.assertEqual({row['id'] for row in rows[1:]}, removed)
+        response = self.client.get('/api/v1/export/', {'type': 'csv', 'updated_since': since.isoformat()})
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([(row['title'], row['deleted']) for row in rows], [("book-1", '0'), ('', '1'), ('', '1')])
+        expired = self.client.get('/api/v1/export/', {'updated_since': (since - timedelta(days=31)).isoformat()}).json()
+        self.assertEqual((expired['status'], expired['success']), (400, False))
+
+    def test_command_writes_gzipped_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'catalog.jsonl.gz')
+        call_command('export_catalog', path, base_url='https://cdn.example.com', stdout=StringIO())
+        with gzip.open(path, 'rt') as handle:
+            rows = [json.loads(line) for line in handle]
+        self.assertEqual(len(rows), 4)
+        self.assertTrue(rows[0]['image_url'].startswith('https://cdn.example.com/media/'))
+        self.assertEqual(os.listdir(directory), ['catalog.jsonl.gz'])
+
+    async def test_export_streams_asynchronously_under_asgi(self):
+        await sync_to_async(self.async_client.force_login)(self.staff)
+        response = await self.async_client.get('/api/v1/export/')
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(content.decode().splitlines()), 4)
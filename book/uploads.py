@@ -0,0 +1,113 @@
+import hashlib
+import os
+import re
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from book.models import Book, OPEN, COMPLETE
+
+
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+
+    def __init__(self, message, session=None):
+        super().__init__(message)
+        self.message = message
+        self.session = session
+
+
+def part_path(session):
+    return os.path.join(settings.UPLOAD_SESSION_DIR, f"{session.id.hex}.part")
+
+
+def parse_content_range(header):
+    match = CONTENT_RANGE.match(header or '')
+    if match is None:
+        return None
+    start, end, total = map(int, match.groups())
+    return (start, end, total) if start <= end < total else None
+
+
+def write_chunk(session, stream, content_range, checksum=None):
+    """
+    Append one chunk read from ``stream`` in small pieces, so memory stays flat for any chunk size.
+
+    The chunk must start at the acknowledged offset; on a short body or checksum mismatch the partial
+    file is cut back to that offset and the session is left unchanged, so the client can resend.
+    """
+    start, end, total = content_range
+    if session.status != OPEN:
+        raise UploadError("Yuklash yakunlangan", session)
+    if total != session.size or end >= session.size:
+        raise UploadError("Content-Range fayl hajmiga mos emas", session)
+    if start != session.offset:
+        raise UploadError("Bo'lak boshqa joydan boshlanishi kerak", session)
+    length = end - start + 1
+    if length > settings.UPLOAD_CHUNK_MAX_SIZE:
+        raise UploadError("Bo'lak hajmi juda katta", session)
+
+    os.makedirs(settings.UPLOAD_SESSION_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    received = 0
+    with open(part_path(session), 'a+b') as part:
+        part.truncate(start)
+        while received < length:
+            data = stream.read(min(READ_SIZE, length - received))
+            if not data:
+                break
+            part.write(data)
+            digest.update(data)
+            received += len(data)
+        if received != length or (checksum and digest.hexdigest() != checksum.lower()):
+            part.truncate(start)
+            raise UploadError("Bo'lak to'liq yoki to'g'ri kelmadi", session)
+        part.flush()
+        os.fsync(part.fileno())
+    session.offset = end + 1
+    session.save(update_fields=['offset', 'updated_time'])
+    return session
+
+
+class HashingFile(File):
+    """File whose ``chunks()`` feed a running sha256, so storing it also verifies it."""
+
+    def __init__(self, file, name=None):
+        super().__init__(file, name)
+        self.digest = hashlib.sha256()
+
+    def chunks(self, chunk_size=None):
+        for chunk in super().chunks(chunk_size):
+            self.digest.update(chunk)
+            yield chunk
+
+
+def assemble(session, book):
+    """Stream the finished part file into ``book``'s file field storage and attach it."""
+    if session.status != OPEN or session.offset != session.size:
+        raise UploadError("Fayl hali to'liq yuklanmagan", session)
+    field = Book._meta.get_field(session.field)
+    with open(part_path(session), 'rb') as part:
+        content = HashingFile(part, session.filename)
+        name = field.storage.save(field.generate_filename(book, session.filename), content,
+                                  max_length=field.max_length)
+    if session.sha256 and content.digest.hexdigest() != session.sha256.lower():
+        field.storage.delete(name)
+        raise UploadError("Fayl checksum mos kelmadi", session)
+    with transaction.atomic():
+        setattr(book, session.field, name)
+        book.save(update_fields=[session.field, 'updated_time'])
+        session.book = book
+        session.status = COMPLETE
+        session.save(update_fields=['book', 'status', 'updated_time'])
+    discard_part(session)
+    return book
+
+
+def discard_part(session):
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
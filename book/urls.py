@@ -6,8 +6,12 @@ from book.views import (CategoryListCreateAPIView, BookCommentListCreateAPIView,
                         BookCommentRetrieveUpdateDestroyView, CountryRetrieveUpdateDestroyView, 
                         BookViewsListAPIView, BookLikeListAPIView, BookLikeCreateDeleteAPIView,
                         PopularBookViewsListAPIView, PopularBookCommentListAPIView,
+                        PopularBookLikesListAPIView, PopularBookBlendedListAPIView,
                         BookFilterByCategoryView, BookAuthorFilterView, BookGlobalFilterView,
-                        GetAudioData, BookFilterBySubCategoryView, SubcategoryFilterByCategoryView)
+                        GetAudioData, BookFilterBySubCategoryView, SubcategoryFilterByCategoryView,
+                        AutocompleteView, GetBookFileData,
+                        UploadSessionCreateAPIView, UploadSessionChunkAPIView, UploadSessionCompleteAPIView,
+                        CatalogImportCreateAPIView, CatalogImportDetailAPIView, CatalogExportAPIView)
 
 
 urlpatterns = [
@@ -21,13 +25,23 @@ urlpatterns = [
     path('book/', BookListCreateAPIView.as_view(), name='book' ),
     path('book/<str:id>/', BookRetrieveUpdateDestroyView.as_view(), name='book-retrive' ),
     path('book/<str:id>/audio/', GetAudioData.as_view(), name='book-audio' ),
+    path('book/<str:id>/file/', GetBookFileData.as_view(), name='book-file' ),
+    path('upload/', UploadSessionCreateAPIView.as_view(), name='upload'),
+    path('upload/<str:id>/', UploadSessionChunkAPIView.as_view(), name='upload-chunk'),
+    path('upload/<str:id>/complete/', UploadSessionCompleteAPIView.as_view(), name='upload-complete'),
+    path('import/', CatalogImportCreateAPIView.as_view(), name='catalog-import'),
+    path('import/<str:id>/', CatalogImportDetailAPIView.as_view(), name='catalog-import-detail'),
+    path('export/', CatalogExportAPIView.as_view(), name='catalog-export'),
     path('book/<str:id>/views/', BookViewsListAPIView.as_view(), name='book-views'),
     path('book/<str:id>/comment/', BookCommentListCreateAPIView.as_view(), name='book-comment' ),
     path('liked/books', BookLikeListAPIView.as_view(), name='book-likes'),
     path('liked/book/<str:id>/', BookLikeCreateDeleteAPIView.as_view(), name='book-like-delete'),
     path('popularbooks/views/', PopularBookViewsListAPIView.as_view(), name='book-popular'),
     path('popularbooks/comment/', PopularBookCommentListAPIView.as_view(), name='book-comment-popular'),
+    path('popularbooks/likes/', PopularBookLikesListAPIView.as_view(), name='book-likes-popular'),
+    path('popularbooks/blended/', PopularBookBlendedListAPIView.as_view(), name='book-blended-popular'),
     path('globalsearch/', BookGlobalFilterView.as_view(), name='global-search'),
+    path('autocomplete/', AutocompleteView.as_view(), name='autocomplete'),
     path('comment/<str:id>/', BookCommentRetrieveUpdateDestroyView.as_view(), name='book-comment-retrive' ),
     path('authors/', AuthorListCreateAPIView.as_view(), name='authors' ),
     path('authors/<str:id>/', AuthorRetrieveUpdateDestroyView.as_view(), name='authors-retrive' ),
@@ -0,0 +1,148 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+
+class ViewBuffer:
+    """
+    Per-process buffer of ``BookViews`` events, written with one ``bulk_create`` per flush
+    and stored with the time each view happened.
+
+    A background thread flushes every ``BOOK_VIEWS_FLUSH_INTERVAL`` seconds or as soon as
+    ``BOOK_VIEWS_FLUSH_SIZE`` events are waiting; the rest is flushed at interpreter exit.
+    Events beyond ``BOOK_VIEWS_BUFFER_LIMIT`` are dropped and events older than
+    ``BOOK_VIEWS_LATE_AFTER`` seconds when written are counted as late.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.pending = {}
+        self.metrics = Counter()
+        self.thread = None
+        self.pid = None
+
+    def record(self, user_id, book_id):
+        with self.lock:
+            key = (user_id, book_id)
+            if key in self.pending:
+                self.metrics['coalesced'] += 1
+                return
+            if len(self.pending) >= settings.BOOK_VIEWS_BUFFER_LIMIT:
+                self.metrics['dropped'] += 1
+                return
+            self.pending[key] = (time.monotonic(), timezone.now())
+            self.metrics['recorded'] += 1
+            full = len(self.pending) >= settings.BOOK_VIEWS_FLUSH_SIZE
+        if not settings.BOOK_VIEWS_FLUSH_INTERVAL:
+            if full:
+                self.flush()
+            return
+        self.ensure_thread()
+        if full:
+            self.wake.set()
+
+    def ensure_thread(self):
+        # Forked workers inherit the buffer object but not its thread.
+        if self.thread is not None and self.pid == os.getpid() and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread is None or self.pid != os.getpid() or not self.thread.is_alive():
+                self.pid = os.getpid()
+                self.thread = threading.Thread(target=self.run, name='book-views-flusher', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            self.wake.wait(settings.BOOK_VIEWS_FLUSH_INTERVAL)
+            self.wake.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flushing book views failed")
+
+    def flush(self):
+        from book.models import Book, BookViews
+
+        with self.flush_lock:
+            with self.lock:
+                events, self.pending = self.pending, {}
+            if not events:
+                return 0
+            try:
+                with transaction.atomic():
+                    # Views a user already has are skipped by the unique constraint and must not be counted.
+                    existing = set(BookViews.objects.filter(
+                        user_id__in={user_id for user_id, _ in events}, book_id__in={book_id for _, book_id in events},
+                    ).values_list('user_id', 'book_id'))
+                    new = {key: viewed for key, (_, viewed) in events.items() if key not in existing}
+                    BookViews.objects.bulk_create(
+                        [BookViews(user_id=user_id, book_id=book_id, created_time=viewed)
+                         for (user_id, book_id), viewed in new.items()],
+                        ignore_conflicts=True,
+                    )
+                    # bulk_create sends no signals, so the counters get the new views here, one update per amount.
+                    amounts = defaultdict(list)
+                    for book_id, views in Counter(book_id for _, book_id in new).items():
+                        amounts[views].append(book_id)
+                    for views, book_ids in amounts.items():
+                        Book.objects.filter(pk__in=book_ids).update(views_count=F('views_count') + views,
+                                                                    updated_time=timezone.now())
+            except Exception:
+                with self.lock:
+                    self.metrics['failed_flushes'] += 1
+                self.requeue(events)
+                raise
+            now = time.monotonic()
+            late = sum(1 for queued, _ in events.values() if now - queued > settings.BOOK_VIEWS_LATE_AFTER)
+            with self.lock:
+                self.metrics['flushes'] += 1
+                self.metrics['written'] += len(events)
+                self.metrics['late'] += late
+            return len(events)
+
+    def requeue(self, events):
+        with self.lock:
+            for key, queued in events.items():
+                if key in self.pending:
+                    continue
+                if len(self.pending) >= settings.BOOK_VIEWS_BUFFER_LIMIT:
+                    self.metrics['dropped'] += 1
+                else:
+                    self.pending[key] = queued
+
+    def get_metrics(self):
+        with self.lock:
+            metrics = dict(self.metrics)
+            metrics['pending'] = len(self.pending)
+        return metrics
+
+
+buffer = ViewBuffer()
+
+
+def record_view(user_id, book_id):
+    buffer.record(user_id, book_id)
+
+
+def flush_views():
+    try:
+        return buffer.flush()
+    except Exception:
+        logger.exception("Flushing book views at exit failed")
+        return 0
+
+
+atexit.register(flush_views)
@@ -4,25 +4,45 @@ from book.serializers import (CategorySerializer, CategoryCreateSerializer, Book
                                 AuthorSerializer, AuthorCreateSerializer, BookCommentSerializer,
                                 BookCommentCreateSerializer, CountrySerializer, BookLikeSerializer,
                                 BookLikeCreateSerializer, GlobalSearchSerializer, BookViewsListSerializer,
-                                BookAudioSerializer)
-from book.models import Category, Book, BookComment, Author, SubCategory, Country, BookViews, LikeBook
-from rest_framework.permissions import AllowAny, IsAuthenticatedOrReadOnly, IsAuthenticated
+                                BookAudioSerializer, BookSearchSerializer, AutocompleteSerializer,
+                                UploadSessionSerializer, UploadCompleteSerializer, CatalogImportSerializer,
+                                CatalogImportCreateSerializer, CatalogExportSerializer)
+from book.models import (Category, Book, BookComment, Author, SubCategory, Country, BookViews, LikeBook,
+                         UploadSession, CatalogImport, FAILED, VIEWS, COMMENTS, LIKES, BLENDED)
+from rest_framework.permissions import AllowAny, IsAuthenticatedOrReadOnly, IsAuthenticated, IsAdminUser
+from rest_framework.parsers import MultiPartParser
 from rest_framework import status
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework.views import APIView
 from django.db.models import Q
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from config.custom_permission import UserCheckAdmin
-from config.custom_pagination import CustomPagination
-from django.http import FileResponse
+from config.custom_pagination import CustomPagination, ESTIMATE
+from book.search import search_books
+from book.autocomplete import get_index
+from book.leaderboards import get_leaderboard, LeaderboardResults
+from book.view_buffer import record_view
+from book.uploads import UploadError, assemble, parse_content_range, write_chunk
+from book.catalog_import import claim_stale, start_import, store_upload
+from book.catalog_export import CONTENT_TYPES, export_catalog, export_filename
+from config.ranged_response import ranged_file_response
+from config.streaming import is_asgi, streaming_content
+from config.response_cache import cache_response
+from users.models import User
 
 
 class GetAudioData(APIView):
     serializer_class= BookAudioSerializer
+    file_field = 'book_audio'
   
     def get(self, request, id):
         try:
-            book = Book.objects.get(id=id)
-            return FileResponse(book.book_audio.open(), as_attachment=True)
+            book = Book.objects.only(self.file_field).get(id=id)
+            fieldfile = getattr(book, self.file_field)
+            # Under ASGI a synchronous body would be read into memory before the first byte is sent.
+            return ranged_file_response(request, fieldfile, as_attachment=True, asynchronous=is_asgi(request))
         except:
             data = {
                     "data": [],
@@ -31,6 +51,10 @@ class GetAudioData(APIView):
                     "message":"Berilgan id bo'yicha ma'lumot topilmadi!"
                 }
             return Response(data=data)
+
+
+class GetBookFileData(GetAudioData):
+    file_field = 'book_file'
         
 
 class CategoryListCreateAPIView(APIView):
@@ -57,8 +81,9 @@ class CategoryListCreateAPIView(APIView):
             }
             return Response(data=data)
     
+    @cache_response(Category, SubCategory)
     def get(self, request):
-        categories = Category.objects.all().filter(category_status ='active').order_by('-created_time')
+        categories = CategorySerializer.setup_queryset(Category.objects.filter(category_status ='active').order_by('-created_time'))
         if categories:
             serializer = CategorySerializer(categories, many=True)
             data = {
@@ -206,8 +231,9 @@ class SubCategoryListCreateAPIView(APIView):
             }
             return Response(data=data)
     
+    @cache_response(SubCategory, Category)
     def get(self, request):
-        subcategories = SubCategory.objects.all().order_by('-created_time')
+        subcategories = SubCategorySerializer.setup_queryset(SubCategory.objects.order_by('-created_time'))
         if subcategories:
             serializer = SubCategorySerializer(subcategories, many=True)
             data = {
@@ -355,8 +381,9 @@ class CountryListCreateAPIView(APIView):
             }
             return Response(data=data)
     
+    @cache_response(Country, Author)
     def get(self, request):
-        countries = Country.objects.all().order_by('-created_time')
+        countries = CountrySerializer.setup_queryset(Country.objects.order_by('-created_time'))
         if countries:
             serializer = CountrySerializer(countries, many=True)
             data = {
@@ -504,9 +531,10 @@ class AuthorListCreateAPIView(APIView):
             }
             return Response(data=data)
     
+    @cache_response(Author, Country)
     def get(self, request):
-        authors = Author.objects.all().order_by('-created_time')
-        if authors:
+        authors = AuthorSerializer.setup_queryset(Author.objects.order_by('-created_time'))
+        if authors.exists():
             paginator = CustomPagination()
             page_obj = paginator.paginate_queryset(authors, request)
             serializer = AuthorSerializer(page_obj, many=True)
@@ -650,9 +678,10 @@ class BookListCreateAPIView(APIView):
             }
             return Response(data=data)
     
+    @cache_response(Book, Author, Country, SubCategory, Category, User)
     def get(self, request):
-        books = Book.objects.all().filter(book_status = 'published').order_by('-created_time')
-        if books:
+        books = BookSerializer.setup_queryset(Book.objects.filter(book_status = 'published').order_by('-created_time'))
+        if books.exists():
             paginator = CustomPagination()
             page_obj = paginator.paginate_queryset(books, request)
             serializer = BookSerializer(page_obj, many=True)
@@ -672,7 +701,7 @@ class BookRetrieveUpdateDestroyView(APIView):
 
     def get(self, request, id):
         try:
-            book = Book.objects.get(id=id)
+            book = BookSerializer.setup_queryset(Book.objects.all()).get(id=id)
         except:
             data = {
                     "data": [],
@@ -683,7 +712,7 @@ class BookRetrieveUpdateDestroyView(APIView):
             return Response(data=data)
         
         if request.user.is_authenticated:
-            BookViews.objects.create(user = self.request.user,book = book)
+            record_view(request.user.pk, book.pk)
         serializer = BookSerializer(book)
         data = {
                 "data": serializer.data,
@@ -793,7 +822,8 @@ class BookCommentListCreateAPIView(APIView):
             return Response(data=data)
         serializer = BookCommentCreateSerializer(data = request.data)
         if serializer.is_valid():
-            serializer.save(user = self.request.user, book = book)
+            with transaction.atomic():
+                serializer.save(user = self.request.user, book = book)
             data = {
                 "data": serializer.data,
                 "status": status.HTTP_201_CREATED,
@@ -811,9 +841,9 @@ class BookCommentListCreateAPIView(APIView):
             return Response(data=data)
 
     def get(self, request, id):
-        bookcomments = BookComment.objects.filter(book__id=id).order_by('-created_time')
-        if bookcomments:
-            paginator = CustomPagination()
+        bookcomments = BookCommentSerializer.setup_queryset(BookComment.objects.filter(book__id=id).order_by('-created_time'))
+        if bookcomments.exists():
+            paginator = CustomPagination(count_strategy=ESTIMATE)
             page_obj = paginator.paginate_queryset(bookcomments, request)
             serializer = BookCommentSerializer(page_obj, many=True)
             return paginator.get_paginated_response(serializer.data)
@@ -832,7 +862,7 @@ class BookCommentRetrieveUpdateDestroyView(APIView):
 
     def get(self, request, id):
         try:
-            bookcomment = BookComment.objects.get(id=id)
+            bookcomment = BookCommentSerializer.setup_queryset(BookComment.objects.all()).get(id=id)
         except:
             data = {
                     "data": [],
@@ -933,16 +963,20 @@ class BookCommentRetrieveUpdateDestroyView(APIView):
             return Response(data=data)
 
 
-class PopularBookViewsListAPIView(APIView):
+class LeaderboardListAPIView(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly, ]
-    
+    board_name = None
+
     def get(self, request):
-        books = Book.objects.all().filter(book_status = 'published').order_by('-views')
-        if books:
+        board = get_leaderboard(self.board_name)
+        if board.book_ids:
+            books = LeaderboardResults(board, BookSerializer.setup_queryset(Book.objects.filter(book_status = 'published')))
             paginator = CustomPagination()
             page_obj = paginator.paginate_queryset(books, request)
             serializer = BookSerializer(page_obj, many=True)
-            return paginator.get_paginated_response(serializer.data)
+            response = paginator.get_paginated_response(serializer.data)
+            response.data['refreshed_time'] = board.refreshed_time
+            return response
         else:
             data = {
                     "data": [],
@@ -953,32 +987,28 @@ class PopularBookViewsListAPIView(APIView):
             return Response(data=data)
 
 
-class PopularBookCommentListAPIView(APIView):
-    permission_classes = [IsAuthenticatedOrReadOnly, ]
-    
-    def get(self, request):
-        books = Book.objects.all().filter(book_status = 'published').order_by('-comments')
-        if books:
-            paginator = CustomPagination()
-            page_obj = paginator.paginate_queryset(books, request)
-            serializer = BookSerializer(page_obj, many=True)
-            return paginator.get_paginated_response(serializer.data)
-        else:
-            data = {
-                    "data": [],
-                    "status": status.HTTP_200_OK,
-                    "success":True,
-                    "message":"Ma'lumot mavjud emas!"
-                }
-            return Response(data=data)
+class PopularBookViewsListAPIView(LeaderboardListAPIView):
+    board_name = VIEWS
+
+
+class PopularBookCommentListAPIView(LeaderboardListAPIView):
+    board_name = COMMENTS
+
+
+class PopularBookLikesListAPIView(LeaderboardListAPIView):
+    board_name = LIKES
+
+
+class PopularBookBlendedListAPIView(LeaderboardListAPIView):
+    board_name = BLENDED
 
 
 class BookFilterByCategoryView(APIView):
     permission_classes = [AllowAny,]
 
     def get(self, request, id):
-        books = Book.objects.filter(category__id=id)
-        if books:
+        books = BookSerializer.setup_queryset(Book.objects.filter(category__id=id))
+        if books.exists():
             paginator = CustomPagination()
             page_obj = paginator.paginate_queryset(books, request)
             serializer = BookSerializer(page_obj, many=True)
@@ -997,8 +1027,8 @@ class BookFilterBySubCategoryView(APIView):
     permission_classes = [AllowAny,]
 
     def get(self, request, id):
-        books = Book.objects.filter(subcategory__id=id)
-        if books:
+        books = BookSerializer.setup_queryset(Book.objects.filter(subcategory__id=id))
+        if books.exists():
             paginator = CustomPagination()
             page_obj = paginator.paginate_queryset(books, request)
             serializer = BookSerializer(page_obj, many=True)
@@ -1016,8 +1046,9 @@ class BookFilterBySubCategoryView(APIView):
 class SubcategoryFilterByCategoryView(APIView):
     permission_classes = [AllowAny,]
 
+    @cache_response(SubCategory, Category)
     def get(self, request, id):
-        subcategory = SubCategory.objects.filter(category__id=id)
+        subcategory = SubCategorySerializer.setup_queryset(SubCategory.objects.filter(category__id=id))
         if subcategory:
             serializer = SubCategorySerializer(subcategory, many=True)
             data = {
@@ -1040,8 +1071,8 @@ class BookAuthorFilterView(APIView):
     permission_classes = [AllowAny, ]
 
     def get(self, request, id):
-        books = Book.objects.filter(author__id=id)
-        if books:
+        books = BookSerializer.setup_queryset(Book.objects.filter(author__id=id))
+        if books.exists():
             paginator = CustomPagination()
             page_obj = paginator.paginate_queryset(books, request)
             serializer = BookSerializer(page_obj, many=True)
@@ -1063,21 +1094,40 @@ class BookGlobalFilterView(APIView):
     def post(self, request):
         serializer = GlobalSearchSerializer(data = request.data)
         if serializer.is_valid():
-            q = request.data['query']
-            books = Book.objects.filter(Q(title__icontains=q) | Q(description__icontains=q) | Q(author__full_name__icontains=q))
-            paginator = CustomPagination()
+            q = serializer.validated_data['query']
+            books = search_books(q, BookSerializer.setup_queryset(Book.objects.all()))
+            if books is None:
+                books = BookSerializer.setup_queryset(Book.objects.filter(Q(title__icontains=q) | Q(description__icontains=q) | Q(author__full_name__icontains=q)).order_by('-created_time'))
+            paginator = CustomPagination(count_strategy=ESTIMATE)
             page_obj = paginator.paginate_queryset(books, request)
-            serializer = BookSerializer(page_obj, many=True)
+            serializer = BookSearchSerializer(page_obj, many=True)
             return paginator.get_paginated_response(serializer.data)
         return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class AutocompleteView(APIView):
+    permission_classes = [AllowAny, ]
+
+    @swagger_auto_schema(query_serializer=AutocompleteSerializer)
+    def get(self, request):
+        serializer = AutocompleteSerializer(data = request.query_params)
+        if serializer.is_valid():
+            suggestions = get_index().suggest(serializer.validated_data['q'], serializer.validated_data['limit'])
+            data = {
+                    "data": suggestions,
+                    "status": status.HTTP_200_OK,
+                    "success":True
+                }
+            return Response(data=data)
+        return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
 class BookViewsListAPIView(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly,]
     
     def get(self, request, id):
-        bookviews = BookViews.objects.filter(book__id=id).order_by('-created_time')
-        if bookviews:
+        bookviews = BookViewsListSerializer.setup_queryset(BookViews.objects.filter(book__id=id).order_by('-created_time'))
+        if bookviews.exists():
             paginator = CustomPagination()
             page_obj = paginator.paginate_queryset(bookviews, request)
             serializer = BookViewsListSerializer(page_obj, many=True)
@@ -1096,8 +1146,8 @@ class BookLikeListAPIView(APIView):
     permission_classes = [IsAuthenticated,]
 
     def get(self, request):
-        booklikes = LikeBook.objects.filter(user=request.user).order_by('-created_time')
-        if booklikes:
+        booklikes = BookLikeSerializer.setup_queryset(LikeBook.objects.filter(user=request.user).order_by('-created_time'))
+        if booklikes.exists():
             paginator = CustomPagination()
             page_obj = paginator.paginate_queryset(booklikes, request)
             serializer = BookLikeSerializer(page_obj, many=True)
@@ -1128,7 +1178,8 @@ class BookLikeCreateDeleteAPIView(APIView):
                 }
             return Response(data=data)
         if request.user.is_authenticated:
-            LikeBook.objects.create(user = self.request.user, book = book)
+            with transaction.atomic():
+                LikeBook.objects.create(user = self.request.user, book = book)
             data = {
                 "status": status.HTTP_201_CREATED,
                 "success":True,
@@ -1160,4 +1211,230 @@ class BookLikeCreateDeleteAPIView(APIView):
                 "success": True,
                 "status":status.HTTP_204_NO_CONTENT,
                 "message":"Ma'lumot muvaffaqiyatli o'chirildi!"
-            })
\ No newline at end of file
+            })
+
+class UploadSessionCreateAPIView(APIView):
+    permission_classes = [IsAuthenticated, ]
+
+    @swagger_auto_schema(request_body=UploadSessionSerializer)
+    def post(self, request):
+        serializer = UploadSessionSerializer(data=request.data)
+        if serializer.is_valid():
+            serializer.save(user=request.user)
+            data = {
+                "data": serializer.data,
+                "status": status.HTTP_201_CREATED,
+                "success":True,
+                "message":"Yuklash boshlandi!"
+            }
+            return Response(data=data)
+        else:
+            data = {
+                "data": serializer.errors,
+                "status": status.HTTP_400_BAD_REQUEST,
+                "success": False,
+                "message":"Ma'lumot yuborishda xatolik"
+            }
+            return Response(data=data)
+
+
+class UploadSessionChunkAPIView(APIView):
+    """
+    ``GET`` returns the acknowledged offset to resume from; ``PUT`` appends the raw request body
+    described by ``Content-Range: bytes start-end/size`` and an optional ``X-Chunk-Checksum`` (sha256 hex).
+    """
+    permission_classes = [IsAuthenticated, ]
+
+    def get(self, request, id):
+        try:
+            session = UploadSession.objects.get(id=id, user=request.user)
+        except:
+            return upload_not_found()
+        data = {
+                "data": UploadSessionSerializer(session).data,
+                "status": status.HTTP_200_OK,
+                "success":True
+            }
+        return Response(data=data)
+
+    def put(self, request, id):
+        content_range = parse_content_range(request.headers.get('Content-Range'))
+        if content_range is None:
+            data = {
+                    "data": [],
+                    "status": status.HTTP_400_BAD_REQUEST,
+                    "success":False,
+                    "message":"Content-Range noto'g'ri"
+                }
+            return Response(data=data)
+        with transaction.atomic():
+            try:
+                session = UploadSession.objects.select_for_update().get(id=id, user=request.user)
+            except:
+                return upload_not_found()
+            try:
+                write_chunk(session, request.stream, content_range, request.headers.get('X-Chunk-Checksum'))
+            except UploadError as error:
+                return upload_error(error)
+        data = {
+                "data": UploadSessionSerializer(session).data,
+                "status": status.HTTP_200_OK,
+                "success":True
+            }
+        return Response(data=data)
+
+
+class UploadSessionCompleteAPIView(APIView):
+    permission_classes = [IsAuthenticated, ]
+
+    @swagger_auto_schema(request_body=UploadCompleteSerializer)
+    def post(self, request, id):
+        serializer = UploadCompleteSerializer(data=request.data)
+        if not serializer.is_valid():
+            data = {
+                "data": serializer.errors,
+                "status": status.HTTP_400_BAD_REQUEST,
+                "success": False,
+                "message":"Ma'lumot yuborishda xatolik"
+            }
+            return Response(data=data)
+        try:
+            session = UploadSession.objects.get(id=id, user=request.user)
+            book = Book.objects.get(id=serializer.validated_data['book_id'])
+        except:
+            return upload_not_found()
+        if book.user_id != request.user.id and not request.user.is_staff:
+            data = {
+                    "data": [],
+                    "status": status.HTTP_403_FORBIDDEN,
+                    "success":False,
+                    "message":"Sizda bu kitobni o'zgartirish huquqi yo'q!"
+                }
+            return Response(data=data)
+        try:
+            assemble(session, book)
+        except UploadError as error:
+            return upload_error(error)
+        data = {
+                "data": BookSerializer(BookSerializer.setup_queryset(Book.objects.all()).get(id=book.id)).data,
+                "status": status.HTTP_200_OK,
+                "success":True,
+                "message":"Fayl kitobga biriktirildi!"
+            }
+        return Response(data=data)
+
+
+class CatalogImportCreateAPIView(APIView):
+    """
+    Staff upload of a CSV/JSONL catalog that is imported in the background; poll ``import/<id>/`` for progress.
+    Uploading a file whose import failed, or stalled with its worker, resumes it after the last committed chunk.
+    """
+    permission_classes = [IsAdminUser, ]
+    parser_classes = [MultiPartParser, ]
+
+    @swagger_auto_schema(request_body=CatalogImportCreateSerializer)
+    def post(self, request):
+        serializer = CatalogImportCreateSerializer(data=request.data)
+        if not serializer.is_valid():
+            data = {
+                "data": serializer.errors,
+                "status": status.HTTP_400_BAD_REQUEST,
+                "success": False,
+                "message":"Ma'lumot yuborishda xatolik"
+            }
+            return Response(data=data)
+        upload = serializer.validated_data['file']
+        path, digest = store_upload(upload)
+        job = CatalogImport.objects.filter(digest=digest).exclude(status=FAILED).first()
+        if job is not None and not claim_stale(job):
+            data = {
+                "data": CatalogImportSerializer(job).data,
+                "status": status.HTTP_200_OK,
+                "success":True,
+                "message":"Bu katalog allaqachon yuklangan!"
+            }
+            return Response(data=data)
+        if job is None:
+            job = CatalogImport.objects.filter(digest=digest, status=FAILED).first()
+        if job is not None:
+            job.path = path
+            job.save(update_fields=['path', 'updated_time'])
+        else:
+            job = CatalogImport.objects.create(user=request.user, source=upload.name, path=path, digest=digest,
+                                               format=serializer.validated_data['format'])
+        start_import(job)
+        job.refresh_from_db()
+        data = {
+            "data": CatalogImportSerializer(job).data,
+            "status": status.HTTP_201_CREATED,
+            "success":True,
+            "message":"Katalog importi boshlandi!"
+        }
+        return Response(data=data)
+
+
+class CatalogImportDetailAPIView(APIView):
+    permission_classes = [IsAdminUser, ]
+
+    def get(self, request, id):
+        try:
+            job = CatalogImport.objects.get(id=id)
+        except:
+            return upload_not_found()
+        data = {
+                "data": CatalogImportSerializer(job).data,
+                "status": status.HTTP_200_OK,
+                "success":True
+            }
+        return Response(data=data)
+
+
+class CatalogExportAPIView(APIView):
+    """
+    Staff export of the published catalog as JSONL or CSV (``?type=``), optionally gzipped (``?gzip=1``)
+    and limited to books updated since ``?updated_since=``, followed by tombstones for books removed since then.
+    The body is streamed while the database is read, and ``X-Export-Started`` is the ``updated_since``
+    to pass for the next incremental export.
+    """
+    permission_classes = [IsAdminUser, ]
+
+    @swagger_auto_schema(query_serializer=CatalogExportSerializer)
+    def get(self, request):
+        serializer = CatalogExportSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            data = {
+                "data": serializer.errors,
+                "status": status.HTTP_400_BAD_REQUEST,
+                "success": False,
+                "message":"Ma'lumot yuborishda xatolik"
+            }
+            return Response(data=data)
+        format, compress = serializer.validated_data['type'], serializer.validated_data['gzip']
+        started = timezone.now()
+        content = export_catalog(format, compress, serializer.validated_data.get('updated_since'),
+                                 base_url=request.build_absolute_uri('/'))
+        response = StreamingHttpResponse(streaming_content(request, content),
+                                         content_type='application/gzip' if compress else CONTENT_TYPES[format])
+        response.headers['Content-Disposition'] = f'attachment; filename="{export_filename(format, compress, started)}"'
+        response.headers['X-Export-Started'] = started.isoformat()
+        return response
+
+
+def upload_not_found():
+    data = {
+            "data": [],
+            "status": status.HTTP_404_NOT_FOUND,
+            "success":False,
+            "message":"Berilgan id bo'yicha ma'lumot topilmadi!"
+        }
+    return Response(data=data)
+
+
+def upload_error(error):
+    data = {
+            "data": UploadSessionSerializer(error.session).data if error.session else [],
+            "status": status.HTTP_409_CONFLICT,
+            "success":False,
+            "message":error.message
+        }
+    return Response(data=data)
@@ -1,19 +1,233 @@
+import base64
+import hashlib
+import json
+import uuid
+from functools import partial
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+PAGE, CURSOR = ('page', 'cursor')
+EXACT, ESTIMATE, NO_COUNT = ('exact', 'estimate', 'none')
+
+
+def count_cache_key(queryset):
+    sql, params = queryset.query.sql_with_params()
+    signature = hashlib.md5(repr((queryset.db, sql, params)).encode()).hexdigest()
+    return f"pagination-count:{signature}"
+
+
+def cached_count(queryset):
+    key = count_cache_key(queryset)
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+async def acached_count(queryset):
+    key = count_cache_key(queryset)
+    count = await cache.aget(key)
+    if count is None:
+        count = await queryset.acount()
+        await cache.aset(key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def estimated_count(queryset):
+    """Row estimate from the Postgres planner statistics, or None where it is not available."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def count_queryset(queryset, strategy):
+    if not isinstance(queryset, QuerySet):
+        return queryset.count(), True
+    if strategy == ESTIMATE:
+        estimate = estimated_count(queryset)
+        # Planner estimates are only worth their error margin on large results.
+        if estimate is not None and estimate >= settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD:
+            return estimate, False
+    return cached_count(queryset), True
+
+
+class CountStrategyPaginator(Paginator):
+
+    def __init__(self, object_list, per_page, count_strategy=EXACT, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_strategy = count_strategy
+        self.count_exact = True
+
+    @cached_property
+    def count(self):
+        count, self.count_exact = count_queryset(self.object_list, self.count_strategy)
+        return count
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
+    mode_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    count_strategy = EXACT
+    cursor_ordering = ('-created_time', '-id')
+    invalid_cursor_message = "Cursor noto'g'ri"
+
+    def __init__(self, count_strategy=None):
+        if count_strategy is not None:
+            self.count_strategy = count_strategy
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.mode = self.get_mode(queryset, request)
+        self.strategy = self.get_count_strategy(request)
+        if self.mode == CURSOR:
+            return self.paginate_queryset_by_cursor(queryset, request)
+        if self.strategy == NO_COUNT:
+            return self.paginate_queryset_without_count(queryset, request)
+        self.django_paginator_class = partial(CountStrategyPaginator, count_strategy=self.strategy)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_count_strategy(self, request):
+        strategy = request.query_params.get(self.count_query_param)
+        if strategy in (EXACT, ESTIMATE, NO_COUNT):
+            return strategy
+        return NO_COUNT if self.mode == CURSOR else self.count_strategy
+
+    def paginate_queryset_without_count(self, queryset, request):
+        self.page_size_value = self.get_page_size(request)
+        self.queryset = queryset
+        try:
+            self.page_number = max(int(request.query_params.get(self.page_query_param, 1)), 1)
+        except ValueError:
+            raise NotFound(self.invalid_page_message)
+        offset = (self.page_number - 1) * self.page_size_value
+        rows = list(queryset[offset:offset + self.page_size_value + 1])
+        self.has_next = len(rows) > self.page_size_value
+        self.has_previous = self.page_number > 1
+        self.page_rows = rows[:self.page_size_value]
+        return self.page_rows
+
+    def get_mode(self, queryset, request):
+        requested = request.query_params.get(self.mode_query_param)
+        if requested != CURSOR and self.cursor_query_param not in request.query_params:
+            return PAGE
+        # Keyset pagination only holds for querysets ordered by (created_time, id).
+        if not isinstance(queryset, QuerySet) or tuple(queryset.query.order_by) not in ((), self.cursor_ordering[:1], self.cursor_ordering):
+            return PAGE
+        return CURSOR
+
+    def paginate_queryset_by_cursor(self, queryset, request):
+        self.page_size_value = self.get_page_size(request)
+        self.queryset = queryset
+        position, reverse = self.decode_cursor(request)
+        if position is not None:
+            created_time, pk = position
+            if reverse:
+                queryset = queryset.filter(Q(created_time__gt=created_time) | Q(created_time=created_time, id__gt=pk))
+            else:
+                queryset = queryset.filter(Q(created_time__lt=created_time) | Q(created_time=created_time, id__lt=pk))
+        ordering = [field[1:] for field in self.cursor_ordering] if reverse else self.cursor_ordering
+        rows = list(queryset.order_by(*ordering)[:self.page_size_value + 1])
+        has_more = len(rows) > self.page_size_value
+        rows = rows[:self.page_size_value]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page_rows = rows
+        return rows
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            created_time = parse_datetime(data['t'])
+            if created_time is None:
+                raise ValueError(data['t'])
+            return (created_time, uuid.UUID(data['id'])), bool(data.get('r'))
+        except (TypeError, ValueError, KeyError, AttributeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def encode_cursor(row, reverse):
+        data = {'t': row.created_time.isoformat(), 'id': str(row.id)}
+        if reverse:
+            data['r'] = 1
+        return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode('ascii').rstrip('=')
+
+    def get_cursor_link(self, row, reverse):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        url = replace_query_param(url, self.mode_query_param, CURSOR)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(row, reverse))
+
+    def get_page_link(self, page_number):
+        url = self.request.build_absolute_uri()
+        if page_number == 1:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, page_number)
+
+    def get_next_link(self):
+        if self.mode == PAGE and self.strategy != NO_COUNT:
+            return super().get_next_link()
+        if not self.has_next or not self.page_rows:
+            return None
+        if self.mode == PAGE:
+            return self.get_page_link(self.page_number + 1)
+        return self.get_cursor_link(self.page_rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if self.mode == PAGE and self.strategy != NO_COUNT:
+            return super().get_previous_link()
+        if not self.has_previous:
+            return None
+        if self.mode == PAGE:
+            return self.get_page_link(self.page_number - 1)
+        if not self.page_rows:
+            return None
+        return self.get_cursor_link(self.page_rows[0], reverse=True)
 
+    def get_count(self):
+        if self.strategy == NO_COUNT:
+            return None, False
+        if self.mode == PAGE:
+            paginator = self.page.paginator
+            return paginator.count, paginator.count_exact
+        return count_queryset(self.queryset, self.strategy)
 
     def get_paginated_response(self, data):
-        return Response(
-            {
-                'next':self.get_next_link(),
-                'previous':self.get_previous_link(),
-                'count':self.page.paginator.count,
-                'results':data,
-            }
-        )
\ No newline at end of file
+        response = {
+            'next':self.get_next_link(),
+            'previous':self.get_previous_link(),
+        }
+        count, count_exact = self.get_count()
+        if count is not None:
+            response['count'] = count
+        response['count_exact'] = count_exact
+        response['results'] = data
+        return Response(response)
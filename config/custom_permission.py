@@ -21,7 +21,7 @@ class UserCheckAdmin(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
 
-        if obj.user == request.user:
+        if obj.user_id == request.user.pk:
             return True
         
         if request.method not in self.edit_methods:
@@ -0,0 +1,245 @@
+import heapq
+import itertools
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+EMAIL, SMS = ('email', 'sms')
+
+
+class Delivery:
+
+    def __init__(self, channel, to, body, subject='', content_type=None, attempts=0):
+        self.channel = channel
+        self.to = to
+        self.body = body
+        self.subject = subject
+        self.content_type = content_type
+        self.attempts = attempts
+
+
+class EmailBackend:
+    """Keeps one SMTP connection open per worker and reopens it after a failure."""
+
+    def __init__(self):
+        self.connection = None
+
+    def send(self, delivery):
+        if self.connection is None:
+            self.connection = get_connection(fail_silently=False)
+            self.connection.open()
+        message = EmailMessage(delivery.subject, delivery.body, settings.EMAIL_HOST_USER, [delivery.to],
+                               connection=self.connection)
+        if delivery.content_type == 'html':
+            message.content_subtype = 'html'
+        try:
+            message.send()
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            finally:
+                self.connection = None
+
+
+@lru_cache(maxsize=None)
+def get_sms_client():
+    from decouple import config
+    from twilio.rest import Client
+
+    return Client(config('accound_sid'), config('auth_token'))
+
+
+class SMSBackend:
+
+    def send(self, delivery):
+        get_sms_client().messages.create(body=delivery.body, from_=settings.SMS_FROM_NUMBER, to=delivery.to)
+
+    def close(self):
+        pass
+
+
+class LocmemBackend:
+    """Offline stand-in that records deliveries in ``outbox``, optionally after ``DELIVERY_LOCMEM_LATENCY`` seconds."""
+
+    outbox = []
+    lock = threading.Lock()
+
+    def send(self, delivery):
+        latency = getattr(settings, 'DELIVERY_LOCMEM_LATENCY', 0)
+        if latency:
+            threading.Event().wait(latency)
+        with self.lock:
+            self.outbox.append(delivery)
+
+    def close(self):
+        pass
+
+
+def get_backends():
+    return {channel: import_string(path)() for channel, path in settings.DELIVERY_BACKENDS.items()}
+
+
+def dead_letter(delivery, error):
+    from users.models import FailedDelivery
+
+    logger.error("Giving up on %s delivery to %s: %s", delivery.channel, delivery.to, error)
+    try:
+        FailedDelivery.objects.create(channel=delivery.channel, recipient=delivery.to, subject=delivery.subject,
+                                      body=delivery.body, content_type=delivery.content_type or '',
+                                      attempts=delivery.attempts, error=str(error)[:1000])
+    except Exception:
+        logger.exception("Storing failed %s delivery to %s failed", delivery.channel, delivery.to)
+
+
+class DeliveryQueue:
+    """
+    Bounded queue drained by ``DELIVERY_WORKERS`` threads, each holding its own backend instances.
+
+    Failed deliveries are retried with exponential backoff up to ``DELIVERY_MAX_ATTEMPTS`` and then
+    stored as ``FailedDelivery`` rows, as are deliveries refused because the queue is full. Retries wait
+    in one heap, bounded like the queue, that a single scheduler thread moves back onto the queue when
+    they are due, so an outage does not park a thread per message.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queue = None
+        self.threads = []
+        self.pid = None
+        self.metrics = Counter()
+        self.wakeup = threading.Condition(threading.Lock())
+        self.delayed = []
+        self.sequence = itertools.count()
+
+    def ensure_workers(self):
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid != os.getpid():
+                self.queue = queue.Queue(maxsize=settings.DELIVERY_QUEUE_SIZE)
+                with self.wakeup:
+                    self.delayed = []
+                self.threads = [
+                    threading.Thread(target=self.run, name=f'delivery-{index}', daemon=True)
+                    for index in range(settings.DELIVERY_WORKERS)
+                ]
+                if self.threads:
+                    self.threads.append(threading.Thread(target=self.schedule_due, name='delivery-retries', daemon=True))
+                for thread in self.threads:
+                    thread.start()
+                self.pid = os.getpid()
+
+    def put(self, delivery):
+        self.ensure_workers()
+        try:
+            self.queue.put_nowait(delivery)
+        except queue.Full:
+            self.count('rejected')
+            dead_letter(delivery, 'delivery queue is full')
+            return False
+        self.count('queued')
+        return True
+
+    def run(self):
+        backends = get_backends()
+        while True:
+            delivery = self.queue.get()
+            try:
+                close_old_connections()
+                self.process(delivery, backends)
+            finally:
+                self.queue.task_done()
+
+    def process(self, delivery, backends):
+        delivery.attempts += 1
+        try:
+            backends[delivery.channel].send(delivery)
+        except Exception as error:
+            if delivery.attempts >= settings.DELIVERY_MAX_ATTEMPTS:
+                self.count('failed')
+                dead_letter(delivery, error)
+                return
+            delay = settings.DELIVERY_RETRY_BACKOFF * 2 ** (delivery.attempts - 1)
+            self.retry_later(delivery, delay * random.uniform(0.5, 1.5))
+            return
+        self.count('sent')
+
+    def retry_later(self, delivery, delay):
+        with self.wakeup:
+            full = len(self.delayed) >= settings.DELIVERY_QUEUE_SIZE
+            if not full:
+                heapq.heappush(self.delayed, (time.monotonic() + delay, next(self.sequence), delivery))
+                self.wakeup.notify()
+        if full:
+            self.count('rejected')
+            dead_letter(delivery, 'delivery retry queue is full')
+            return
+        self.count('retried')
+
+    def release_due(self, now=None):
+        """Put the retries due by ``now`` back on the queue and return how many there were."""
+        now = time.monotonic() if now is None else now
+        due = []
+        with self.wakeup:
+            while self.delayed and self.delayed[0][0] <= now:
+                due.append(heapq.heappop(self.delayed)[2])
+        for delivery in due:
+            self.put(delivery)
+        return len(due)
+
+    def schedule_due(self):
+        while True:
+            with self.wakeup:
+                timeout = self.delayed[0][0] - time.monotonic() if self.delayed else None
+                if timeout is None or timeout > 0:
+                    self.wakeup.wait(timeout)
+            self.release_due()
+
+    def count(self, name):
+        with self.lock:
+            self.metrics[name] += 1
+
+    def join(self):
+        if self.queue is not None:
+            self.queue.join()
+
+    def get_metrics(self):
+        with self.lock:
+            metrics = dict(self.metrics)
+        metrics['pending'] = self.queue.qsize() if self.queue is not None else 0
+        with self.wakeup:
+            metrics['delayed'] = len(self.delayed)
+        return metrics
+
+
+delivery_queue = DeliveryQueue()
+
+
+def enqueue(delivery):
+    # Deliveries wait for the surrounding transaction, so a rolled back signup sends nothing.
+    transaction.on_commit(lambda: delivery_queue.put(delivery))
+
+
+def send_email_async(to, subject, body, content_type=None):
+    enqueue(Delivery(EMAIL, to, body, subject=subject, content_type=content_type))
+
+
+def send_sms_async(to, body):
+    enqueue(Delivery(SMS, to, body))
@@ -0,0 +1,134 @@
+import logging
+import os
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models.signals import post_delete, post_save, pre_save
+from PIL import Image, ImageOps, UnidentifiedImageError
+from rest_framework import serializers
+
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'webp': ('WEBP', {'method': 4}),
+    'jpeg': ('JPEG', {'optimize': True, 'progressive': True}),
+}
+
+
+def variant_name(name, width, extension):
+    root, _ = os.path.splitext(name)
+    return f"{root}_{width}w.{extension}"
+
+
+def render_variants(storage, name):
+    """
+    Write downscaled WebP and JPEG copies of ``name`` next to it and return their names.
+
+    Orientation is applied from EXIF before the metadata is dropped, and only widths below the
+    original are produced (or the original width when it is smaller than all of them).
+    """
+    with storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    widths = sorted({width for width in settings.IMAGE_VARIANT_WIDTHS if width < image.width} or {image.width})
+    variants = {'source': name}
+    for extension, (image_format, options) in FORMATS.items():
+        quality = settings.IMAGE_VARIANT_QUALITY[extension]
+        variants[extension] = {}
+        for width in widths:
+            resized = image.resize((width, max(round(image.height * width / image.width), 1)), Image.LANCZOS)
+            if image_format == 'JPEG' and resized.mode == 'RGBA':
+                resized = resized.convert('RGB')
+            buffer = BytesIO()
+            # No exif/icc arguments are passed, so the derivatives carry no metadata.
+            resized.save(buffer, image_format, quality=quality, **options)
+            saved = storage.save(variant_name(name, width, extension), ContentFile(buffer.getvalue()))
+            variants[extension][str(width)] = saved
+    return variants
+
+
+def variant_names(variants):
+    return {name for extension in FORMATS for name in (variants or {}).get(extension, {}).values()}
+
+
+def delete_variants(storage, variants, keep=()):
+    """Delete the files of ``variants`` except the names in ``keep``, e.g. those rebuilt from identical bytes."""
+    for name in variant_names(variants) - set(keep):
+        try:
+            storage.delete(name)
+        except OSError:
+            logger.warning("Could not delete image variant %s", name)
+
+
+def release_variants(model, field_name, variants, exclude_pk, keep=()):
+    """Delete ``variants`` (but not the names in ``keep``) unless another row still points at their source file."""
+    source = (variants or {}).get('source')
+    if not source:
+        return
+    if model._default_manager.filter(**{field_name: source}).exclude(pk=exclude_pk).exists():
+        return
+    delete_variants(model._meta.get_field(field_name).storage, variants, keep)
+
+
+def build_variants(fieldfile):
+    """Variants for ``fieldfile``; only the source is recorded when it cannot be decoded (e.g. HEIC)."""
+    try:
+        return render_variants(fieldfile.storage, fieldfile.name)
+    except (OSError, UnidentifiedImageError, ValueError) as error:
+        logger.warning("Could not build variants of %s: %s", fieldfile.name, error)
+        return {'source': fieldfile.name}
+
+
+def track_image_variants(model, field_name='image', variants_field='image_variants'):
+    """
+    Build ``variants_field`` when a new file is uploaded to ``field_name`` and drop it when the field moves
+    to another existing file; shared files such as a default avatar never get per-row derivatives.
+    """
+    def mark_upload(sender, instance, raw=False, **kwargs):
+        fieldfile = getattr(instance, field_name)
+        instance._image_uploaded = not raw and bool(fieldfile) and not fieldfile._committed
+
+    def refresh(sender, instance, raw=False, **kwargs):
+        fieldfile = getattr(instance, field_name)
+        previous = getattr(instance, variants_field) or {}
+        if getattr(instance, '_image_uploaded', False):
+            variants = build_variants(fieldfile)
+        elif previous.get('source', fieldfile.name) != fieldfile.name:
+            variants = {}
+        else:
+            return
+        # Variant names are content addressed: re-uploading the same image rebuilds the same files.
+        release_variants(sender, field_name, previous, instance.pk, keep=variant_names(variants))
+        setattr(instance, variants_field, variants)
+        sender._default_manager.filter(pk=instance.pk).update(**{variants_field: variants})
+
+    def remove(sender, instance, **kwargs):
+        release_variants(sender, field_name, getattr(instance, variants_field), instance.pk)
+
+    uid = f"image-variants:{model._meta.label_lower}"
+    pre_save.connect(mark_upload, sender=model, weak=False, dispatch_uid=f"{uid}:upload")
+    post_save.connect(refresh, sender=model, weak=False, dispatch_uid=f"{uid}:save")
+    post_delete.connect(remove, sender=model, weak=False, dispatch_uid=f"{uid}:delete")
+
+
+class SrcsetField(serializers.ReadOnlyField):
+    """Maps each derivative format to a ``srcset`` string, e.g. ``{"webp": "/media/a_200w.webp 200w, ..."}``."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', 'image_variants')
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        self.storage = instance._meta.get_field('image').storage
+        return super().get_attribute(instance)
+
+    def to_representation(self, value):
+        return {
+            extension: ', '.join(f"{self.storage.url(name)} {width}w"
+                                 for width, name in sorted(value[extension].items(), key=lambda item: int(item[0])))
+            for extension in FORMATS if value and value.get(extension)
+        }
@@ -0,0 +1,238 @@
+import contextvars
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+
+current_request = contextvars.ContextVar('metrics_request', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'query_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+
+
+def record_query(execute, sql, params, many, context):
+    stats = current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_seconds += time.perf_counter() - started
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    # Installed on every connection, so queries run from sync_to_async threads are counted too;
+    # the context variable ties them to the request that issued them.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_wrapper, dispatch_uid='metrics-query-wrapper')
+
+
+class Registry:
+    """Per-process request metrics, periodically written to ``METRICS_DIR/metrics-<pid>.json``."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+        self.sources = {}
+        self.flushed_at = time.monotonic()
+
+    def observe(self, route, method, status, seconds, size, stats):
+        buckets = settings.METRICS_LATENCY_BUCKETS
+        with self.lock:
+            series = self.series.get((route, method))
+            if series is None:
+                series = self.series[(route, method)] = {
+                    'statuses': {}, 'buckets': [0] * (len(buckets) + 1), 'seconds': 0.0,
+                    'bytes': 0, 'queries': 0, 'query_seconds': 0.0,
+                }
+            series['statuses'][status] = series['statuses'].get(status, 0) + 1
+            series['buckets'][bisect_left(buckets, seconds)] += 1
+            series['seconds'] += seconds
+            series['bytes'] += size
+            series['queries'] += stats.queries
+            series['query_seconds'] += stats.query_seconds
+        if time.monotonic() - self.flushed_at >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def register_source(self, name, callback):
+        """Export the numbers returned by ``callback()`` as ``<name>{key="..."}``, summed over workers."""
+        self.sources[name] = callback
+
+    def snapshot(self):
+        with self.lock:
+            series = [
+                {'route': route, 'method': method, **{key: dict(value) if key == 'statuses' else
+                                                      (list(value) if key == 'buckets' else value)
+                                                      for key, value in data.items()}}
+                for (route, method), data in self.series.items()
+            ]
+        sources = {name: callback() for name, callback in self.sources.items()}
+        return {'buckets': settings.METRICS_LATENCY_BUCKETS, 'series': series, 'sources': sources}
+
+    def flush(self):
+        self.flushed_at = time.monotonic()
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=settings.METRICS_DIR, suffix='.tmp', delete=False) as handle:
+            json.dump(self.snapshot(), handle)
+        os.replace(handle.name, os.path.join(settings.METRICS_DIR, f"metrics-{os.getpid()}.json"))
+
+
+registry = Registry()
+
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def load_snapshots():
+    """
+    Snapshots of every live worker; this process contributes its live numbers instead of its last file.
+
+    Files left by workers that have exited are removed, which Prometheus sees as a counter reset.
+    """
+    snapshots = [registry.snapshot()]
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, 'metrics-*.json')):
+        pid = int(os.path.basename(path)[len('metrics-'):-len('.json')])
+        if pid == os.getpid():
+            continue
+        if not is_running(pid):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(path) as handle:
+                snapshots.append(json.load(handle))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def merge(snapshots):
+    merged, sources = {}, {}
+    for snapshot in snapshots:
+        for series in snapshot['series']:
+            key = (series['route'], series['method'])
+            target = merged.setdefault(key, {'statuses': {}, 'buckets': [0] * len(series['buckets']), 'seconds': 0.0,
+                                             'bytes': 0, 'queries': 0, 'query_seconds': 0.0})
+            for status, count in series['statuses'].items():
+                target['statuses'][str(status)] = target['statuses'].get(str(status), 0) + count
+            target['buckets'] = [a + b for a, b in zip(target['buckets'], series['buckets'])]
+            for field in ('seconds', 'bytes', 'queries', 'query_seconds'):
+                target[field] += series[field]
+        for name, values in snapshot.get('sources', {}).items():
+            for key, value in values.items():
+                sources.setdefault(name, {})
+                sources[name][key] = sources[name].get(key, 0) + value
+    return merged, sources
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(snapshots):
+    merged, sources = merge(snapshots)
+    buckets = settings.METRICS_LATENCY_BUCKETS
+    lines = [
+        '# HELP http_requests_total Requests by route, method and status.',
+        '# TYPE http_requests_total counter',
+    ]
+    for (route, method), series in sorted(merged.items()):
+        for status, count in sorted(series['statuses'].items()):
+            lines.append(f'http_requests_total{{route="{escape(route)}",method="{method}",status="{status}"}} {count}')
+    lines += [
+        '# HELP http_request_duration_seconds Request latency.',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for (route, method), series in sorted(merged.items()):
+        labels = f'route="{escape(route)}",method="{method}"'
+        total = 0
+        for bound, count in zip(buckets + ['+Inf'], series['buckets']):
+            total += count
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {total}')
+        lines.append(f'http_request_duration_seconds_sum{{{labels}}} {series["seconds"]}')
+        lines.append(f'http_request_duration_seconds_count{{{labels}}} {total}')
+    for name, field, kind, help_text in (
+        ('http_response_size_bytes_total', 'bytes', 'counter', 'Response body bytes.'),
+        ('db_queries_total', 'queries', 'counter', 'SQL queries run while serving the route.'),
+        ('db_query_duration_seconds_total', 'query_seconds', 'counter', 'Time spent in SQL queries.'),
+    ):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        for (route, method), series in sorted(merged.items()):
+            lines.append(f'{name}{{route="{escape(route)}",method="{method}"}} {series[field]}')
+    for source, values in sorted(sources.items()):
+        lines.append(f'# TYPE {source} untyped')
+        for key, value in sorted(values.items()):
+            lines.append(f'{source}{{key="{escape(key)}"}} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Records latency, status, response size and SQL count/time per resolved URL route."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.observe(request, response, time.perf_counter() - started, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.observe(request, response, time.perf_counter() - started, stats)
+        return response
+
+    @staticmethod
+    def observe(request, response, seconds, stats):
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match is not None else 'unmatched'
+        if response.streaming:
+            size = int(response.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+        registry.observe(route, request.method, response.status_code, seconds, size, stats)
@@ -1,5 +1,7 @@
 import uuid
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
 
 
@@ -11,3 +13,16 @@ class BaseModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+def count_subquery(related_model, field_name):
+    """Correlated ``COUNT(*)`` of ``related_model`` rows pointing at the outer row through ``field_name``."""
+    counts = (
+        related_model._default_manager
+        .filter(**{field_name: OuterRef('pk')})
+        .order_by()
+        .values(field_name)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=models.IntegerField()), 0)
@@ -0,0 +1,46 @@
+from functools import lru_cache
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+@lru_cache(maxsize=None)
+def get_related_fields(serializer_class):
+    nested, related = [], []
+    for field in serializer_class().fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        child = field.child if isinstance(field, serializers.ListSerializer) else field
+        if isinstance(child, serializers.ModelSerializer):
+            nested.append((field.source, type(child)))
+        elif isinstance(field, serializers.ManyRelatedField):
+            related.append(field.source)
+    return tuple(nested), tuple(related)
+
+
+class PrefetchPlanMixin:
+    """
+    Publishes the queryset a serializer needs to render without per-row queries.
+
+    Every nested ``ModelSerializer`` field becomes a ``Prefetch`` whose queryset is set up
+    by the nested serializer itself, so annotations and deeper relations are loaded with
+    one query per relation whatever the number of rows.
+    """
+
+    @staticmethod
+    def annotate_queryset(queryset):
+        return queryset
+
+    @classmethod
+    def get_prefetch_plan(cls):
+        nested, related = get_related_fields(cls)
+        plan = list(related)
+        for source, serializer_class in nested:
+            queryset = serializer_class.Meta.model._default_manager.all()
+            if issubclass(serializer_class, PrefetchPlanMixin):
+                queryset = serializer_class.setup_queryset(queryset)
+            plan.append(Prefetch(source, queryset=queryset))
+        return plan
+
+    @classmethod
+    def setup_queryset(cls, queryset):
+        return cls.annotate_queryset(queryset).prefetch_related(*cls.get_prefetch_plan())
@@ -0,0 +1,177 @@
+import mimetypes
+import os
+import uuid
+import zlib
+from asgiref.sync import sync_to_async
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+
+
+CHUNK_SIZE = 64 * 1024
+MAX_RANGES = 16
+
+
+def parse_range_header(header, size):
+    """
+    Parse ``bytes=...`` into sorted, merged ``(start, end)`` pairs (inclusive).
+
+    Returns None for a header that must be ignored and [] when no range is satisfiable.
+    """
+    unit, _, specs = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not specs:
+        return None
+    ranges = []
+    for spec in specs.split(','):
+        start, sep, end = spec.strip().partition('-')
+        if not sep:
+            return None
+        try:
+            if not start:
+                length = int(end)
+                if length <= 0:
+                    continue
+                ranges.append((max(size - length, 0), size - 1))
+                continue
+            start = int(start)
+            end = int(end) if end else None
+        except ValueError:
+            return None
+        if end is None:
+            end = size - 1
+        elif start > end:
+            return None
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+    ranges.sort()
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
+
+
+def read_range(fileobj, start, end):
+    fileobj.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        chunk = fileobj.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+
+
+def stream_ranges(fileobj, ranges, parts=None):
+    try:
+        for index, (start, end) in enumerate(ranges):
+            if parts is not None:
+                yield parts[index]
+            yield from read_range(fileobj, start, end)
+        if parts is not None:
+            yield parts[-1]
+    finally:
+        fileobj.close()
+
+
+async def astream_ranges(fileobj, ranges, parts=None):
+    """Async twin of ``stream_ranges``: each read runs in a worker thread, not one thread per connection."""
+    read = sync_to_async(fileobj.read, thread_sensitive=False)
+    try:
+        for index, (start, end) in enumerate(ranges):
+            if parts is not None:
+                yield parts[index]
+            await sync_to_async(fileobj.seek, thread_sensitive=False)(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        if parts is not None:
+            yield parts[-1]
+    finally:
+        await sync_to_async(fileobj.close, thread_sensitive=False)()
+
+
+def get_validators(fieldfile):
+    size = fieldfile.size
+    try:
+        modified = fieldfile.storage.get_modified_time(fieldfile.name).timestamp()
+    except (NotImplementedError, OSError):
+        modified = None
+    etag = quote_etag(f"{size:x}-{int(modified or 0):x}-{zlib.crc32(fieldfile.name.encode()):x}")
+    return size, etag, modified
+
+
+def if_range_matches(request, etag, modified):
+    value = request.headers.get('If-Range')
+    if value is None:
+        return True
+    if value.startswith(('"', 'W/')):
+        return value == etag
+    since = parse_http_date_safe(value)
+    return since is not None and modified is not None and int(modified) <= since
+
+
+def ranged_file_response(request, fieldfile, as_attachment=True, asynchronous=False):
+    """
+    Serve ``fieldfile`` honouring Range (single and multipart/byteranges), If-Range,
+    If-None-Match and If-Modified-Since, with ETag and Last-Modified validators.
+
+    With ``asynchronous`` the body is an async iterator, which ASGI servers stream without
+    buffering or holding a thread for the whole download.
+    """
+    stream = astream_ranges if asynchronous else stream_ranges
+    size, etag, modified = get_validators(fieldfile)
+    response = get_conditional_response(request, etag=etag, last_modified=int(modified) if modified else None)
+    if response is not None:
+        response.headers['ETag'] = etag
+        return response
+
+    filename = os.path.basename(fieldfile.name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    header = request.headers.get('Range')
+    ranges = None
+    if header and request.method in ('GET', 'HEAD') and if_range_matches(request, etag, modified):
+        ranges = parse_range_header(header, size)
+
+    if ranges is None and asynchronous:
+        response = StreamingHttpResponse(stream(fieldfile.open('rb'), [(0, size - 1)] if size else []),
+                                         content_type=content_type)
+        response.headers['Content-Length'] = str(size)
+        response.headers['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    elif ranges is None:
+        response = FileResponse(fieldfile.open('rb'), as_attachment=as_attachment, filename=filename)
+    elif not ranges:
+        response = HttpResponse(status=416)
+        response.headers['Content-Range'] = f"bytes */{size}"
+    elif len(ranges) == 1:
+        start, end = ranges[0]
+        response = StreamingHttpResponse(stream(fieldfile.open('rb'), ranges), status=206, content_type=content_type)
+        response.headers['Content-Range'] = f"bytes {start}-{end}/{size}"
+        response.headers['Content-Length'] = str(end - start + 1)
+    else:
+        boundary = uuid.uuid4().hex
+        parts = [
+            (f"\r\n--{boundary}\r\nContent-Type: {content_type}\r\nContent-Range: bytes {start}-{end}/{size}\r\n\r\n").encode()
+            for start, end in ranges
+        ]
+        parts.append(f"\r\n--{boundary}--\r\n".encode())
+        length = sum(len(part) for part in parts) + sum(end - start + 1 for start, end in ranges)
+        response = StreamingHttpResponse(stream(fieldfile.open('rb'), ranges, parts), status=206,
+                                         content_type=f"multipart/byteranges; boundary={boundary}")
+        response.headers['Content-Length'] = str(length)
+
+    if response.status_code == 206 and as_attachment:
+        response.headers['Content-Disposition'] = content_disposition_header(True, filename)
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['ETag'] = etag
+    if modified is not None:
+        response.headers['Last-Modified'] = http_date(modified)
+    return response
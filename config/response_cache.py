@@ -0,0 +1,145 @@
+import hashlib
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from rest_framework.response import Response
+
+
+HIT, MISS = ('hit', 'miss')
+GENERATION_PREFIX = 'response-generation'
+STATS_PREFIX = 'response-stats'
+
+
+def get_response_cache():
+    """
+    The ``RESPONSE_CACHE_ALIAS`` cache, or None when caching is off. Generations kept in a per-process
+    cache would leave other workers serving responses from before a write, so the alias must be shared.
+    """
+    alias = settings.RESPONSE_CACHE_ALIAS
+    return caches[alias] if alias else None
+
+
+def model_label(model):
+    return model._meta.label_lower
+
+
+def get_generations(models):
+    """Current generation of each model; a write bumps it so older cache keys are never read again."""
+    response_cache = get_response_cache()
+    keys = [f"{GENERATION_PREFIX}:{model_label(model)}" for model in models]
+    generations = response_cache.get_many(keys)
+    return [generations.get(key, 0) for key in keys]
+
+
+def bump_generation(model):
+    response_cache = get_response_cache()
+    if response_cache is None:
+        return
+    key = f"{GENERATION_PREFIX}:{model_label(model)}"
+    if not response_cache.add(key, 1, None):
+        try:
+            response_cache.incr(key)
+        except ValueError:
+            response_cache.set(key, 1, None)
+
+
+def get_auth_state(request):
+    user = request.user
+    if not user or not user.is_authenticated:
+        return 'anon'
+    return 'staff' if user.is_staff else 'user'
+
+
+def get_cache_key(request, name, models):
+    query = sorted(request.query_params.lists())
+    # Paginated payloads carry absolute next/previous links.
+    parts = (request.scheme, request.get_host(), request.path, query, get_auth_state(request), get_generations(models))
+    signature = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f"response:{name}:{signature}"
+
+
+def record(name, outcome):
+    response_cache = get_response_cache()
+    if response_cache is None:
+        return
+    key = f"{STATS_PREFIX}:{name}:{outcome}"
+    if not response_cache.add(key, 1, None):
+        try:
+            response_cache.incr(key)
+        except ValueError:
+            pass
+
+
+def get_stats(names):
+    response_cache = get_response_cache()
+    stats = {name: {HIT: 0, MISS: 0} for name in names}
+    if response_cache is None:
+        return stats
+    keys = {(name, outcome): f"{STATS_PREFIX}:{name}:{outcome}" for name in names for outcome in (HIT, MISS)}
+    values = response_cache.get_many(keys.values())
+    for (name, outcome), key in keys.items():
+        stats[name][outcome] = values.get(key, 0)
+    return stats
+
+
+def cache_response(*models, timeout=None):
+    """
+    Cache the data of a read-only APIView handler, keyed by host, path, query string and auth state.
+
+    Entries are invalidated by bumping the generation of any of ``models`` (see ``invalidate_on_change``);
+    ``timeout`` bounds how stale writes that bypass signals, like queryset updates, can get.
+    """
+    def decorator(method):
+        name = method.__qualname__.lower()
+
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            response_cache = get_response_cache()
+            if response_cache is None:
+                return method(self, request, *args, **kwargs)
+            key = get_cache_key(request, name, models)
+            cached = response_cache.get(key)
+            if cached is not None:
+                record(name, HIT)
+                data, status_code = cached
+                response = Response(data=data, status=status_code)
+                response['X-Cache'] = 'HIT'
+                return response
+            record(name, MISS)
+            response = method(self, request, *args, **kwargs)
+            if isinstance(response, Response) and response.status_code == 200:
+                response_cache.set(key, (response.data, response.status_code),
+                                   settings.RESPONSE_CACHE_TIMEOUT if timeout is None else timeout)
+                response['X-Cache'] = 'MISS'
+            return response
+        wrapper.response_cache_name = name
+        return wrapper
+    return decorator
+
+
+def invalidate_on_change(*models, ignore_fields=()):
+    """
+    Bump the response cache generation of each model on save, delete and many-to-many changes.
+
+    Saves limited by ``update_fields`` to ``ignore_fields`` are left to the cache timeout.
+    """
+    def invalidate(sender, update_fields=None, **kwargs):
+        if update_fields and set(update_fields) <= set(ignore_fields):
+            return
+        bump_generation(sender)
+
+    for model in models:
+        uid = f"response-cache:{model_label(model)}"
+        post_save.connect(invalidate, sender=model, weak=False, dispatch_uid=f"{uid}:save")
+        post_delete.connect(invalidate, sender=model, weak=False, dispatch_uid=f"{uid}:delete")
+        for field in model._meta.many_to_many:
+            m2m_changed.connect(invalidate_relation(model), sender=field.remote_field.through, weak=False,
+                                dispatch_uid=f"{uid}:{field.name}")
+
+
+def invalidate_relation(model):
+    def invalidate(sender, action, **kwargs):
+        if action.startswith('post_'):
+            bump_generation(model)
+    return invalidate
@@ -49,10 +49,12 @@ INSTALLED_APPS = [
     #local
     'users',
     'book',
+    'benchmarks',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'config.metrics.MetricsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -96,9 +98,9 @@ WSGI_APPLICATION = 'config.wsgi.application'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'users.authentication.ClaimsJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.TokenAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
     
     'DEFAULT_PERMISSION_CLASSES': [
@@ -106,6 +108,76 @@ REST_FRAMEWORK = {
     ]
 }
 
+AUTHENTICATION_BACKENDS = ['users.backends.IdentifierBackend']
+
+PAGINATION_COUNT_CACHE_TIMEOUT = 60
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = 10000
+
+# Cache alias, shared by every worker (e.g. Redis), through which JWT requests are authorized from token
+# claims and user changes revoke them. A per-process cache such as LocMemCache would hide a deactivation or
+# a lost role from the other workers, so without one every request loads the user from the database.
+USER_CLAIMS_CACHE = None
+
+# Seconds a JWT request user, once a view loads it, stays cached; saving or deleting the user drops it.
+USER_SNAPSHOT_TTL = 300
+
+# Refresh-token blacklist checks go through a per-process Bloom filter, synced with the table every
+# TOKEN_BLACKLIST_SYNC_INTERVAL seconds; purge_tokens keeps the table to unexpired tokens.
+TOKEN_BLACKLIST_BLOOM_CAPACITY = 1000000
+TOKEN_BLACKLIST_BLOOM_ERROR_RATE = 0.001
+TOKEN_BLACKLIST_SYNC_INTERVAL = 5
+# Ids skipped by a sync are re-checked for this many seconds, as their logouts may still be committing.
+TOKEN_BLACKLIST_SYNC_OVERLAP = 60
+# Shared cache alias (e.g. Redis) remembering blacklisted ids exactly; without one a filter hit goes to the table.
+TOKEN_BLACKLIST_CACHE = None
+
+# Region assumed for phone numbers given without a country code.
+PHONE_DEFAULT_REGION = 'UZ'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Swap for RedisCache (or another cache every worker shares) before enabling RESPONSE_CACHE_ALIAS.
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+# Shared cache alias holding cached responses and the generations that invalidate them. Generations in a
+# per-process cache such as LocMemCache miss other workers' writes, so responses are not cached without one.
+RESPONSE_CACHE_ALIAS = None
+RESPONSE_CACHE_TIMEOUT = 60
+
+METRICS_DIR = BASE_DIR / 'tmp' / 'metrics'
+METRICS_FLUSH_INTERVAL = 5
+METRICS_LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+BOOK_SEARCH_SQLITE_TOKENIZER = 'porter unicode61 remove_diacritics 2'
+BOOK_SEARCH_POSTGRES_CONFIG = 'english'
+
+AUTOCOMPLETE_MAX_TYPOS = 2
+AUTOCOMPLETE_CANDIDATE_LIMIT = 500
+AUTOCOMPLETE_SYNC_INTERVAL = 2
+AUTOCOMPLETE_SYNC_OVERLAP = 60
+AUTOCOMPLETE_SYNC_IN_BACKGROUND = True
+CATALOG_CHANGE_RETENTION_DAYS = 30
+
+BOOK_VIEWS_FLUSH_SIZE = 500
+BOOK_VIEWS_FLUSH_INTERVAL = 5
+BOOK_VIEWS_BUFFER_LIMIT = 10000
+BOOK_VIEWS_LATE_AFTER = 30
+
+LEADERBOARD_SIZE = 1000
+LEADERBOARDS = {
+    'views': {'half_life_days': 7, 'window_days': 90},
+    'comments': {'half_life_days': 14, 'window_days': 180},
+    'likes': {'half_life_days': 14, 'window_days': 180},
+    'blended': {'weights': {'views': 1, 'comments': 3, 'likes': 2}},
+}
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(hours=12),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=15),
@@ -221,6 +293,24 @@ STATIC_ROOT =os.path.join(BASE_DIR, 'staticfiles')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+DEFAULT_FILE_STORAGE = 'config.storage.ContentAddressedStorage'
+MEDIA_BLOB_GRACE_HOURS = 24
+
+UPLOAD_SESSION_DIR = os.path.join(BASE_DIR, 'tmp', 'uploads')
+UPLOAD_CHUNK_MAX_SIZE = 8 * 1024 * 1024
+UPLOAD_SESSION_TTL_HOURS = 24
+
+CATALOG_IMPORT_DIR = os.path.join(BASE_DIR, 'tmp', 'imports')
+# Tests get their own temporary METRICS_DIR, UPLOAD_SESSION_DIR and CATALOG_IMPORT_DIR.
+TEST_RUNNER = 'config.test_runner.TestRunner'
+CATALOG_IMPORT_CHUNK_SIZE = 2000
+CATALOG_IMPORT_BACKGROUND = True
+# A running import commits a checkpoint per chunk; one silent for this many seconds lost its worker.
+CATALOG_IMPORT_STALE_AFTER = 300
+CATALOG_EXPORT_CHUNK_SIZE = 2000
+
+IMAGE_VARIANT_WIDTHS = [200, 400, 800]
+IMAGE_VARIANT_QUALITY = {'webp': 80, 'jpeg': 82}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -236,5 +326,28 @@ EMAIL_HOST_PASSWORD = 'cbmqqipvusopaijx'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 
+DELIVERY_BACKENDS = {
+    'email': 'config.delivery.EmailBackend',
+    'sms': 'config.delivery.SMSBackend',
+}
+DELIVERY_WORKERS = 4
+DELIVERY_QUEUE_SIZE = 1000
+DELIVERY_MAX_ATTEMPTS = 5
+DELIVERY_RETRY_BACKOFF = 2
+SMS_FROM_NUMBER = "+998935351108"
+
 SITE_ID = 1
 AUTH_USER_MODEL = 'users.User'
+
+# The first hasher is used for new passwords; logins upgrade hashes made by the others or with another cost.
+PASSWORD_HASHERS = [
+    'users.hashing.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = 600000
+PASSWORD_HASHING_WORKERS = os.cpu_count() or 1
+PASSWORD_HASHING_MAX_CONCURRENT = 4 * PASSWORD_HASHING_WORKERS
+PASSWORD_HASHING_WAIT = 2
@@ -0,0 +1,105 @@
+import hashlib
+import os
+import tempfile
+from collections import Counter
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save
+
+
+BLOB_PREFIX = 'blobs'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that names every file after the sha256 of its content.
+
+    Content is hashed while it streams into a temporary file, which is then renamed to
+    ``blobs/<aa>/<digest><ext>``; saving bytes that are already stored just returns the existing
+    name. Each blob is recorded as a ``MediaBlob`` whose ``refcount`` counts the model fields
+    pointing at it, and ``delete`` keeps blobs that are still referenced.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The final name only depends on the content, so the requested name is never made unique.
+        return name
+
+    def _save(self, name, content):
+        from book.models import MediaBlob
+
+        incoming = os.path.join(self.location, BLOB_PREFIX, '.incoming')
+        os.makedirs(incoming, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(dir=incoming, delete=False) as temporary:
+            try:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    temporary.write(chunk)
+                    size += len(chunk)
+            except BaseException:
+                os.remove(temporary.name)
+                raise
+        hexdigest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        blob_name = f"{BLOB_PREFIX}/{hexdigest[:2]}/{hexdigest}{extension}"
+        path = self.path(blob_name)
+        if os.path.exists(path):
+            os.remove(temporary.name)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temporary.name, path)
+            if self.file_permissions_mode is not None:
+                os.chmod(path, self.file_permissions_mode)
+        MediaBlob.objects.get_or_create(name=blob_name, defaults={'digest': hexdigest, 'size': size})
+        return blob_name
+
+    def delete(self, name):
+        from book.models import MediaBlob
+
+        if MediaBlob.objects.filter(name=name, refcount__gt=0).exists():
+            return
+        super().delete(name)
+        MediaBlob.objects.filter(name=name).delete()
+
+
+def file_names(instance, fields):
+    # Read the raw attribute values: this runs for every loaded row, and going through the descriptors
+    # would build a FieldFile per field. Deferred fields are simply missing from ``__dict__``.
+    names = Counter()
+    for field in fields:
+        value = instance.__dict__.get(field)
+        name = getattr(value, 'name', value)
+        if name:
+            names[name] += 1
+    return names
+
+
+def adjust_refcounts(names, delta):
+    from book.models import MediaBlob
+
+    for name, count in names.items():
+        MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + delta * count)
+
+
+def track_media_references(model, fields):
+    """Keep ``MediaBlob.refcount`` in step with the files ``fields`` of ``model`` point at."""
+    def remember(sender, instance, **kwargs):
+        instance._media_names = file_names(instance, fields)
+
+    def update(sender, instance, raw=False, **kwargs):
+        current = file_names(instance, fields)
+        previous = getattr(instance, '_media_names', Counter())
+        adjust_refcounts(current - previous, 1)
+        adjust_refcounts(previous - current, -1)
+        instance._media_names = current
+
+    def release(sender, instance, **kwargs):
+        adjust_refcounts(getattr(instance, '_media_names', Counter()), -1)
+
+    uid = f"media-references:{model._meta.label_lower}"
+    post_init.connect(remember, sender=model, weak=False, dispatch_uid=f"{uid}:init")
+    post_save.connect(update, sender=model, weak=False, dispatch_uid=f"{uid}:save")
+    post_delete.connect(release, sender=model, weak=False, dispatch_uid=f"{uid}:delete")
@@ -0,0 +1,29 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+
+def is_asgi(request):
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+async def aiterate(iterator):
+    """
+    Drive a synchronous iterator from an async response one item at a time.
+
+    Django's ASGI handler reads a synchronous ``StreamingHttpResponse`` body into a list before sending
+    it; this keeps it streaming. The iterator runs thread-sensitively, so it keeps the request's database
+    connection (and any open server-side cursor) between items.
+    """
+    iterator = iter(iterator)
+    done = object()
+    advance = sync_to_async(next, thread_sensitive=True)
+    while True:
+        item = await advance(iterator, done)
+        if item is done:
+            break
+        yield item
+
+
+def streaming_content(request, iterator):
+    """``iterator`` as a response body for ``request``: wrapped with ``aiterate`` under ASGI."""
+    return aiterate(iterator) if is_asgi(request) else iterator
@@ -0,0 +1,24 @@
+import os
+import shutil
+import tempfile
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """Points the directories the app writes to (metrics, upload parts, import copies) at a temporary directory."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.temp_dir = tempfile.mkdtemp(prefix='test-')
+        self.temp_settings = override_settings(
+            METRICS_DIR=os.path.join(self.temp_dir, 'metrics'),
+            UPLOAD_SESSION_DIR=os.path.join(self.temp_dir, 'uploads'),
+            CATALOG_IMPORT_DIR=os.path.join(self.temp_dir, 'imports'),
+        )
+        self.temp_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.temp_settings.disable()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
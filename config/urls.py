@@ -5,7 +5,7 @@ from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from django.conf import settings
 from django.conf.urls.static import static
-from config.views import index
+from config.views import index, MetricsView
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -21,8 +21,10 @@ schema_view = get_schema_view(
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', index),
+    path('metrics', MetricsView.as_view(), name='metrics'),
     path('api/v1/', include('users.urls')),
     path('api/v1/', include('book.urls')),
+    path('api/v2/', include('book.async_urls')),
 
 
     #swagger
@@ -1,11 +1,9 @@
-from django.core.mail import EmailMessage, send_mail
 import re
-import threading
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.template.loader import render_to_string
 import phonenumbers
-from decouple import config 
-from twilio.rest import Client
+from config.delivery import send_email_async, send_sms_async
 
 email_regex =re.compile(r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,7}\b")
 phone_regex = re.compile(r"(\+[0-9]+\s*)?(\([0-9]+\))?[\s0-9\-]+[0-9]+")
@@ -51,30 +49,30 @@ def check_email_username_or_phone(user_input):
     return user_input
 
 
+def normalize_email(email):
+    return email.strip().lower()
 
 
-class EmailThread(threading.Thread):
+def normalize_phone(phone_number):
+    """E.164 form of ``phone_number`` (``PHONE_DEFAULT_REGION`` when it has no country code), or None."""
+    try:
+        number = phonenumbers.parse(phone_number, settings.PHONE_DEFAULT_REGION)
+    except phonenumbers.NumberParseException:
+        return None
+    if not phonenumbers.is_possible_number(number):
+        return None
+    return phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164)
 
-    def __init__(self, email):
-        self.email = email
-        threading.Thread.__init__(self)
-    
-    def run(self):
-        self.email.send()
+
+def normalize_username(username):
+    return username.strip().casefold()
 
 
 class Email:
 
     @staticmethod
     def send_email(data):
-        email = EmailMessage(
-            subject = data['subject'],
-            body = data['body'],
-            to = [data['to_email']]
-        )
-        if data.get('content_type') =='html':
-            email.content_subtype = 'html'
-            EmailThread(email).start()
+        send_email_async(data['to_email'], data['subject'], data['body'], content_type=data.get('content_type'))
 
 
 def send_email(email, code):
@@ -93,11 +91,4 @@ def send_email(email, code):
 
 
 def send_phone_code(phone, code):
-    account_sid = config('accound_sid')
-    auth_token = config('auth_token')
-    client = Client(account_sid, auth_token)
-    client.messages.create(
-        body = f" Salom do'stim! Sizning tasdiqlash kodingiz {code}\n",
-        from_ = "+998935351108",
-        to = f"{phone}"
-    )
\ No newline at end of file
+    send_sms_async(f"{phone}", f" Salom do'stim! Sizning tasdiqlash kodingiz {code}\n")
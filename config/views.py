@@ -1,6 +1,18 @@
+from django.http import HttpResponse
 from django.shortcuts import render, redirect
+from rest_framework.permissions import IsAdminUser
+from rest_framework.views import APIView
+from config.metrics import load_snapshots, render_prometheus
 
 
 
 def index(request):
-    return render(request, 'index.html')
\ No newline at end of file
+    return render(request, 'index.html')
+
+
+class MetricsView(APIView):
+    permission_classes = [IsAdminUser]
+    swagger_schema = None
+
+    def get(self, request):
+        return HttpResponse(render_prometheus(load_snapshots()), content_type='text/plain; version=0.0.4; charset=utf-8')
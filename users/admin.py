@@ -1,5 +1,5 @@
 from django.contrib import admin
-from users.models import User, UserConfirmation, Profile
+from users.models import User, UserConfirmation, Profile, FailedDelivery
 from django.contrib.auth.models import Group
 
 admin.site.unregister(Group)
@@ -7,4 +7,5 @@ admin.site.unregister(Group)
 
 admin.site.register(User)
 admin.site.register(UserConfirmation)
-admin.site.register(Profile)
\ No newline at end of file
+admin.site.register(Profile)
+admin.site.register(FailedDelivery)
@@ -0,0 +1,73 @@
+from django.utils.functional import SimpleLazyObject, empty
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from users.models import User
+from users.tokens import get_claims, get_snapshot, save_snapshot
+
+
+def load_user(user_id):
+    user = get_snapshot(user_id)
+    if user is None:
+        try:
+            user = User.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+        except User.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        save_snapshot(user)
+    return user
+
+
+def claim(name):
+    def get(self):
+        if self._wrapped is empty:
+            return self._claims[name]
+        return getattr(self._wrapped, name)
+    return property(get)
+
+
+class ClaimsUser(SimpleLazyObject):
+    """
+    The request user as seen by ``ClaimsJWTAuthentication``.
+
+    The id and ``CLAIMS`` are answered from the token; anything else loads the ``User``, from the
+    snapshot cache when possible.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, user_id, claims):
+        self.__dict__['_claims'] = {'pk': user_id, 'id': user_id, **claims}
+        super().__init__(lambda: load_user(user_id))
+
+    def __bool__(self):
+        # Permission classes test ``request.user and ...``, which would otherwise load it.
+        return True
+
+    pk = claim('pk')
+    id = claim('id')
+    user_role = claim('user_role')
+    auth_status = claim('auth_status')
+    is_staff = claim('is_staff')
+    is_superuser = claim('is_superuser')
+    is_active = claim('is_active')
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    ``JWTAuthentication`` that does not load the user. Tokens without claims, and every token when no
+    ``USER_CLAIMS_CACHE`` is configured, fall back to the full lookup.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        claims = get_claims(user_id, validated_token)
+        if claims is None:
+            return super().get_user(validated_token)
+        if not claims['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return ClaimsUser(User._meta.pk.to_python(user_id), claims)
@@ -0,0 +1,43 @@
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import ValidationError
+from config.utility import check_email_username_or_phone, normalize_email, normalize_phone, normalize_username
+from users.models import User
+
+
+def identifier_lookup(identifier):
+    """``{column: value}`` matching ``identifier`` (an email, phone number or username) on one index, or None."""
+    try:
+        kind = check_email_username_or_phone(identifier)
+    except ValidationError:
+        return None
+    if kind == 'email':
+        return {'email_normalized': normalize_email(identifier)}
+    if kind == 'phone':
+        phone_number = normalize_phone(identifier)
+        return {'phone_normalized': phone_number} if phone_number else None
+    return {'username_normalized': normalize_username(identifier)}
+
+
+def find_user(identifier):
+    lookup = identifier_lookup(identifier)
+    if lookup is None:
+        return None
+    return User._default_manager.filter(**lookup).order_by('created_time').first()
+
+
+class IdentifierBackend(ModelBackend):
+    """Authenticates by email, phone number or username, resolved with one indexed query."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        user = find_user(username)
+        if user is None:
+            # Hash anyway, so unknown identifiers take as long as wrong passwords.
+            User().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,109 @@
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from config.bloom import BloomFilter
+
+
+# Skipped ids tracked at most; past that the filter is reloaded.
+MAX_GAPS = 500
+
+
+def blacklisted_key(jti):
+    return f"users:blacklisted:{jti}"
+
+
+def blacklist_cache():
+    return caches[settings.TOKEN_BLACKLIST_CACHE] if settings.TOKEN_BLACKLIST_CACHE else None
+
+
+class BlacklistIndex:
+    """
+    Per-process Bloom filter of blacklisted refresh token ids.
+
+    It is loaded from the unexpired blacklist on first use. After that, rows added since the last sync
+    (``id > last_id``) are merged in at most every ``TOKEN_BLACKLIST_SYNC_INTERVAL`` seconds, which picks
+    up tokens blacklisted by other workers without rescanning the table. Ids below ``last_id`` that were
+    missing when it moved past them may belong to logouts that commit out of order, so they are looked up
+    again for ``TOKEN_BLACKLIST_SYNC_OVERLAP`` seconds.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.last_id = 0
+        self.gaps = {}
+        self.synced_at = 0.0
+
+    def load(self):
+        bloom = BloomFilter(settings.TOKEN_BLACKLIST_BLOOM_CAPACITY, settings.TOKEN_BLACKLIST_BLOOM_ERROR_RATE)
+        rows = BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now()).order_by('id')
+        last_id, recent = 0, set()
+        for pk, jti in rows.values_list('id', 'token__jti').iterator():
+            bloom.add(jti)
+            last_id = pk
+            recent.add(pk)
+        now = time.monotonic()
+        self.gaps = {pk: now for pk in range(max(last_id - MAX_GAPS, 0) + 1, last_id) if pk not in recent}
+        self.bloom, self.last_id = bloom, last_id
+
+    def sync(self):
+        now = time.monotonic()
+        self.gaps = {pk: seen for pk, seen in self.gaps.items() if now - seen < settings.TOKEN_BLACKLIST_SYNC_OVERLAP}
+        rows = BlacklistedToken.objects.filter(Q(id__gt=self.last_id) | Q(id__in=list(self.gaps))).order_by('id')
+        for pk, jti in rows.values_list('id', 'token__jti'):
+            self.bloom.add(jti)
+            self.gaps.pop(pk, None)
+            if pk > self.last_id:
+                self.gaps.update(dict.fromkeys(range(self.last_id + 1, pk), now))
+                self.last_id = pk
+        if self.bloom.count > settings.TOKEN_BLACKLIST_BLOOM_CAPACITY or len(self.gaps) > MAX_GAPS:
+            # Reloading drops expired tokens, which purge_tokens has deleted by now.
+            self.load()
+
+    def might_contain(self, jti):
+        with self.lock:
+            now = time.monotonic()
+            if self.bloom is None:
+                self.load()
+                self.synced_at = now
+            elif now - self.synced_at >= settings.TOKEN_BLACKLIST_SYNC_INTERVAL:
+                self.sync()
+                self.synced_at = now
+            return jti in self.bloom
+
+    def add(self, jti):
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+
+
+index = BlacklistIndex()
+
+
+def remember_blacklisted(jti, expires_at):
+    """Record a blacklisted token in the shared exact cache until it expires, and in this process's filter."""
+    cache = blacklist_cache()
+    timeout = int((expires_at - timezone.now()).total_seconds())
+    if cache is not None and timeout > 0:
+        cache.set(blacklisted_key(jti), True, timeout)
+    index.add(jti)
+
+
+def is_blacklisted(jti, expires_at):
+    """
+    Shared exact cache first, then the Bloom filter; only a filter hit (a blacklisted token or a rare
+    false positive) reaches the database.
+    """
+    cache = blacklist_cache()
+    if cache is not None and cache.get(blacklisted_key(jti)):
+        return True
+    if not index.might_contain(jti):
+        return False
+    if BlacklistedToken.objects.filter(token__jti=jti).exists():
+        remember_blacklisted(jti, expires_at)
+        return True
+    return False
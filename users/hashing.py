@@ -0,0 +1,98 @@
+import multiprocessing
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework.exceptions import Throttled
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with ``PASSWORD_HASH_ITERATIONS``; hashes made with another count are upgraded on login."""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
+
+
+class HashingBusy(Throttled):
+    default_detail = "Server band, birozdan so'ng qayta urinib ko'ring."
+
+
+def make_password(password):
+    return hashers.make_password(password)
+
+
+def check_password(password, encoded):
+    """``(valid, must_update)``: whether ``encoded`` should be rehashed with the preferred hasher and cost."""
+    updated = []
+    valid = hashers.check_password(password, encoded, setter=lambda raw_password: updated.append(True))
+    return valid, bool(updated)
+
+
+def init_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+
+
+class PasswordHashing:
+    """
+    Runs password hashing and verification in a pool of ``PASSWORD_HASHING_WORKERS`` processes,
+    so PBKDF2 does not hold the request thread's GIL (inline when it is 0).
+
+    At most ``PASSWORD_HASHING_MAX_CONCURRENT`` operations run or wait per process; a request that cannot
+    get a slot within ``PASSWORD_HASHING_WAIT`` seconds is refused with 429 instead of queueing.
+    Workers read the settings module, so ``override_settings`` does not reach them.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pool = None
+        self.slots = None
+        self.pid = None
+        self.metrics = Counter()
+
+    def ensure_pool(self):
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid != os.getpid():
+                self.slots = threading.BoundedSemaphore(settings.PASSWORD_HASHING_MAX_CONCURRENT)
+                self.pool = None
+                if settings.PASSWORD_HASHING_WORKERS:
+                    # Spawned rather than forked: the parent runs delivery and flush threads.
+                    self.pool = ProcessPoolExecutor(settings.PASSWORD_HASHING_WORKERS,
+                                                    mp_context=multiprocessing.get_context('spawn'),
+                                                    initializer=init_worker,
+                                                    initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'config.settings'),))
+                self.pid = os.getpid()
+
+    def run(self, function, *args):
+        self.ensure_pool()
+        if not self.slots.acquire(timeout=settings.PASSWORD_HASHING_WAIT):
+            with self.lock:
+                self.metrics['rejected'] += 1
+            raise HashingBusy(wait=1)
+        try:
+            if self.pool is None:
+                return function(*args)
+            return self.pool.submit(function, *args).result()
+        finally:
+            self.slots.release()
+            with self.lock:
+                self.metrics[function.__name__] += 1
+
+    def make_password(self, password):
+        return self.run(make_password, password)
+
+    def check_password(self, password, encoded):
+        if not hashers.is_password_usable(encoded):
+            return False, False
+        return self.run(check_password, password, encoded)
+
+    def get_metrics(self):
+        with self.lock:
+            return dict(self.metrics)
+
+
+password_hashing = PasswordHashing()
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+class Command(BaseCommand):
+    help = "Delete expired outstanding and blacklisted refresh tokens in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        outstanding = blacklisted = 0
+        while True:
+            ids = list(OutstandingToken.objects.filter(expires_at__lte=now).order_by()
+                       .values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            # Short transactions keep logins and logouts from queueing behind one large delete.
+            with transaction.atomic():
+                blacklisted += BlacklistedToken.objects.filter(token_id__in=ids).delete()[0]
+                OutstandingToken.objects.filter(id__in=ids).delete()
+            outstanding += len(ids)
+        self.stdout.write(self.style.SUCCESS(
+            f"{outstanding} expired tokens purged, {blacklisted} of them blacklisted"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from config.delivery import Delivery, delivery_queue
+from users.models import FailedDelivery
+
+
+class Command(BaseCommand):
+    help = "Queue dead-lettered e-mail and SMS deliveries again and wait for them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        failed = list(FailedDelivery.objects.order_by('created_time')[:options['limit']])
+        for row in failed:
+            delivery_queue.put(Delivery(row.channel, row.recipient, row.body, subject=row.subject,
+                                        content_type=row.content_type or None))
+        FailedDelivery.objects.filter(pk__in=[row.pk for row in failed]).delete()
+        delivery_queue.join()
+        self.stdout.write(self.style.SUCCESS(f"{len(failed)} deliveries queued again"))
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:00
+
+from itertools import islice
+from django.db import migrations, models
+from config.utility import normalize_email, normalize_phone, normalize_username
+
+
+def populate_identifiers(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    users = User.objects.only('email', 'phone_number', 'username').order_by('pk').iterator(chunk_size=2000)
+    while True:
+        batch = list(islice(users, 2000))
+        if not batch:
+            break
+        for user in batch:
+            user.email_normalized = normalize_email(user.email) if user.email else None
+            user.phone_normalized = normalize_phone(user.phone_number) if user.phone_number else None
+            user.username_normalized = normalize_username(user.username) if user.username else None
+        User.objects.bulk_update(batch, ['email_normalized', 'phone_normalized', 'username_normalized'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_profile_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='email_normalized',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=254, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='phone_normalized',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='username_normalized',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=150, null=True),
+        ),
+        migrations.RunPython(populate_identifiers, migrations.RunPython.noop),
+    ]
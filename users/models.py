@@ -1,16 +1,31 @@
 import uuid
 from django.db import models
-from django.contrib.auth.models import AbstractUser
-from config.models import BaseModel
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.contrib.auth.hashers import identify_hasher, is_password_usable
+from config.models import BaseModel, count_subquery
 from datetime import datetime, timedelta
 from django.core.validators import FileExtensionValidator
-from rest_framework_simplejwt.tokens import RefreshToken
+from users.tokens import ClaimsRefreshToken
+from users.hashing import password_hashing
+from config.utility import normalize_email, normalize_phone, normalize_username
 import random
 
 
 SUPER_ADMIN, ADMIN, USER = ("super_admin", 'admin', 'user')
 VIA_EMAIL, VIA_PHONE = ('via_email', 'via_phone')
 NEW, CODE_VERIFIED, DONE, PHOTO_DONE = ("new", 'code_verified', 'done', 'photo_done')
+NORMALIZED_FIELDS = {'email': 'email_normalized', 'phone_number': 'phone_normalized', 'username': 'username_normalized'}
+
+
+class UserQuerySet(models.QuerySet):
+
+    def with_counts(self):
+        likes = self.model._meta.get_field('likes')
+        return self.annotate(liked_books_total=count_subquery(likes.related_model, likes.field.name))
+
+
+class CustomUserManager(UserManager.from_queryset(UserQuerySet)):
+    pass
 
 
 class User(AbstractUser, BaseModel):
@@ -36,6 +51,12 @@ class User(AbstractUser, BaseModel):
     auth_status = models.CharField(max_length=31, choices=AUTH_STATUS, default=NEW)
     email = models.EmailField(null=True, blank=True, unique=True)
     phone_number = models.CharField(max_length=13, null=True, blank=True, unique=True)
+    # Login lookups (users.backends) match these, kept up to date by ``clean``.
+    email_normalized = models.CharField(max_length=254, null=True, blank=True, editable=False, db_index=True)
+    phone_normalized = models.CharField(max_length=16, null=True, blank=True, editable=False, db_index=True)
+    username_normalized = models.CharField(max_length=150, null=True, blank=True, editable=False, db_index=True)
+
+    objects = CustomUserManager()
 
     def __str__(self):
         return self.username
@@ -54,42 +75,71 @@ class User(AbstractUser, BaseModel):
     
     def check_username(self):
         if not self.username:
-            temp_username = f"user-{uuid.uuid4().__str__().split('-')[-1]}"
-            while User.objects.filter(username=temp_username):
-                temp_username = f"{temp_username}{random.randint(0,9)}"
-            self.username = temp_username
+            # 122 random bits: a collision is left to the unique index instead of probed for.
+            self.username = f"user-{uuid.uuid4().hex}"
 
     def check_email(self):
         if self.email:
             normalize_email = self.email.lower()
             self.email = normalize_email
 
+    def check_identifiers(self):
+        self.email_normalized = normalize_email(self.email) if self.email else None
+        self.phone_normalized = normalize_phone(self.phone_number) if self.phone_number else None
+        self.username_normalized = normalize_username(self.username) if self.username else None
+
     def check_pass(self):
         if not self.password:
-            temp_password = f"password-{uuid.uuid4().__str__().split('-')[-1]}"
-            self.password = temp_password
+            # Nobody knows a generated password, so there is nothing worth hashing until one is set.
+            self.set_unusable_password()
     
     def hashing_password(self):
-        if not self.password.startswith('pbkdf2_sha256'):
+        if not is_password_usable(self.password):
+            return
+        try:
+            identify_hasher(self.password)
+        except ValueError:
             self.set_password(self.password)
+
+    def set_password(self, raw_password):
+        self.password = password_hashing.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        # Hashes made with another algorithm or cost are upgraded once the password is known to be right.
+        valid, must_update = password_hashing.check_password(raw_password, self.password)
+        if valid and must_update:
+            self.set_password(raw_password)
+            self._password = None
+            self.save(update_fields=['password'])
+        return valid
     
     
     def token(self):
-        refresh = RefreshToken.for_user(self)
-        return {
-            "access" : str(refresh.access_token),
-            "refresh": str(refresh)
-        }
+        # Minted once per instance: every pair adds an OutstandingToken row. Saving mints a new one.
+        if '_token_pair' not in self.__dict__:
+            refresh = ClaimsRefreshToken.for_user(self)
+            self._token_pair = {
+                "access" : str(refresh.access_token),
+                "refresh": str(refresh)
+            }
+        return self._token_pair
     
     
     def save(self, *args, **kwargs):
+        self.__dict__.pop('_token_pair', None)
         self.clean()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, *(NORMALIZED_FIELDS[name] for name in update_fields
+                                                         if name in NORMALIZED_FIELDS)}
         super(User, self).save(*args, **kwargs)
 
 
     def clean(self):
         self.check_username()
         self.check_email()
+        self.check_identifiers()
         self.check_pass()
         self.hashing_password()
 
@@ -125,6 +175,22 @@ class UserConfirmation(BaseModel):
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     image = models.ImageField(default='avatar.jpg', upload_to='users/', validators=[FileExtensionValidator(allowed_extensions=['jpg','jpeg','png','heic','heif'])])
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     
     def __str__(self):
-        return f'{self.user.username} Profile'
\ No newline at end of file
+        return f'{self.user.username} Profile'
+
+class FailedDelivery(BaseModel):
+    channel = models.CharField(max_length=15)
+    recipient = models.CharField(max_length=255)
+    subject = models.CharField(max_length=255, blank=True)
+    body = models.TextField()
+    content_type = models.CharField(max_length=15, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-created_time']
+
+    def __str__(self):
+        return f'{self.channel} {self.recipient}'
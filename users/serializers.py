@@ -2,36 +2,49 @@ from rest_framework.generics import get_object_or_404
 from django.contrib.auth.models import update_last_login
 from users.models import User, VIA_EMAIL, VIA_PHONE, NEW, CODE_VERIFIED, DONE, Profile
 from rest_framework.exceptions import ValidationError, PermissionDenied, NotFound
+from django.db import IntegrityError, transaction
 from django.db.models import Q
 from rest_framework import serializers
-from config.utility import check_email_or_phone, check_email_username_or_phone, send_email, send_phone_code
-from django.core.mail import send_mail
+from config.utility import check_email_or_phone, send_email, send_phone_code
+from config.delivery import send_email_async
 from django.contrib.auth.password_validation import validate_password
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 from django.contrib.auth import authenticate
 from rest_framework_simplejwt.tokens import AccessToken
-from django.conf import settings
+from users.tokens import ClaimsRefreshToken, set_claims
+from config.prefetch_plan import PrefetchPlanMixin
+from config.images import SrcsetField
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(PrefetchPlanMixin, serializers.ModelSerializer):
     liked_books_count = serializers.SerializerMethodField('get_liked_books_count')
 
     class Meta:
         model = User
         fields = '__all__'
 
+    @staticmethod
+    def annotate_queryset(queryset):
+        return queryset.with_counts()
+
     @staticmethod
     def get_liked_books_count(obj):
+        if hasattr(obj, 'liked_books_total'):
+            return obj.liked_books_total
         return obj.likes.count()
 
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(PrefetchPlanMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    image_srcset = SrcsetField()
     class Meta:
         model = Profile
         fields = '__all__'
 
         
+SIGNUP_ATTEMPTS = 2
+
+
 class SignUpSerializer(serializers.ModelSerializer):
     id = serializers.UUIDField(read_only = True)
     auth_type = serializers.CharField(read_only=True, required = False)
@@ -51,29 +64,27 @@ class SignUpSerializer(serializers.ModelSerializer):
         # }
 
     def create(self, validated_data):
-        user = super(SignUpSerializer, self).create(validated_data)
+        # User, Profile, the confirmation code and the token pair are written together; the code is sent
+        # after the commit. A generated username that is already taken rolls the attempt back for a new one.
+        for attempt in range(SIGNUP_ATTEMPTS):
+            user = User(**validated_data)
+            try:
+                with transaction.atomic():
+                    user.save()
+                    code = user.create_verify_code(user.auth_type)
+                    user.token()
+            except IntegrityError:
+                if attempt + 1 == SIGNUP_ATTEMPTS or not User.objects.filter(username=user.username).exists():
+                    raise
+                continue
+            break
         if user.auth_type == VIA_EMAIL:
-            code = user.create_verify_code(VIA_EMAIL)
             # send_email(user.email, code)
-            send_mail(
-                    "Subject here",
-                    code,
-                    settings.EMAIL_HOST_USER,
-                    [user.email,],
-                    fail_silently=False,
-                )
+            send_email_async(user.email, "Subject here", code)
         elif user.auth_type == VIA_PHONE:
-            code = user.create_verify_code(VIA_PHONE)
             # send_email(user.phone_number, code)
             # # send_phone_code(user.phone_number, code)
-            send_mail(
-                    "Subject here",
-                    code,
-                    settings.EMAIL_HOST_USER,
-                    [user.email,],
-                    fail_silently=False,
-                )
-        user.save()
+            send_email_async(user.email, "Subject here", code)
         return user
     
 
@@ -108,13 +119,15 @@ class SignUpSerializer(serializers.ModelSerializer):
 
     def validate_email_phone_number(self, value):
         value = value.lower()
-        if value and User.objects.filter(email=value).exists():
+        # One lookup for both columns; the row tells which of them matched.
+        taken = User.objects.filter(Q(email=value) | Q(phone_number=value)).values_list('email', 'phone_number').first() if value else None
+        if taken and taken[0] == value:
             data = {
                 'succes':False,
                 'message':"Bu email ro'yhatdan o'tkazilgan"
             }
             raise ValidationError(data)
-        elif value and User.objects.filter(phone_number=value).exists():
+        elif taken is not None:
             data = {
                 'succes':False,
                 'message':"Bu telefon raqam ro'yhatdan o'tkazilgan"
@@ -222,6 +235,7 @@ class ChangeUserInformationSerializer(serializers.Serializer):
 
 
 class LoginSerializer(TokenObtainPairSerializer):
+    token_class = ClaimsRefreshToken
 
     def __init__(self, *args, **kwargs):
         super(LoginSerializer, self).__init__(*args, **kwargs)
@@ -229,46 +243,23 @@ class LoginSerializer(TokenObtainPairSerializer):
         self.fields['username'] = serializers.CharField(required=False, read_only = True)
 
     def auth_validate(self, data):
-        user_input = data.get("userinput")
-        if check_email_username_or_phone(user_input)=='username':
-            username = user_input
-        elif check_email_username_or_phone(user_input)=='email':
-            user = User.objects.get(email__iexact=user_input)
-            username = user.username
-        elif check_email_username_or_phone(user_input)=='phone':
-            user = User.objects.get(phone_number=user_input)
-            username = user.username
-        else:
-            data = {
-                "success": True,
-                "message":"Siz email, username yoki telefon raqam jo'natishingiz kerak!"
+        # users.backends.IdentifierBackend resolves an email, phone number or username in one query.
+        user = authenticate(self.context.get('request'), username=data.get("userinput"), password=data['password'])
+        if user is None:
+            raise ValidationError(
+                {
+                'success':False, 
+                'message':" Sorry, login or password you entered is incorrect. Please check and try again"
             }
-            raise ValidationError(data)
-        
-        authectication_kwargs = {
-            self.username_field : username,
-            'password': data['password']
-        }
-        current_user = User.objects.filter(username__iexact=username).first()
-        if current_user is not None and current_user.auth_status in [NEW, CODE_VERIFIED]:
+            )
+        if user.auth_status in [NEW, CODE_VERIFIED]:
             raise ValidationError(
                 {
                     'success':False,
                     "message": "Siz ro'yhatdan to'liq o'tmagansiz."
                 }
             )
-        # user = authenticate(username=username, password=data["password"])
-        user = authenticate(**authectication_kwargs)
-
-        if user is not None:
-            self.user = user
-        else:
-            raise ValidationError(
-                {
-                'success':False, 
-                'message':" Sorry, login or password you entered is incorrect. Please check and try again"
-            }
-            )
+        self.user = user
     def validate(self, data):
         self.auth_validate(data)
         if self.user.auth_status not in [DONE,]:
@@ -291,6 +282,7 @@ class LoginSerializer(TokenObtainPairSerializer):
     
 
 class LoginRefreshSerializer(TokenRefreshSerializer):
+    token_class = ClaimsRefreshToken
 
     def validate(self, attrs):
         data = super().validate(attrs)
@@ -298,6 +290,8 @@ class LoginRefreshSerializer(TokenRefreshSerializer):
         user_id = access_token_instance['user_id']
         user = get_object_or_404(User, id = user_id)
         update_last_login(None, user)
+        # The refresh token's claims may predate a role or status change.
+        data['access'] = str(set_claims(access_token_instance, user))
         return data
 
 
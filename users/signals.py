@@ -1,8 +1,27 @@
-from django.db.models.signals import post_save, pre_delete
+from django.core.files import File
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete
 from users.models import User, Profile
 from django.dispatch import receiver
+from django.db import transaction
+from config.images import track_image_variants
+from config.storage import track_media_references
+from config.metrics import registry
+from config.response_cache import invalidate_on_change
+from config.delivery import delivery_queue
+from users.hashing import password_hashing
+from users.tokens import remember_user
+from users.blacklist import remember_blacklisted
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
  
  
+track_media_references(Profile, ['image'])
+track_image_variants(Profile)
+# Book lists nest their users. Every login saves last_login, which would empty those caches each time.
+invalidate_on_change(User, ignore_fields=('last_login',))
+registry.register_source('delivery_queue', delivery_queue.get_metrics)
+registry.register_source('password_hashing', password_hashing.get_metrics)
+
+
 @receiver(post_save, sender=User) 
 def create_profile(sender, instance, created, **kwargs):
     if created:
@@ -10,4 +29,43 @@ def create_profile(sender, instance, created, **kwargs):
   
 @receiver(post_save, sender=User) 
 def save_profile(sender, instance, **kwargs):
-        instance.profile.save()
\ No newline at end of file
+    # Only a profile loaded through this user can carry unsaved changes, and only changed ones are written.
+    profile = instance._state.fields_cache.get('profile')
+    if profile is None:
+        return
+    state = profile_state(profile)
+    if state is None or state != getattr(profile, '_saved_state', None):
+        profile.save()
+
+
+def profile_state(profile):
+    state = {}
+    for field in Profile._meta.concrete_fields:
+        value = profile.__dict__.get(field.attname)
+        if isinstance(value, File) and not getattr(value, '_committed', False):
+            return None  # a new upload
+        state[field.attname] = getattr(value, 'name', value)
+    return state
+
+
+@receiver(post_init, sender=Profile)
+@receiver(post_save, sender=Profile)
+def remember_profile(sender, instance, **kwargs):
+    instance._saved_state = profile_state(instance)
+
+
+@receiver(post_save, sender=User)
+def publish_claims(sender, instance, **kwargs):
+    remember_user(instance)
+
+
+@receiver(post_delete, sender=User)
+def revoke_claims(sender, instance, **kwargs):
+    remember_user(instance, deleted=True)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def publish_blacklisted(sender, instance, created, **kwargs):
+    if created:
+        token = instance.token
+        transaction.on_commit(lambda: remember_blacklisted(token.jti, token.expires_at))
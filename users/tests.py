@@ -1,3 +1,318 @@
-from django.test import TestCase
+import threading
+import time
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+from config.delivery import Delivery, DeliveryQueue, LocmemBackend, delivery_queue, EMAIL
+from users import blacklist
+from users.authentication import ClaimsJWTAuthentication
+from users.hashing import PasswordHashing
+from users.models import FailedDelivery, Profile, User, UserConfirmation, ADMIN, DONE, NEW, USER
+from users.tokens import ClaimsRefreshToken
 
-# Create your tests here.
+
+class FailingBackend:
+
+    def send(self, delivery):
+        raise ConnectionError("smtp unavailable")
+
+
+@override_settings(DELIVERY_BACKENDS={'email': 'config.delivery.LocmemBackend', 'sms': 'config.delivery.LocmemBackend'})
+class DeliveryQueueTests(TestCase):
+
+    def setUp(self):
+        LocmemBackend.outbox.clear()
+
+    def test_signup_code_is_delivered_in_background(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/v1/signup/', {'email_phone_number': 'reader@example.com'})
+        self.assertEqual(response.status_code, 201)
+        delivery_queue.join()
+        code = UserConfirmation.objects.get().code
+        self.assertEqual([(item.to, item.body) for item in LocmemBackend.outbox], [('reader@example.com', code)])
+
+    @override_settings(DELIVERY_WORKERS=0, DELIVERY_MAX_ATTEMPTS=3, DELIVERY_RETRY_BACKOFF=60)
+    def test_failed_delivery_waits_in_the_retry_heap(self):
+        queue = DeliveryQueue()
+        threads = threading.active_count()
+        delivery = Delivery(EMAIL, 'reader@example.com', '1234', subject='code')
+        queue.process(delivery, {EMAIL: FailingBackend()})
+        self.assertEqual(threading.active_count(), threads)
+        self.assertEqual(queue.get_metrics()['delayed'], 1)
+        self.assertEqual(queue.release_due(), 0)
+        # Backoff 60s with at most 50% jitter.
+        self.assertEqual(queue.release_due(time.monotonic() + 90), 1)
+        self.assertIs(queue.queue.get_nowait(), delivery)
+        queue.process(delivery, {EMAIL: LocmemBackend()})
+        self.assertEqual([item.to for item in LocmemBackend.outbox], ['reader@example.com'])
+        self.assertEqual((queue.get_metrics()['retried'], queue.get_metrics()['sent']), (1, 1))
+
+    @override_settings(DELIVERY_MAX_ATTEMPTS=2)
+    def test_exhausted_retries_are_dead_lettered(self):
+        queue = DeliveryQueue()
+        delivery = Delivery(EMAIL, 'reader@example.com', '1234', subject='code')
+        queue.process(delivery, {EMAIL: FailingBackend()})
+        self.assertFalse(FailedDelivery.objects.exists())
+        with self.assertLogs('config.delivery', 'ERROR'):
+            queue.process(delivery, {EMAIL: FailingBackend()})
+        failed = FailedDelivery.objects.get()
+        self.assertEqual((failed.recipient, failed.attempts), ('reader@example.com', 2))
+        self.assertEqual(queue.get_metrics()['failed'], 1)
+
+    @override_settings(DELIVERY_WORKERS=0, DELIVERY_QUEUE_SIZE=1)
+    def test_full_queue_rejects_instead_of_blocking(self):
+        queue = DeliveryQueue()
+        self.assertTrue(queue.put(Delivery(EMAIL, 'first@example.com', '1111')))
+        with self.assertLogs('config.delivery', 'ERROR'):
+            self.assertFalse(queue.put(Delivery(EMAIL, 'second@example.com', '2222')))
+        self.assertEqual(FailedDelivery.objects.get().recipient, 'second@example.com')
+
+
+@override_settings(USER_CLAIMS_CACHE='default')
+class ClaimsAuthenticationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create(username='admin', password='secret-pass', user_role=ADMIN, auth_status=DONE)
+        self.factory = RequestFactory()
+
+    def authenticate(self, access):
+        request = self.factory.get('/', HTTP_AUTHORIZATION=f"Bearer {access}")
+        return ClaimsJWTAuthentication().authenticate(request)[0]
+
+    def test_admin_is_authorized_from_claims_without_loading_the_user(self):
+        access = self.admin.token()['access']
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post('/api/v1/category/', {'name': 'Badiiy'}, headers={'Authorization': f"Bearer {access}"})
+        self.assertEqual(response.json()['status'], 201)
+        self.assertFalse([query for query in context.captured_queries if '"users_user"' in query['sql']])
+
+    def test_user_is_loaded_lazily_once_per_snapshot(self):
+        access = self.admin.token()['access']
+        with self.assertNumQueries(0):
+            user = self.authenticate(access)
+            self.assertEqual((user.pk, user.user_role, user.is_staff), (self.admin.pk, ADMIN, False))
+        with self.assertNumQueries(1):
+            self.assertEqual(user.username, 'admin')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate(access).username, 'admin')
+        self.admin.first_name = 'Alisher'
+        self.admin.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate(access).first_name, 'Alisher')
+
+    def test_changed_claims_override_issued_tokens(self):
+        access = self.admin.token()['access']
+        self.admin.user_role = USER
+        self.admin.save()
+        self.assertEqual(self.authenticate(access).user_role, USER)
+        response = self.client.post('/api/v1/category/', {'name': 'Badiiy'}, headers={'Authorization': f"Bearer {access}"})
+        self.assertEqual(response.status_code, 403)
+        self.admin.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(access)
+
+    @override_settings(USER_CLAIMS_CACHE=None)
+    def test_without_shared_cache_changes_from_other_workers_apply(self):
+        access = self.admin.token()['access']
+        # Another worker's change: nothing is published to this process.
+        User.objects.filter(pk=self.admin.pk).update(user_role=USER)
+        response = self.client.post('/api/v1/category/', {'name': 'Badiiy'}, headers={'Authorization': f"Bearer {access}"})
+        self.assertEqual(response.status_code, 403)
+        User.objects.filter(pk=self.admin.pk).update(is_active=False)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(access)
+
+    def test_refreshed_access_token_carries_current_claims(self):
+        refresh = self.admin.token()['refresh']
+        User.objects.filter(pk=self.admin.pk).update(user_role=USER)
+        cache.clear()
+        access = self.client.post('/api/v1/login/refresh', {'refresh': refresh}).json()['access']
+        self.assertEqual(AccessToken(access)['user_role'], USER)
+
+
+class TokenBlacklistTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        blacklist.index.bloom = None
+        self.user = User.objects.create(username='reader', password='secret-pass', auth_status=DONE)
+
+    def test_token_pair_is_minted_once_per_instance(self):
+        self.assertIs(self.user.token(), self.user.token())
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+        self.user.save()
+        self.user.token()
+        self.assertEqual(OutstandingToken.objects.count(), 2)
+
+    def test_refresh_skips_the_blacklist_table_until_logout(self):
+        tokens = self.user.token()
+        self.client.post('/api/v1/login/refresh', {'refresh': tokens['refresh']})
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post('/api/v1/login/refresh', {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in context.captured_queries if 'blacklistedtoken' in query['sql']])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/v1/logout/', {'refresh': tokens['refresh']},
+                                        headers={'Authorization': f"Bearer {tokens['access']}"})
+        self.assertEqual(response.status_code, 205)
+        self.assertEqual(self.client.post('/api/v1/login/refresh', {'refresh': tokens['refresh']}).status_code, 401)
+
+    @override_settings(TOKEN_BLACKLIST_SYNC_INTERVAL=0)
+    def test_tokens_blacklisted_by_other_workers_are_synced(self):
+        refresh = ClaimsRefreshToken.for_user(self.user)
+        self.assertFalse(blacklist.is_blacklisted(refresh['jti'], timezone.now() + timedelta(days=1)))
+        # Without running on_commit callbacks, as in another process.
+        refresh.blacklist()
+        self.assertTrue(blacklist.is_blacklisted(refresh['jti'], timezone.now() + timedelta(days=1)))
+
+    @override_settings(TOKEN_BLACKLIST_SYNC_INTERVAL=0)
+    def test_logouts_committed_out_of_order_are_synced(self):
+        first, second = ClaimsRefreshToken.for_user(self.user), ClaimsRefreshToken.for_user(self.user)
+        expires_at = timezone.now() + timedelta(days=1)
+        self.assertFalse(blacklist.is_blacklisted(first['jti'], expires_at))
+        first.blacklist()
+        second.blacklist()
+        # The first logout got the lower id but commits after the second one was synced.
+        late = BlacklistedToken.objects.get(token__jti=first['jti'])
+        late_id, token_id = late.pk, late.token_id
+        late.delete()
+        self.assertTrue(blacklist.is_blacklisted(second['jti'], expires_at))
+        self.assertFalse(blacklist.is_blacklisted(first['jti'], expires_at))
+        BlacklistedToken.objects.create(id=late_id, token_id=token_id)
+        self.assertTrue(blacklist.is_blacklisted(first['jti'], expires_at))
+
+    def test_purge_deletes_expired_tokens_in_batches(self):
+        now = timezone.now()
+        for i, expires_at in enumerate([now - timedelta(days=2), now - timedelta(days=1), now - timedelta(hours=1),
+                                        now + timedelta(days=1)]):
+            token = OutstandingToken.objects.create(user=self.user, jti=f"jti-{i}", token='token', expires_at=expires_at)
+            if i % 2 == 0:
+                BlacklistedToken.objects.create(token=token)
+        output = StringIO()
+        call_command('purge_tokens', batch_size=2, stdout=output)
+        self.assertIn("3 expired tokens purged, 2 of them blacklisted", output.getvalue())
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), ['jti-3'])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class IdentifierLoginTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='Reader.One', email='Reader@Example.com', phone_number='+998901234567',
+                                        password='secret-pass', auth_status=DONE)
+
+    def test_identifiers_are_normalized_on_save(self):
+        self.assertEqual((self.user.username_normalized, self.user.email_normalized, self.user.phone_normalized),
+                         ('reader.one', 'reader@example.com', '+998901234567'))
+        self.user.phone_number = '90 123 45 68'
+        self.user.save(update_fields=['phone_number'])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.phone_normalized, '+998901234568')
+
+    def test_login_by_any_identifier_uses_one_user_query(self):
+        for identifier in ('READER.ONE', 'reader@example.COM', '+998 90 123-45-67'):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post('/api/v1/login/', {'userinput': identifier, 'password': 'secret-pass'})
+            self.assertIn('access', response.json(), identifier)
+            lookups = [query for query in context.captured_queries if query['sql'].startswith('SELECT "users_user"')]
+            self.assertEqual(len(lookups), 1, identifier)
+        response = self.client.post('/api/v1/login/', {'userinput': 'reader.one', 'password': 'wrong-pass'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PASSWORD_HASHING_WORKERS=0, PASSWORD_HASH_ITERATIONS=1000)
+class PasswordHashingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.hashing = PasswordHashing()
+        patcher = mock.patch('users.models.password_hashing', self.hashing)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create(username='hasher', password='secret-pass', auth_status=DONE)
+
+    def test_login_upgrades_the_hash_cost(self):
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            response = self.client.post('/api/v1/login/', {'userinput': 'hasher', 'password': 'secret-pass'})
+            self.assertIn('access', response.json())
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+        self.assertTrue(self.user.check_password('secret-pass'))
+        self.assertEqual(self.hashing.get_metrics()['check_password'], 2)
+
+    @override_settings(PASSWORD_HASHING_MAX_CONCURRENT=1, PASSWORD_HASHING_WAIT=0)
+    def test_exhausted_budget_answers_429(self):
+        self.hashing = PasswordHashing()
+        with mock.patch('users.models.password_hashing', self.hashing):
+            self.hashing.ensure_pool()
+            self.hashing.slots.acquire()
+            response = self.client.post('/api/v1/login/', {'userinput': 'hasher', 'password': 'secret-pass'})
+            self.hashing.slots.release()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.hashing.get_metrics(), {'rejected': 1})
+
+    @override_settings(PASSWORD_HASHING_WORKERS=1)
+    def test_hashes_in_worker_processes(self):
+        hashing = PasswordHashing()
+        try:
+            encoded = hashing.make_password('secret-pass')
+            self.assertEqual(hashing.check_password('secret-pass', encoded), (True, False))
+            self.assertEqual(hashing.check_password('wrong-pass', encoded), (False, False))
+        finally:
+            hashing.pool.shutdown()
+        self.assertEqual(hashing.get_metrics(), {'make_password': 1, 'check_password': 2})
+
+
+
+@override_settings(DELIVERY_BACKENDS={'email': 'config.delivery.LocmemBackend', 'sms': 'config.delivery.LocmemBackend'})
+class SignUpTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_signup_query_budget(self):
+        # Lookup, savepoint, user, profile, confirmation, outstanding token, release.
+        with self.assertNumQueries(7), self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/api/v1/signup/', {'email_phone_number': 'New.Reader@Example.com'})
+        self.assertIn('access', response.json())
+        user = User.objects.get(email='new.reader@example.com')
+        self.assertRegex(user.username, r'^user-[0-9a-f]{32}$')
+        self.assertEqual(user.auth_status, NEW)
+        self.assertFalse(user.has_usable_password())
+        self.assertTrue(Profile.objects.filter(user=user).exists())
+        self.assertTrue(UserConfirmation.objects.filter(user=user).exists())
+        self.assertEqual(len(callbacks), 1)
+        response = self.client.post('/api/v1/signup/', {'email_phone_number': 'new.reader@example.com'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_taken_generated_username_is_retried(self):
+        User.objects.create(username=f"user-{'a' * 32}")
+        with mock.patch('users.models.uuid.uuid4', side_effect=[uuid.UUID('a' * 32), uuid.UUID('b' * 32)]):
+            response = self.client.post('/api/v1/signup/', {'email_phone_number': 'retry@example.com'})
+        self.assertIn('access', response.json())
+        self.assertEqual(User.objects.get(email='retry@example.com').username, f"user-{'b' * 32}")
+
+    def test_user_save_writes_profile_only_when_changed(self):
+        user = User.objects.create(username='profiled', email='profiled@example.com')
+        user = User.objects.select_related('profile').get(pk=user.pk)
+        with CaptureQueriesContext(connection) as context:
+            user.save(update_fields=['first_name'])
+        self.assertFalse([query for query in context.captured_queries if 'users_profile' in query['sql']])
+        user.profile.image = 'users/other.jpg'
+        user.save(update_fields=['first_name'])
+        self.assertEqual(Profile.objects.get(user=user).image.name, 'users/other.jpg')
@@ -0,0 +1,90 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+from users.blacklist import is_blacklisted
+
+
+CLAIMS = ('user_role', 'auth_status', 'is_staff', 'is_superuser', 'is_active')
+
+
+def user_claims(user):
+    return {claim: getattr(user, claim) for claim in CLAIMS}
+
+
+def set_claims(token, user):
+    for claim, value in user_claims(user).items():
+        token[claim] = value
+    return token
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """
+    Refresh token carrying ``CLAIMS``; its access tokens copy them, so requests authorize without a query.
+    The blacklist is checked through ``users.blacklist`` instead of a join on every refresh.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        return set_claims(super().for_user(user), user)
+
+    def check_blacklist(self):
+        if is_blacklisted(self.payload[api_settings.JTI_CLAIM], datetime_from_epoch(self.payload['exp'])):
+            raise TokenError(_("Token is blacklisted"))
+
+
+def claims_cache():
+    """The cache shared by all workers that carries claim changes, or None when requests must load the user."""
+    return caches[settings.USER_CLAIMS_CACHE] if settings.USER_CLAIMS_CACHE else None
+
+
+def claims_key(user_id):
+    return f"users:claims:{user_id}"
+
+
+def snapshot_key(user_id):
+    return f"users:snapshot:{user_id}"
+
+
+def remember_user(user, deleted=False):
+    """
+    Publish the current claims of a changed ``user`` and drop its cached snapshot.
+
+    Tokens issued before the change still carry the old claims; the published ones take precedence
+    for as long as such a token can live.
+    """
+    cache = claims_cache()
+    if cache is None:
+        return
+    claims = user_claims(user)
+    if deleted:
+        claims['is_active'] = False
+    cache.set(claims_key(user.pk), claims, int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()))
+    cache.delete(snapshot_key(user.pk))
+
+
+def get_claims(user_id, token):
+    """
+    The user's published claims, else the token's own; None for tokens issued without claims and when
+    no shared claims cache is configured, as a change published in one worker would not reach the others.
+    """
+    cache = claims_cache()
+    if cache is None:
+        return None
+    claims = cache.get(claims_key(user_id))
+    if claims is not None:
+        return claims
+    if not all(claim in token for claim in CLAIMS):
+        return None
+    return {claim: token[claim] for claim in CLAIMS}
+
+
+def get_snapshot(user_id):
+    return claims_cache().get(snapshot_key(user_id))
+
+
+def save_snapshot(user):
+    claims_cache().set(snapshot_key(user.pk), user, settings.USER_SNAPSHOT_TTL)
@@ -10,12 +10,11 @@ from rest_framework.exceptions import ValidationError, NotFound
 from rest_framework.response import Response
 from config.utility import send_email, check_email_username_or_phone
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from rest_framework_simplejwt.tokens import RefreshToken
+from users.tokens import ClaimsRefreshToken
 from rest_framework_simplejwt.exceptions import TokenError
 from drf_yasg.utils import swagger_auto_schema
 from django.core.exceptions import ObjectDoesNotExist
-from django.core.mail import send_mail
-from django.conf import settings
+from config.delivery import send_email_async
 from rest_framework import status
 
 
@@ -29,7 +28,7 @@ class ProfileView(APIView):
     permission_classes = [permissions.IsAuthenticated, ]
 
     def get(self, request, id):
-        profile = Profile.objects.get(user__id=id)
+        profile = ProfileSerializer.setup_queryset(Profile.objects.all()).get(user__id=id)
         if profile:
             serializer = ProfileSerializer(profile)
             data = {
@@ -57,12 +56,13 @@ class VerifyAPIView(APIView):
         user = self.request.user
         code = self.request.data.get('code')
         self.check_verify(user, code)
+        tokens = user.token()
         return Response(
                 data = {
                     'status':True,
                     'auth_status':user.auth_status,
-                    "access": user.token()['access'],
-                    "refresh": user.token()['refresh']
+                    "access": tokens['access'],
+                    "refresh": tokens['refresh']
                 }
             )
     
@@ -91,23 +91,11 @@ class GetNewVerification(APIView):
         if user.auth_type == VIA_EMAIL:
             code = user.create_verify_code(VIA_EMAIL)
             # send_email(user.email, code)
-            send_mail(
-                    "Subject here",
-                    code,
-                    settings.EMAIL_HOST_USER,
-                    [user.email,],
-                    fail_silently=False,
-                )
+            send_email_async(user.email, "Subject here", code)
         elif user.auth_type == VIA_PHONE:
             code = user.create_verify_code(VIA_PHONE)
             # send_email(user.phone_number, code)
-            send_mail(
-                    "Subject here",
-                    code,
-                    settings.EMAIL_HOST_USER,
-                    [user.email,],
-                    fail_silently=False,
-                )
+            send_email_async(user.email, "Subject here", code)
         else:
             data = {
                 'message':"Email address xato!"
@@ -176,7 +164,7 @@ class LogoutView(APIView):
         serializer.is_valid(raise_exception=True)
         try:
             refresh_token = self.request.data['refresh']
-            token = RefreshToken(refresh_token)
+            token = ClaimsRefreshToken(refresh_token)
             token.blacklist()
             data = {
                 "success":True,
@@ -200,29 +188,18 @@ class ForgotPasswordView(APIView):
         if check_email_username_or_phone(email_or_phone) =='phone':
             code = user.create_verify_code(VIA_PHONE)
             # send_email(email_or_phone, code)
-            send_mail(
-                    "Subject here",
-                    code,
-                    settings.EMAIL_HOST_USER,
-                    [user.email,],
-                    fail_silently=False,
-                )
+            send_email_async(user.email, "Subject here", code)
         if check_email_username_or_phone(email_or_phone) =='email':
             code = user.create_verify_code(VIA_EMAIL)
             # send_email(email_or_phone, code)
-            send_mail(
-                    "Subject here",
-                    code,
-                    settings.EMAIL_HOST_USER,
-                    [user.email,],
-                    fail_silently=False,
-                )
+            send_email_async(user.email, "Subject here", code)
+        tokens = user.token()
         return Response(
             {
                 'success': True,
                 'message': "Tasdiqlash kodi muvaffaqiyatli yuborildi!!",
-                'access': user.token()['access'],
-                "refresh": user.token()['refresh'],
+                'access': tokens['access'],
+                "refresh": tokens['refresh'],
                 "user_status": user.auth_status
             }, status=200
         )
@@ -244,11 +221,12 @@ class ResetPasswordView(UpdateAPIView):
             user = User.objects.get(id = response.data.get('id'))
         except ObjectDoesNotExist:
             raise NotFound(detail="User not found")
+        tokens = user.token()
         return Response(
             {
                 "success":True,
                 "message":"Parolingiz muvaffaqiyatli o'zgartirildi!!!",
-                "access":user.token()['access'],
-                "refresh":user.token()['refresh'],
+                "access":tokens['access'],
+                "refresh":tokens['refresh'],
             }
         )
\ No newline at end of file